@@ -1,9 +1,15 @@
 # app.py
+import contextlib
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from langgraph.graph import StateGraph, END
 from core.state import ChatState
+from core.streaming import aiter_stream
+from core.checkpoint import default_checkpointer, delta_node, thread_config
+from core.metrics import instrument_node
+from core.llm import bind_llm
+from core.tenancy import Tenant, bind_tenant, get_tenants
 from core.nodes import (
     classify_intent,
     send_menu,
@@ -16,15 +22,47 @@ from core.nodes import (
     display_orders,
     suggest_order,
     chit_chat,
-    track_order
+    track_order,
+    aclassify_intent,
+    asend_menu,
+    ahandle_order,
+    atake_address,
+    aconfirm_order,
+    aplace_order,
+    agreetings,
+    adisplay_orders,
+    asuggest_order,
+    achit_chat,
+    atrack_order,
+    classify_and_act,
+    aclassify_and_act
 )
 
+# Default for build_graph(combined=...): one LLM call for classify + act
+COMBINED_MODE = os.environ.get("COMBINED_MODE", "").lower() in ("1", "true", "yes")
+
+# Node implementations by name: (sync, async)
+NODES = {
+    "classify_intent": (classify_intent, aclassify_intent),
+    "greetings": (greetings, agreetings),
+    "send_menu": (send_menu, asend_menu),
+    "handle_order": (handle_order, ahandle_order),
+    "take_address": (take_address, atake_address),
+    "confirm_order": (confirm_order, aconfirm_order),
+    "place_order": (place_order, aplace_order),
+    "display_orders": (display_orders, adisplay_orders),
+    "suggest_order": (suggest_order, asuggest_order),
+    "chit_chat": (chit_chat, achit_chat),
+    "track_order": (track_order, atrack_order),
+}
+
 # Function to create a new initial state for a user
 def create_initial_state(user_id: str) -> ChatState:
     """Initializes the chatbot state for a new user session."""
     return {
         "user_id": user_id,
         "messages": [],
+        "summary": "",
         "order_items": [],
         "total_cost": 0.0,
         "delivery_address": None,
@@ -32,28 +70,43 @@ def create_initial_state(user_id: str) -> ChatState:
         "intent": "greetings",
         "menu_sent": False,
         "address_valid": False,
-        "is_confirmed": False
+        "is_confirmed": False,
+        "last_order_number": None,
+        "pending_action": None,
+        "suggested_address": None
     }
 
 # Build the LangGraph
-def build_graph(llm=None):
-    """Builds and compiles the LangGraph for the chatbot."""
+def build_graph(llm=None, use_async: bool = False, checkpointer=None, combined: Optional[bool] = None,
+                tenant: Optional[Tenant] = None):
+    """
+    Builds and compiles the LangGraph for the chatbot.
+    `llm` is the chat model for this graph's nodes; by default they share the
+    lazily created Gemini client from core.llm.
+    With `use_async=True` the nodes use `ainvoke` for LLM calls and the
+    graph must be driven with `graph.ainvoke` (see `run_turn`).
+    `checkpointer` defaults to the SQLite checkpointer from core.checkpoint;
+    pass False to compile without one.
+    With `combined=True` the classifier's LLM call also returns the order
+    changes or address, so handle_order/take_address turns need one call, not two
+    (default: the COMBINED_MODE env var).
+    With `tenant`, every node runs with that tenant active (its menu, order
+    store and so on, see core.tenancy) and the default checkpointer is the
+    tenant's; use `tenant_graph` to get a cached one.
+    """
     builder = StateGraph(ChatState)
+    nodes = dict(NODES)
+    if COMBINED_MODE if combined is None else combined:
+        nodes["classify_intent"] = (classify_and_act, aclassify_and_act)
 
-    # Core nodes
-    builder.add_node("classify_intent", classify_intent)
-    builder.add_node("greetings", greetings)
-    builder.add_node("send_menu", send_menu)
-    builder.add_node("handle_order", handle_order)
-    builder.add_node("take_address", take_address)
-    builder.add_node("confirm_order", confirm_order)
-    builder.add_node("place_order", place_order)
-
-    # New nodes
-    builder.add_node("display_orders", display_orders)
-    builder.add_node("suggest_order", suggest_order)
-    builder.add_node("chit_chat", chit_chat)
-    builder.add_node("track_order", track_order)
+    # Core nodes + new nodes; each returns only the keys it changed and is timed
+    for name, (sync_node, async_node) in nodes.items():
+        node = async_node if use_async else sync_node
+        if llm is not None:
+            node = bind_llm(node, llm)
+        if tenant is not None:
+            node = bind_tenant(node, tenant)
+        builder.add_node(name, instrument_node(name, delta_node(node)))
 
     # Entry point
     builder.set_entry_point("classify_intent")
@@ -88,4 +141,108 @@ def build_graph(llm=None):
     builder.add_edge("chit_chat", END)
     builder.add_edge("track_order", END)
 
-    return builder.compile()
\ No newline at end of file
+    if checkpointer is None:
+        if tenant is not None:
+            with tenant.activate():
+                checkpointer = default_checkpointer()
+        else:
+            checkpointer = default_checkpointer()
+    return builder.compile(checkpointer=checkpointer or None)
+
+
+_async_graph = None
+
+
+def _default_async_graph():
+    global _async_graph
+    if _async_graph is None:
+        _async_graph = build_graph(use_async=True)
+    return _async_graph
+
+
+def _tenant_graph(tenant: Tenant, use_async: bool):
+    return tenant.resource(
+        "graph.async" if use_async else "graph.sync",
+        lambda t: build_graph(use_async=use_async, tenant=t),
+    )
+
+
+def tenant_graph(tenant_id: str, use_async: bool = True):
+    """
+    The compiled graph for a tenant, built once and kept while the tenant stays
+    in the registry's LRU cache. Raises core.tenancy.UnknownTenantError.
+    Prefer `use_tenant_graph` around a turn, so the tenant can't be closed mid-turn.
+    """
+    return _tenant_graph(get_tenants().get(tenant_id), use_async)
+
+
+@contextlib.contextmanager
+def use_tenant_graph(tenant_id: str, use_async: bool = True):
+    """`tenant_graph` with the tenant pinned until the block exits."""
+    with get_tenants().acquire(tenant_id) as tenant:
+        yield _tenant_graph(tenant, use_async)
+
+
+def load_state(graph, user_id: str) -> ChatState:
+    """The user's last checkpointed state, or a fresh one."""
+    if graph.checkpointer is not None:
+        snapshot = graph.get_state(thread_config(user_id))
+        if snapshot.values:
+            return dict(snapshot.values)
+    return create_initial_state(user_id)
+
+
+async def aload_state(graph, user_id: str) -> ChatState:
+    """Async version of `load_state`."""
+    if graph.checkpointer is not None:
+        snapshot = await graph.aget_state(thread_config(user_id))
+        if snapshot.values:
+            return dict(snapshot.values)
+    return create_initial_state(user_id)
+
+
+def _turn_input(state: ChatState, text: str, resumed: bool) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Appends the user's message and returns (graph input, config). Once the
+    thread has a checkpoint only the new message list is sent, so the rest of
+    the state comes from (and stays unchanged in) the checkpoint.
+    """
+    state["messages"].append({"role": "user", "content": text})
+    graph_input = {"messages": state["messages"]} if resumed else state
+    return graph_input, thread_config(state["user_id"])
+
+
+def start_turn(graph, state: ChatState, text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Prepares a turn for a sync graph: `graph.invoke(*start_turn(graph, state, text))`."""
+    config = thread_config(state["user_id"])
+    resumed = graph.checkpointer is not None and graph.checkpointer.get_tuple(config) is not None
+    return _turn_input(state, text, resumed)
+
+
+async def astart_turn(graph, state: ChatState, text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Async version of `start_turn`."""
+    config = thread_config(state["user_id"])
+    resumed = graph.checkpointer is not None and await graph.checkpointer.aget_tuple(config) is not None
+    return _turn_input(state, text, resumed)
+
+
+async def run_turn(state: ChatState, text: str, graph=None) -> ChatState:
+    """
+    Runs one conversation turn without blocking the event loop:
+    appends the user's message and returns the updated state.
+    Many conversations can run concurrently on a single loop, e.g. with asyncio.gather.
+    """
+    graph = graph or _default_async_graph()
+    graph_input, config = await astart_turn(graph, state, text)
+    return await graph.ainvoke(graph_input, config)
+
+
+async def stream_turn(state: ChatState, text: str, graph=None):
+    """
+    Like `run_turn`, but yields ("token", text) events while streaming nodes
+    (chit_chat, suggest_order) generate, then ("state", final_state).
+    """
+    graph = graph or _default_async_graph()
+    graph_input, config = await astart_turn(graph, state, text)
+    async for event in aiter_stream(graph, graph_input, config):
+        yield event
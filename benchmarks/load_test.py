@@ -0,0 +1,391 @@
+# benchmarks/load_test.py
+"""
+Multi-user load test: how many simultaneous diners can one worker handle?
+
+    python benchmarks/load_test.py --users 50 --duration 60 --latency 0.8
+    python benchmarks/load_test.py --users 10,50,100,200 --slo-p95 1500
+    python benchmarks/load_test.py --users 200 --processes 4 --think 2:8 --checkpoint
+
+Each simulated user is a thread that keeps starting new sessions
+(`app.create_initial_state`) from the conversation scripts in
+benchmarks/conversations/, waiting a random think time before every turn, and
+drives them through a sync `app.build_graph` backed by `ScriptedLLM`. With
+--processes P the users are split across P worker processes that share the
+order and checkpoint databases, like P server workers on one host.
+
+Several --users levels run one after another. For each level the report gives:
+- p50/p95/p99 turn latency and throughput (turns, sessions and orders per second);
+- CPU time per session and per turn, RSS growth per concurrent user and peak RSS;
+- order-write contention: order-number allocation waits (SQLite write lock),
+  background write batches, queueing delay, failures, and a final check that
+  every placed order was written exactly once.
+
+LLM calls run in a bounded pool (LLM_MAX_WORKERS in core/llm_runner.py), so
+with enough users the pool itself becomes a queue; raise it to test past that.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Must come before `app`: it points the order and checkpoint databases at a temp dir
+from run_benchmark import (
+    CONVERSATIONS_DIR, RESULTS_DIR, _workdir, check_expectations, git_revision, load_conversations, percentile,
+)
+import app
+from core.checkpoint import SqliteDeltaSaver
+from core.metrics import metrics
+from core.order_queue import get_order_writer
+from core.order_store import get_order_store
+from scripted_llm import ScriptedLLM, turn_script
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RSS_SAMPLE_SECONDS = 0.25
+ORDER_HISTOGRAMS = ["orderbot_order_id_seconds", "orderbot_order_write_seconds", "orderbot_order_queue_seconds"]
+ORDER_COUNTERS = ["orderbot_orders_written_total", "orderbot_order_write_batches_total",
+                  "orderbot_order_write_failures_total"]
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        pass
+    if resource is not None:
+        # Peak rather than current where /proc isn't available (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if peak > 2**24 else peak / 2**10
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Tracks this process's peak RSS while a load level runs."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = rss_mb()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(RSS_SAMPLE_SECONDS):
+            current = rss_mb()
+            if current is not None and (self.peak is None or current > self.peak):
+                self.peak = current
+
+
+class WorkerStats:
+    """What the users of one worker process measured."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turn_ms: List[float] = []
+        self.sessions_started = 0
+        self.sessions_completed = 0
+        self.errors: List[str] = []
+        self.mismatches: List[str] = []
+        self.orders: List[int] = []
+
+
+def simulate_user(graph, conversations, user_id: str, rng: random.Random, think: List[float],
+                  start_at: float, end_at: float, stats: WorkerStats) -> None:
+    time.sleep(max(start_at - time.monotonic(), 0))
+    session = 0
+    while time.monotonic() < end_at:
+        conversation = rng.choice(conversations)
+        state = app.create_initial_state(f"{user_id}-{session}")
+        session += 1
+        with stats.lock:
+            stats.sessions_started += 1
+        for number, turn in enumerate(conversation["turns"], 1):
+            time.sleep(rng.uniform(*think))
+            if time.monotonic() >= end_at:
+                return
+            turn_script.set(turn.get("llm", {}))
+            start = time.perf_counter()
+            try:
+                graph_input, config = app.start_turn(graph, state, turn["user"])
+                state = graph.invoke(graph_input, config)
+            except Exception as e:
+                with stats.lock:
+                    stats.errors.append(f"{conversation['name']}#{number}: {e!r}")
+                break
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            problems = check_expectations(state, turn.get("expect", {}))
+            with stats.lock:
+                stats.turn_ms.append(elapsed_ms)
+                stats.mismatches.extend(f"{conversation['name']}#{number}: {p}" for p in problems)
+                if state.get("intent") == "place_order" and state.get("last_order_number"):
+                    stats.orders.append(state["last_order_number"])
+        else:
+            with stats.lock:
+                stats.sessions_completed += 1
+
+
+def run_worker(worker: int, users: int, options: Dict[str, Any], conversations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Runs `users` simulated users in this process and returns its measurements."""
+    quiet = contextlib.nullcontext() if options["verbose"] else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        checkpointer = SqliteDeltaSaver(os.path.join(_workdir, "checkpoints.db")) if options["checkpoint"] else False
+        graph = app.build_graph(llm=ScriptedLLM(latency=options["latency"], jitter=options["jitter"]),
+                                checkpointer=checkpointer, combined=options["combined"])
+        metrics.reset()
+        stats = WorkerStats()
+        sampler = RssSampler()
+        rss_start = rss_mb()
+        cpu_start = time.process_time()
+        start = time.monotonic()
+        end_at = start + options["ramp_up"] + options["duration"]
+        sampler.start()
+        threads = [
+            threading.Thread(target=simulate_user, daemon=True, args=(
+                graph, conversations, f"load-{users}-{worker}-{user}", random.Random(f"{options['seed']}-{worker}-{user}"),
+                options["think"], start + options["ramp_up"] * user / max(users, 1), end_at, stats,
+            ))
+            for user in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_s = time.monotonic() - start
+
+        drain_start = time.monotonic()
+        drained = get_order_writer().flush(timeout=30)
+        drain_s = time.monotonic() - drain_start
+        cpu_s = time.process_time() - cpu_start
+        sampler.stopped.set()
+        rss_end = rss_mb()
+        peaks = [rss for rss in (sampler.peak, rss_end) if rss is not None]
+
+    snapshot = metrics.snapshot()
+    return {
+        "worker": worker,
+        "users": users,
+        "wall_s": wall_s,
+        "cpu_s": cpu_s,
+        "rss_start_mb": rss_start,
+        "rss_end_mb": rss_end,
+        "rss_peak_mb": max(peaks) if peaks else None,
+        "turn_ms": stats.turn_ms,
+        "sessions_started": stats.sessions_started,
+        "sessions_completed": stats.sessions_completed,
+        "errors": stats.errors,
+        "mismatches": stats.mismatches,
+        "orders": stats.orders,
+        "order_drain_s": drain_s,
+        "order_drained": drained,
+        "order_metrics": {name: snapshot.get(name, []) for name in ORDER_HISTOGRAMS + ORDER_COUNTERS},
+    }
+
+
+def histogram_summary(workers: List[Dict[str, Any]], name: str) -> Dict[str, Any]:
+    """Merges one histogram across workers; percentiles are bucket upper bounds."""
+    count, total, buckets = 0, 0.0, {}
+    for result in workers:
+        for row in result["order_metrics"].get(name, []):
+            count += row["count"]
+            total += row["sum"]
+            for le, n in row["buckets"].items():
+                buckets[le] = buckets.get(le, 0) + n
+
+    def quantile(q: float) -> Optional[float]:
+        for le, n in buckets.items():
+            if count and n >= q * count:
+                return None if le == "+Inf" else float(le) * 1000
+        return None
+
+    return {
+        "count": count,
+        "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+        "p95_ms_le": quantile(0.95),
+        "p99_ms_le": quantile(0.99),
+    }
+
+
+def counter_total(workers: List[Dict[str, Any]], name: str) -> float:
+    return sum(row["value"] for result in workers for row in result["order_metrics"].get(name, []))
+
+
+def summarize_level(users: int, workers: List[Dict[str, Any]], options: Dict[str, Any]) -> Dict[str, Any]:
+    turn_ms = [ms for result in workers for ms in result["turn_ms"]]
+    orders = [number for result in workers for number in result["orders"]]
+    wall_s = max(result["wall_s"] for result in workers)
+    cpu_s = sum(result["cpu_s"] for result in workers)
+    sessions = sum(result["sessions_completed"] for result in workers)
+    started = sum(result["sessions_started"] for result in workers)
+
+    store = get_order_store()
+    missing = [number for number in set(orders) if store.get_order(number) is None]
+    rss_growth = [
+        (result["rss_end_mb"] - result["rss_start_mb"]) / result["users"]
+        for result in workers if result["rss_start_mb"] is not None and result["rss_end_mb"] is not None and result["users"]
+    ]
+    peaks = [result["rss_peak_mb"] for result in workers if result["rss_peak_mb"] is not None]
+
+    return {
+        "users": users,
+        "processes": len(workers),
+        "wall_time_s": round(wall_s, 3),
+        "turns": len(turn_ms),
+        "turns_per_sec": round(len(turn_ms) / wall_s, 2) if wall_s else 0.0,
+        "sessions_completed": sessions,
+        "sessions_started": started,
+        "sessions_per_sec": round(sessions / wall_s, 3) if wall_s else 0.0,
+        "orders_per_sec": round(len(orders) / wall_s, 3) if wall_s else 0.0,
+        "turn_latency_ms": {
+            "mean": round(sum(turn_ms) / len(turn_ms), 3) if turn_ms else 0.0,
+            "p50": round(percentile(turn_ms, 0.50), 3),
+            "p95": round(percentile(turn_ms, 0.95), 3),
+            "p99": round(percentile(turn_ms, 0.99), 3),
+            "max": round(max(turn_ms), 3) if turn_ms else 0.0,
+        },
+        "cpu": {
+            "seconds": round(cpu_s, 3),
+            "utilization_pct": round(cpu_s / wall_s * 100, 1) if wall_s else 0.0,
+            "ms_per_session": round(cpu_s / sessions * 1000, 3) if sessions else None,
+            "ms_per_turn": round(cpu_s / len(turn_ms) * 1000, 3) if turn_ms else None,
+        },
+        "memory": {
+            "rss_mb_per_user": round(sum(rss_growth) / len(rss_growth), 3) if rss_growth else None,
+            "rss_peak_mb": round(max(peaks), 1) if peaks else None,
+        },
+        "order_writes": {
+            "orders_placed": len(orders),
+            "duplicate_numbers": len(orders) - len(set(orders)),
+            "missing_in_store": len(missing),
+            "written": int(counter_total(workers, "orderbot_orders_written_total")),
+            "batches": int(counter_total(workers, "orderbot_order_write_batches_total")),
+            "failures": int(counter_total(workers, "orderbot_order_write_failures_total")),
+            "id_allocation": histogram_summary(workers, "orderbot_order_id_seconds"),
+            "batch_write": histogram_summary(workers, "orderbot_order_write_seconds"),
+            "queue_delay": histogram_summary(workers, "orderbot_order_queue_seconds"),
+            "drain_s": round(max(result["order_drain_s"] for result in workers), 3),
+            "drained": all(result["order_drained"] for result in workers),
+        },
+        "slo_p95_ms": options["slo_p95"],
+        "errors": [e for result in workers for e in result["errors"]],
+        "mismatches": [m for result in workers for m in result["mismatches"]],
+    }
+
+
+def run_level(users: int, options: Dict[str, Any], conversations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    processes = min(options["processes"], users)
+    shares = [users // processes + (1 if w < users % processes else 0) for w in range(processes)]
+    if processes == 1:
+        workers = [run_worker(0, users, options, conversations)]
+    else:
+        # Fresh interpreters: no threads or SQLite connections inherited from this one
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            workers = pool.starmap(run_worker, [(w, share, options, conversations) for w, share in enumerate(shares)])
+    return summarize_level(users, workers, options)
+
+
+def print_level(level: Dict[str, Any]) -> None:
+    latency, cpu, memory, writes = level["turn_latency_ms"], level["cpu"], level["memory"], level["order_writes"]
+    print(f"\n== {level['users']} users in {level['processes']} process(es): {level['turns']} turns "
+          f"in {level['wall_time_s']}s ({level['turns_per_sec']} turns/s, {level['sessions_per_sec']} sessions/s, "
+          f"{level['orders_per_sec']} orders/s)")
+    print(f"turn latency ms: mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    print(f"cpu: {cpu['seconds']}s ({cpu['utilization_pct']}% of one core), {cpu['ms_per_session']} ms/session, "
+          f"{cpu['ms_per_turn']} ms/turn")
+    print(f"memory: {memory['rss_mb_per_user']} MB RSS per user, peak {memory['rss_peak_mb']} MB")
+    ids, batches, queue = writes["id_allocation"], writes["batch_write"], writes["queue_delay"]
+    print(f"order writes: {writes['orders_placed']} placed, {writes['written']} written in {writes['batches']} batches, "
+          f"{writes['failures']} failed, {writes['missing_in_store']} missing, {writes['duplicate_numbers']} duplicate numbers")
+    print(f"  id allocation ms: mean {ids['mean_ms']}  p99 <= {ids['p99_ms_le']}")
+    print(f"  batch write ms:   mean {batches['mean_ms']}  p99 <= {batches['p99_ms_le']}")
+    print(f"  queue delay ms:   mean {queue['mean_ms']}  p99 <= {queue['p99_ms_le']}  (drain at end {writes['drain_s']}s)")
+    if level["errors"]:
+        print(f"{len(level['errors'])} turns raised, e.g. {level['errors'][0]}")
+    if level["mismatches"]:
+        print(f"{len(level['mismatches'])} expectation mismatches, e.g. {level['mismatches'][0]}")
+
+
+def print_capacity(levels: List[Dict[str, Any]], slo_p95: Optional[float]) -> None:
+    print(f"\n{'users':>7}{'turns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cpu %':>8}{'MB/user':>9}"
+          + ("  SLO" if slo_p95 else ""))
+    for level in levels:
+        latency = level["turn_latency_ms"]
+        verdict = ""
+        if slo_p95:
+            verdict = "  ok" if latency["p95"] <= slo_p95 and not level["errors"] else "  MISSED"
+        print(f"{level['users']:>7}{level['turns_per_sec']:>10}{latency['p50']:>10}{latency['p95']:>10}"
+              f"{latency['p99']:>10}{level['cpu']['utilization_pct']:>8}{str(level['memory']['rss_mb_per_user']):>9}{verdict}")
+    if slo_p95:
+        passing = [level["users"] for level in levels if level["turn_latency_ms"]["p95"] <= slo_p95 and not level["errors"]]
+        print(f"\nMost users within p95 <= {slo_p95} ms: {max(passing) if passing else 'none'}")
+
+
+def parse_think(value: str) -> List[float]:
+    low, _, high = value.partition(":")
+    return [float(low), float(high or low)]
+
+
+def main(argv=None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="20", help="simulated users; a comma list runs several levels")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to spread the users over")
+    parser.add_argument("--duration", type=float, default=30, help="seconds each level runs after ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which users join")
+    parser.add_argument("--think", type=parse_think, default=parse_think("1:4"),
+                        help="think time before each turn, MIN:MAX seconds")
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per LLM call")
+    parser.add_argument("--jitter", type=float, default=0.3, help="LLM latency varies by up to this fraction")
+    parser.add_argument("--combined", action="store_true", help="use the single-call classify-and-act graph")
+    parser.add_argument("--checkpoint", action="store_true", help="checkpoint sessions to SQLite as the server does")
+    parser.add_argument("--slo-p95", type=float, help="p95 turn latency target in ms for the capacity summary")
+    parser.add_argument("--scripts", default=os.path.join(CONVERSATIONS_DIR, "*.json"),
+                        help="glob of conversation scripts")
+    parser.add_argument("--seed", default="orderbot", help="seed for think times and script choice")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--verbose", action="store_true", help="keep the nodes' debug output")
+    args = parser.parse_args(argv)
+
+    conversations = load_conversations(args.scripts)
+    options = {
+        "duration": args.duration, "ramp_up": args.ramp_up, "think": args.think, "latency": args.latency,
+        "jitter": args.jitter, "combined": args.combined, "checkpoint": args.checkpoint, "seed": args.seed,
+        "processes": max(args.processes, 1), "slo_p95": args.slo_p95, "verbose": args.verbose,
+    }
+    levels = []
+    for users in (int(u) for u in args.users.split(",")):
+        level = run_level(users, options, conversations)
+        print_level(level)
+        levels.append(level)
+    if len(levels) > 1 or args.slo_p95:
+        print_capacity(levels, args.slo_p95)
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    report = {
+        "meta": {
+            "timestamp": timestamp,
+            "git_revision": git_revision(),
+            "cpu_count": os.cpu_count(),
+            **{key: value for key, value in options.items() if key != "verbose"},
+            "scripts": [c["name"] for c in conversations],
+        },
+        "levels": levels,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{timestamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# benchmarks/run_benchmark.py
+"""
+Replays scripted conversations through `app.build_graph` with a scripted LLM
+(see benchmarks/scripted_llm.py) and reports where each turn's time goes.
+
+    python benchmarks/run_benchmark.py --latency 0.3 --iterations 5
+    python benchmarks/run_benchmark.py --mode async --concurrency 20 --combined
+    python benchmarks/run_benchmark.py --compare benchmarks/results/<earlier>.json
+
+Reports per-node wall time, LLM calls per turn, prompt sizes and turns per
+second, checks each turn's `expect` block, and saves the results as JSON
+(benchmarks/results/ by default) so runs can be compared.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep benchmark orders and checkpoints out of the real databases. Worker
+# processes (benchmarks/load_test.py) inherit the directory through the env.
+if "ORDERBOT_BENCH_DIR" not in os.environ:
+    os.environ["ORDERBOT_BENCH_DIR"] = tempfile.mkdtemp(prefix="orderbot-bench-")
+_workdir = os.environ["ORDERBOT_BENCH_DIR"]
+os.environ["ORDERS_DB"] = os.path.join(_workdir, "orders.db")
+os.environ["ORDER_STORE"] = "sqlite"
+os.environ["CHECKPOINT_DB"] = ""
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+import app  # noqa: E402
+from core.intent_cache import intent_cache  # noqa: E402
+from core.intent_rules import fast_path_stats, reset_stats  # noqa: E402
+from scripted_llm import ScriptedLLM, turn_script  # noqa: E402
+
+CONVERSATIONS_DIR = os.path.join(ROOT, "benchmarks", "conversations")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+CHARS_PER_TOKEN = 4  # rough estimate for prompt token counts
+
+
+class TurnRecorder(BaseCallbackHandler):
+    """Collects node timings and LLM prompt sizes for one turn."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started: Dict[Any, Tuple[str, float]] = {}
+        self.node_ms: List[Tuple[str, float]] = []
+        self.llm_calls: List[Tuple[str, int]] = []  # (node, prompt chars)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # The node's own run, not the chains running inside it
+        if node and kwargs.get("name") == node:
+            with self.lock:
+                self.started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self.lock:
+            entry = self.started.pop(run_id, None)
+            if entry:
+                self.node_ms.append((entry[0], (time.perf_counter() - entry[1]) * 1000))
+
+    on_chain_error = on_chain_end
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        with self.lock:
+            self.llm_calls.append((node, chars))
+
+
+def load_conversations(pattern: str) -> List[Dict[str, Any]]:
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise SystemExit(f"No conversation scripts match {pattern}")
+    conversations = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            conversations.append(json.load(f))
+    return conversations
+
+
+def check_expectations(state, expect: Dict[str, Any]) -> List[str]:
+    problems = []
+    for key, wanted in expect.items():
+        got = state.get(key)
+        if isinstance(wanted, float) and isinstance(got, (int, float)):
+            ok = abs(got - wanted) < 1e-6
+        else:
+            ok = got == wanted
+        if not ok:
+            problems.append(f"{key}: expected {wanted!r}, got {got!r}")
+    return problems
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(percentile(values, 0.50), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+class Results:
+    """Accumulates per-turn measurements from every conversation."""
+
+    def __init__(self):
+        self.turn_ms: List[float] = []
+        self.llm_calls_per_turn: List[int] = []
+        self.node_ms: Dict[str, List[float]] = defaultdict(list)
+        self.prompt_chars: Dict[str, List[int]] = defaultdict(list)
+        self.mismatches: List[str] = []
+
+    def add(self, where: str, elapsed_ms: float, recorder: TurnRecorder, problems: List[str]) -> None:
+        self.turn_ms.append(elapsed_ms)
+        self.llm_calls_per_turn.append(len(recorder.llm_calls))
+        for node, ms in recorder.node_ms:
+            self.node_ms[node].append(ms)
+        for node, chars in recorder.llm_calls:
+            self.prompt_chars[node].append(chars)
+        self.mismatches.extend(f"{where}: {p}" for p in problems)
+
+    def report(self, wall_s: float, meta: Dict[str, Any]) -> Dict[str, Any]:
+        all_prompts = [c for chars in self.prompt_chars.values() for c in chars]
+        turns = len(self.turn_ms)
+        return {
+            "meta": meta,
+            "turns": turns,
+            "wall_time_s": round(wall_s, 3),
+            "turns_per_sec": round(turns / wall_s, 2) if wall_s else 0.0,
+            "turn_latency_ms": summarize(self.turn_ms),
+            "llm_calls": sum(self.llm_calls_per_turn),
+            "llm_calls_per_turn": summarize(self.llm_calls_per_turn),
+            "prompt_chars": summarize(all_prompts),
+            "prompt_tokens_est": summarize([c / CHARS_PER_TOKEN for c in all_prompts]),
+            "prompt_chars_by_node": {node: summarize(v) for node, v in sorted(self.prompt_chars.items())},
+            "node_ms": {node: summarize(v) for node, v in sorted(self.node_ms.items())},
+            "classification": fast_path_stats(),
+            "mismatches": self.mismatches,
+        }
+
+
+def run_sync(graph, conversations, iterations: int, results: Results) -> None:
+    for iteration in range(iterations):
+        for conversation in conversations:
+            state = app.create_initial_state(f"bench-{conversation['name']}-{iteration}")
+            for number, turn in enumerate(conversation["turns"], 1):
+                turn_script.set(turn.get("llm", {}))
+                recorder = TurnRecorder()
+                start = time.perf_counter()
+                graph_input, config = app.start_turn(graph, state, turn["user"])
+                state = graph.invoke(graph_input, {**config, "callbacks": [recorder]})
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                problems = check_expectations(state, turn.get("expect", {}))
+                results.add(f"{conversation['name']}#{number}", elapsed_ms, recorder, problems)
+
+
+async def run_async(graph, conversations, iterations: int, concurrency: int, results: Results) -> None:
+    async def converse(conversation, user_id: str) -> None:
+        state = app.create_initial_state(user_id)
+        for number, turn in enumerate(conversation["turns"], 1):
+            turn_script.set(turn.get("llm", {}))
+            recorder = TurnRecorder()
+            start = time.perf_counter()
+            graph_input, config = await app.astart_turn(graph, state, turn["user"])
+            state = await graph.ainvoke(graph_input, {**config, "callbacks": [recorder]})
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            problems = check_expectations(state, turn.get("expect", {}))
+            results.add(f"{conversation['name']}#{number}", elapsed_ms, recorder, problems)
+
+    for iteration in range(iterations):
+        await asyncio.gather(*(
+            converse(conversation, f"bench-{conversation['name']}-{iteration}-{n}")
+            for conversation in conversations
+            for n in range(concurrency)
+        ))
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    meta = report["meta"]
+    print(f"\n== {report['turns']} turns in {report['wall_time_s']}s "
+          f"({report['turns_per_sec']} turns/s) | mode={meta['mode']} latency={meta['latency']}s "
+          f"concurrency={meta['concurrency']} combined={meta['combined']}")
+    latency = report["turn_latency_ms"]
+    print(f"turn latency ms: mean {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  max {latency['max']}")
+    calls = report["llm_calls_per_turn"]
+    print(f"LLM calls: {report['llm_calls']} total, {calls['mean']} per turn (max {calls['max']})")
+    tokens = report["prompt_tokens_est"]
+    print(f"prompt size: mean {report['prompt_chars']['mean']} chars (~{tokens['mean']} tokens), max ~{tokens['max']} tokens")
+    stats = report["classification"]
+    print(f"classification: fast path {stats['fast_path']}, cache {stats['cache']}, llm {stats['llm']}")
+
+    print(f"\n{'node':<18}{'calls':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'prompt chars':>14}")
+    for node, timing in report["node_ms"].items():
+        prompt = report["prompt_chars_by_node"].get(node, {}).get("mean", "-")
+        print(f"{node:<18}{timing['count']:>7}{timing['mean']:>10}{timing['p50']:>10}{timing['p95']:>10}{prompt:>14}")
+
+    if report["mismatches"]:
+        print(f"\n{len(report['mismatches'])} expectation mismatches:")
+        for problem in report["mismatches"][:20]:
+            print(f"  - {problem}")
+
+
+COMPARED_METRICS = [
+    ("turns_per_sec", lambda r: r["turns_per_sec"], True),
+    ("turn p50 ms", lambda r: r["turn_latency_ms"]["p50"], False),
+    ("turn p95 ms", lambda r: r["turn_latency_ms"]["p95"], False),
+    ("LLM calls/turn", lambda r: r["llm_calls_per_turn"]["mean"], False),
+    ("prompt tokens (mean)", lambda r: r["prompt_tokens_est"]["mean"], False),
+]
+
+
+def print_comparison(baseline: Dict[str, Any], report: Dict[str, Any]) -> None:
+    print(f"\nvs baseline {baseline['meta'].get('git_revision')} ({baseline['meta'].get('timestamp')}):")
+    for label, metric, higher_is_better in COMPARED_METRICS:
+        old, new = metric(baseline), metric(report)
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        flag = "  <-- regression" if worse and abs(change) >= 10 else ""
+        print(f"  {label:<22}{old:>10} -> {new:<10} ({change:+.1f}%){flag}")
+
+
+def main(argv=None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scripts", default=os.path.join(CONVERSATIONS_DIR, "*.json"),
+                        help="glob of conversation scripts")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per LLM call")
+    parser.add_argument("--iterations", type=int, default=3, help="times each script is replayed")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="async mode: copies of each conversation run at once")
+    parser.add_argument("--combined", action="store_true", help="use the single-call classify-and-act graph")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the nodes' debug output")
+    args = parser.parse_args(argv)
+
+    conversations = load_conversations(args.scripts)
+    graph = app.build_graph(llm=ScriptedLLM(latency=args.latency), use_async=args.mode == "async",
+                            checkpointer=False, combined=args.combined)
+    intent_cache.clear()
+    reset_stats()
+
+    results = Results()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with quiet:
+        if args.mode == "async":
+            asyncio.run(run_async(graph, conversations, args.iterations, args.concurrency, results))
+        else:
+            run_sync(graph, conversations, args.iterations, results)
+    wall_s = time.perf_counter() - start
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    report = results.report(wall_s, {
+        "timestamp": timestamp,
+        "git_revision": git_revision(),
+        "mode": args.mode,
+        "latency": args.latency,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency if args.mode == "async" else 1,
+        "combined": args.combined,
+        "scripts": [c["name"] for c in conversations],
+        "python": platform.python_version(),
+    })
+    print_report(report)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{timestamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/scripted_llm.py
+"""
+A deterministic stand-in for the Gemini chat model.
+
+`ScriptedLLM` recognises which node is calling it from the prompt, answers with
+the response the current turn's script gives for that node (see `turn_script`)
+or a neutral default, and sleeps `latency` seconds per call (varied by up to
+±`jitter` of that) to mimic a network round-trip. No network access or API key
+is needed.
+"""
+import asyncio
+import contextvars
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Prompt fragment -> node; the first match wins
+PROMPT_MARKERS = [
+    ("intent classification assistant", "classify_intent"),
+    ("expert restaurant ordering assistant", "handle_order"),
+    ("restaurant delivery assistant", "take_address"),
+    ("asked for suggestions", "suggest_order"),
+    ("friendly restaurant assistant", "chit_chat"),
+]
+
+DEFAULT_RESPONSES: Dict[str, Any] = {
+    "classify_intent": {"intent": "chit_chat"},
+    "handle_order": {"items": [], "bot_message": "Okay, got it!"},
+    "take_address": {"final_address": "", "address_valid": False},
+    "suggest_order": "You could try the chicken biryani with a mint margarita.",
+    "chit_chat": "Happy to help! We're open from noon till midnight.",
+}
+
+
+# Responses for the turn being replayed, keyed by node name. A context variable,
+# so concurrent conversations (asyncio tasks) each see their own script.
+turn_script: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("turn_script", default={})
+
+
+def node_for_prompt(text: str) -> str:
+    for marker, node in PROMPT_MARKERS:
+        if marker in text:
+            return node
+    return "chit_chat"
+
+
+class ScriptedLLM(BaseChatModel):
+    """Chat model that replays scripted per-node responses with a fixed latency."""
+
+    latency: float = 0.0
+    jitter: float = 0.0     # fraction of `latency`, e.g. 0.3 for ±30%
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _delay(self) -> float:
+        return max(self.latency * (1 + random.uniform(-self.jitter, self.jitter)), 0.0)
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        node = node_for_prompt(prompt)
+        response = turn_script.get().get(node, DEFAULT_RESPONSES[node])
+        text = response if isinstance(response, str) else json.dumps(response)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self._delay())
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self._delay())
+        return self._respond(messages)
@@ -0,0 +1,56 @@
+# chat_client.py
+import json
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+class ChatClient:
+    """Minimal client for the JSON API in server.py."""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request = Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def state(self, user_id: str) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """The user's public state and recent messages, without starting a session."""
+        url = f"{self.base_url}/state?{urlencode({'user_id': user_id})}"
+        with urlopen(url, timeout=self.timeout) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        return payload["state"], payload.get("messages", [])
+
+    def chat(self, user_id: str, message: str) -> Tuple[str, Dict[str, Any]]:
+        """Sends one user message; returns (bot reply, public state)."""
+        response = self._post("/chat", {"user_id": user_id, "message": message})
+        return response["reply"], response["state"]
+
+    def chat_stream(self, user_id: str, message: str) -> Iterator[Tuple[str, Any]]:
+        """Yields ("token", text) as the reply streams in, then ("done", (reply, state))."""
+        request = Request(
+            f"{self.base_url}/chat/stream",
+            data=json.dumps({"user_id": user_id, "message": message}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urlopen(request, timeout=self.timeout) as response:
+            for line in response:
+                event = json.loads(line.decode("utf-8"))
+                if "token" in event:
+                    yield "token", event["token"]
+                elif "error" in event:
+                    raise RuntimeError(event["error"])
+                else:
+                    yield "done", (event["reply"], event["state"])
+
+    def reset(self, user_id: str) -> None:
+        self._post("/reset", {"user_id": user_id})
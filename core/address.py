@@ -0,0 +1,88 @@
+# core/address.py
+"""
+Local address checks for take_address.
+
+`prevalidate` settles the easy cases without an LLM call: clearly vague
+replies ("my home", "ghar") are rejected, and well-formed Pakistani addresses
+(a house/flat/plot number plus a street, block, sector or area) are accepted.
+Anything in between is "unsure" and goes to the LLM as before.
+"""
+import re
+from typing import List, Optional, Tuple
+from core.intent_rules import normalize
+
+# "House 12", "H# 45", "flat 3-B", "plot no. 7"
+HOUSE_RE = re.compile(
+    r"\b(house|home|h|plot|flat|apartment|apt|suite|shop|office|building|bldg|makan|ghar)"
+    r"\s*(no\.?|number|#|:)?\s*#?\s*\d+[a-z]?(\s*[/-]\s*\d*[a-z]?)?\b",
+    re.IGNORECASE,
+)
+AREA_RE = re.compile(
+    r"\b(street|st|road|rd|lane|ln|avenue|ave|boulevard|blvd|block|blk|sector|phase|gali|"
+    r"mohalla|muhalla|colony|town|society|scheme|housing|cantt|bazar|bazaar|market|chowk|nagar)\b"
+    r"|\b[a-z]-\d{1,2}(/\d)?\b",  # Islamabad sectors, e.g. F-10/2
+    re.IGNORECASE,
+)
+LANDMARK_RE = re.compile(
+    r"\b(near|opposite|opp|behind|beside|next to|in front of|paas|samne|masjid|mosque|school|"
+    r"hospital|plaza|mall|park|stop|station)\b",
+    re.IGNORECASE,
+)
+NUMBER_RE = re.compile(r"\b\d+[a-z]?\b", re.IGNORECASE)
+VAGUE_RE = re.compile(
+    r"((my|mera|meray|mere|the|same|usual|our|hamara) )*"
+    r"(home|house|ghar|office|work|place|flat|apartment|here|there|address|usual|same)"
+    r"( (address|pe|par|per|hi|please))*"
+    r"|same as (before|last time)"
+)
+LEAD_IN_RE = re.compile(
+    r"^(my address is|address is|address|deliver it to|deliver to|send it to|mera address|to)\s*[:,-]?\s+",
+    re.IGNORECASE,
+)
+MIN_ADDRESS_WORDS = 3
+
+VALID, INVALID, UNSURE = "valid", "invalid", "unsure"
+
+
+def _clean(address: str) -> str:
+    return address.strip().strip(" .,!;:-")
+
+
+def prevalidate(message: str) -> Tuple[str, Optional[str]]:
+    """
+    Returns (VALID, address), (INVALID, None) or (UNSURE, None).
+    The address is the whole message minus a lead-in like "my address is", so
+    parts before the house number (area, landmark) are kept.
+    """
+    text = normalize(message)
+    body = LEAD_IN_RE.sub("", text)
+    if not body or VAGUE_RE.fullmatch(body):
+        return INVALID, None
+
+    has_number = bool(NUMBER_RE.search(text))
+    has_area = bool(AREA_RE.search(message))
+    if not has_number and not has_area and not LANDMARK_RE.search(message) and len(body.split()) <= 4:
+        return INVALID, None
+
+    if HOUSE_RE.search(message) or (has_area and NUMBER_RE.search(message)):
+        candidate = _clean(LEAD_IN_RE.sub("", message.strip()))
+        if AREA_RE.search(candidate) and len(candidate.split()) >= MIN_ADDRESS_WORDS:
+            return VALID, candidate
+    return UNSURE, None
+
+
+def address_key(address: str) -> str:
+    """Comparison key, so "House 12, St. 4" and "house 12 st 4" are the same address."""
+    return normalize(address).replace("'", "")
+
+
+def match_saved(message: str, saved: List[str]) -> Optional[str]:
+    """A previously validated address the message repeats, if any."""
+    words = address_key(message).split()
+    for address in saved:
+        saved_words = address_key(address).split()
+        # Whole words only: "house 1 street 2" must not match "house 1 street 22"
+        size = len(saved_words)
+        if size and any(words[i:i + size] == saved_words for i in range(len(words) - size + 1)):
+            return address
+    return None
@@ -0,0 +1,171 @@
+# core/cart.py
+"""
+Cart keyed by (item, customization set).
+
+`state["order_items"]` stays a plain list of OrderItem dicts (that's what is
+checkpointed and shown to the customer); `Cart` works on a copy of it for the
+turn that changes it and writes it back with `to_state`:
+- lines are indexed by key, and per item, so add/update/remove don't scan the
+  cart;
+- customizations are de-duplicated (case-insensitively) and capped at
+  MAX_CUSTOMIZATIONS per line, so repeated "extra spicy" requests don't grow
+  the line;
+- each line snapshots its unit price from the menu when it is first added, and
+  the total is kept in integer cents and adjusted per change instead of being
+  recomputed over the whole cart.
+
+Two lines of the same item with different customizations stay separate, e.g.
+"10x biryani" and "5x biryani (extra spicy)" on a catering order.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from menu.catalog import current_menu
+from core.state import ChatState, OrderItem
+
+MAX_CUSTOMIZATIONS = 10
+
+CartKey = Tuple[str, Tuple[str, ...]]
+
+
+def normalize_customizations(customizations: Optional[Iterable[str]]) -> List[str]:
+    """Trimmed, de-duplicated customizations in their original order (first spelling wins)."""
+    seen = set()
+    result: List[str] = []
+    for customization in customizations or []:
+        text = " ".join(str(customization).split())
+        folded = text.lower()
+        if not text or folded in seen:
+            continue
+        seen.add(folded)
+        result.append(text)
+        if len(result) >= MAX_CUSTOMIZATIONS:
+            break
+    return result
+
+
+def cart_key(item: str, customizations: Iterable[str]) -> CartKey:
+    return item, tuple(sorted(c.lower() for c in customizations))
+
+
+def _cents(price: float) -> int:
+    return int(round(price * 100))
+
+
+class Cart:
+    """Keyed view over a list of cart lines with a running total."""
+
+    def __init__(self, lines: Optional[List[OrderItem]] = None, total_cost: Optional[float] = None):
+        menu = current_menu()
+        self.lines: Dict[CartKey, OrderItem] = {}
+        self.by_item: Dict[str, Dict[CartKey, OrderItem]] = {}
+        priced = True
+        for line in lines or []:
+            # Copied, so building a Cart never edits the caller's state
+            line = {**line, "customizations": normalize_customizations(line.get("customizations"))}
+            if "unit_price" not in line:
+                # Carts saved before prices were snapshotted
+                line["unit_price"] = menu.price(line["item"])
+                priced = False
+            key = cart_key(line["item"], line["customizations"])
+            existing = self.lines.get(key)
+            if existing is not None:
+                existing["quantity"] += line["quantity"]
+                continue
+            self._index(key, line)
+        if priced and total_cost is not None:
+            self.total_cents = _cents(total_cost)
+        else:
+            self.total_cents = sum(line["quantity"] * _cents(line["unit_price"]) for line in self.lines.values())
+
+    @classmethod
+    def from_state(cls, state: ChatState) -> "Cart":
+        return cls(state["order_items"], state.get("total_cost"))
+
+    def to_state(self, state: ChatState) -> None:
+        state["order_items"] = list(self.lines.values())
+        state["total_cost"] = self.total
+
+    @property
+    def total(self) -> float:
+        return self.total_cents / 100
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def _index(self, key: CartKey, line: OrderItem) -> None:
+        self.lines[key] = line
+        self.by_item.setdefault(line["item"], {})[key] = line
+
+    def _drop(self, key: CartKey) -> None:
+        line = self.lines.pop(key)
+        item_lines = self.by_item[line["item"]]
+        del item_lines[key]
+        if not item_lines:
+            del self.by_item[line["item"]]
+
+    def _set_quantity(self, key: CartKey, quantity: int) -> None:
+        line = self.lines[key]
+        self.total_cents += (quantity - line["quantity"]) * _cents(line["unit_price"])
+        if quantity > 0:
+            line["quantity"] = quantity
+        else:
+            self._drop(key)
+
+    def _find(self, item: str, customizations: List[str]) -> Optional[CartKey]:
+        """The line a change refers to: the exact match, else the item's newest line."""
+        key = cart_key(item, customizations)
+        if key in self.lines:
+            return key
+        item_lines = self.by_item.get(item)
+        return next(reversed(item_lines)) if item_lines else None
+
+    def add(self, item: str, quantity: int, customizations: Optional[Iterable[str]] = None) -> None:
+        customizations = normalize_customizations(customizations)
+        if quantity <= 0:
+            return
+        # Only the same item with the same customizations is topped up; "1 biryani" after
+        # "2 biryani extra raita" is a separate plain line
+        key = cart_key(item, customizations)
+        if key in self.lines:
+            self._set_quantity(key, self.lines[key]["quantity"] + quantity)
+            return
+        line: OrderItem = {
+            "item": item,
+            "quantity": quantity,
+            "customizations": customizations,
+            "unit_price": current_menu().price(item),
+        }
+        self._index(key, line)
+        self.total_cents += quantity * _cents(line["unit_price"])
+
+    def update(self, item: str, quantity: int, customizations: Optional[Iterable[str]] = None) -> None:
+        customizations = normalize_customizations(customizations)
+        key = self._find(item, customizations)
+        if key is None:
+            return
+        new_key = cart_key(item, customizations)
+        if customizations and new_key != key:
+            # New customizations for the item's newest line (an exact match would have been found)
+            line = self.lines[key]
+            self._set_quantity(key, 0)
+            self._index(new_key, {**line, "quantity": 0, "customizations": customizations})
+            key = new_key
+        self._set_quantity(key, quantity)
+
+    def remove(self, item: str, quantity: int, customizations: Optional[Iterable[str]] = None) -> None:
+        """Removes `quantity` units, from the matching line first, then the item's newest lines."""
+        customizations = normalize_customizations(customizations)
+        exact = cart_key(item, customizations)
+        keys = [exact] if exact in self.lines else []
+        keys += [key for key in reversed(self.by_item.get(item, {})) if key != exact]
+        for key in keys:
+            if quantity <= 0:
+                break
+            taken = min(quantity, self.lines[key]["quantity"])
+            self._set_quantity(key, self.lines[key]["quantity"] - taken)
+            quantity -= taken
+
+
+def describe_line(line: OrderItem) -> str:
+    """One cart line for prompts, e.g. "- biryani (x2, extra spicy)"."""
+    custom = f", {', '.join(line['customizations'])}" if line.get("customizations") else ""
+    return f"- {line['item']} (x{line['quantity']}{custom})"
@@ -0,0 +1,384 @@
+# core/checkpoint.py
+"""
+Durable per-user conversation checkpoints.
+
+`SqliteDeltaSaver` is a LangGraph checkpointer backed by a local SQLite file.
+Like LangGraph's in-memory saver it stores every channel value as its own blob
+keyed by channel version, and a checkpoint row only records which versions it
+points at. Together with nodes that return only the keys they changed (see
+`delta_node`), a turn writes the channels that actually changed (usually just
+`messages` and `intent`) instead of a full copy of ChatState.
+
+Threads are keyed by `user_id`, so any worker that opens the same database can
+resume a conversation, and idle sessions can be dropped from RAM at any time.
+Only the latest CHECKPOINT_KEEP checkpoints of a thread are kept (0 keeps all):
+each `put` deletes older ones with their pending writes and any blob that no
+kept checkpoint points at, so the file grows with users, not with turns.
+"""
+import asyncio
+import copy
+import functools
+import os
+import random
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from core.state import ChatState
+from core.tenancy import current_tenant
+
+CHECKPOINT_DB = os.environ.get("CHECKPOINT_DB", "checkpoints.db")
+CHECKPOINT_KEEP = int(os.environ.get("CHECKPOINT_KEEP", 10))
+
+
+def thread_config(user_id: str) -> RunnableConfig:
+    """Graph config that binds a run to the user's checkpoint thread."""
+    return {"configurable": {"thread_id": str(user_id)}}
+
+
+def delta_node(node: Callable[[ChatState], Any]) -> Callable[[ChatState], Any]:
+    """
+    Wraps a node (sync or async) that mutates and returns the whole state so it
+    returns only the keys whose values changed. Unchanged channels keep their
+    version, so the checkpointer doesn't write them again.
+    """
+    def changed(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in after.items() if before.get(key, object()) != value}
+
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state: ChatState) -> Dict[str, Any]:
+            before = copy.deepcopy(state)
+            return changed(before, await node(state))
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state: ChatState) -> Dict[str, Any]:
+        before = copy.deepcopy(state)
+        return changed(before, node(state))
+    return wrapper
+
+
+class SqliteDeltaSaver(BaseCheckpointSaver[str]):
+    """SQLite checkpointer that stores channel values once per version (deltas)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id     TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_id     TEXT,
+        type          TEXT NOT NULL,
+        checkpoint    BLOB NOT NULL,
+        metadata_type TEXT NOT NULL,
+        metadata      BLOB NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+        thread_id     TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        channel       TEXT NOT NULL,
+        version       TEXT NOT NULL,
+        type          TEXT NOT NULL,
+        blob          BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+    );
+    CREATE TABLE IF NOT EXISTS checkpoint_writes (
+        thread_id     TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id       TEXT NOT NULL,
+        idx           INTEGER NOT NULL,
+        channel       TEXT NOT NULL,
+        type          TEXT NOT NULL,
+        blob          BLOB,
+        task_path     TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    );
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB, serde=None, keep: int = CHECKPOINT_KEEP):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep = keep
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    # --- Reads ---
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = self.conn.execute(
+                "SELECT type, blob FROM checkpoint_blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row and row[0] != "empty":
+                values[channel] = self.serde.loads_typed((row[0], row[1]))
+        return values
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, blob, metadata_type, metadata = row
+        checkpoint = self.serde.loads_typed((type_, blob))
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, blob FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, w_blob)))
+                for task_id, channel, w_type, w_blob in writes
+            ],
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id,
+                }}
+                if parent_id else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._to_tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+            if "checkpoint_ns" in config["configurable"]:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *rest in rows:
+                item = self._to_tuple(thread_id, checkpoint_ns, rest)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    # --- Writes ---
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values: Dict[str, Any] = stored.pop("channel_values")
+        type_, blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self.lock, self.conn:
+            # Only channels with a new version are written; the rest are shared with older checkpoints
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (thread_id, checkpoint_ns, channel, str(version),
+                     *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)))
+                    for channel, version in new_versions.items()
+                ],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, blob, metadata_type, metadata_blob),
+            )
+            if self.keep > 0:
+                self._prune(thread_id, checkpoint_ns)
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) overwrite; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(c in WRITES_IDX_MAP for c, _ in writes) else "INSERT OR IGNORE"
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"{verb} INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                     channel, *self.serde.dumps_typed(value), task_path)
+                    for idx, (channel, value) in enumerate(writes)
+                ],
+            )
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Deletes all but the latest `keep` checkpoints of a thread (call with the lock held, in a transaction)."""
+        where = "thread_id = ? AND checkpoint_ns = ?"
+        old = self.conn.execute(
+            f"SELECT checkpoint_id FROM checkpoints WHERE {where} "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep),
+        ).fetchall()
+        if not old:
+            return
+        for table in ("checkpoints", "checkpoint_writes"):
+            self.conn.executemany(
+                f"DELETE FROM {table} WHERE {where} AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_id, in old],
+            )
+        # A blob is shared by every checkpoint whose channel version it is, so keep those still referenced
+        referenced = set()
+        for type_, blob in self.conn.execute(f"SELECT type, checkpoint FROM checkpoints WHERE {where}",
+                                             (thread_id, checkpoint_ns)):
+            versions = self.serde.loads_typed((type_, blob))["channel_versions"]
+            referenced.update((channel, str(version)) for channel, version in versions.items())
+        blobs = self.conn.execute(f"SELECT channel, version FROM checkpoint_blobs WHERE {where}",
+                                  (thread_id, checkpoint_ns)).fetchall()
+        self.conn.executemany(
+            f"DELETE FROM checkpoint_blobs WHERE {where} AND channel = ? AND version = ?",
+            [(thread_id, checkpoint_ns, channel, version) for channel, version in blobs
+             if (channel, version) not in referenced],
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.lock, self.conn:
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (str(thread_id),))
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- Async API (SQLite work runs in a worker thread) ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer: Optional[SqliteDeltaSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def default_checkpointer() -> Optional[SqliteDeltaSaver]:
+    """
+    The SQLite checkpointer (the active tenant's checkpoints.db, else CHECKPOINT_DB),
+    or None if CHECKPOINT_DB is set to ''.
+    """
+    global _checkpointer
+    if not CHECKPOINT_DB:
+        return None
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant.resource("checkpointer", lambda t: SqliteDeltaSaver(t.path("checkpoints.db")))
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SqliteDeltaSaver(CHECKPOINT_DB)
+    return _checkpointer
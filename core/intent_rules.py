@@ -0,0 +1,172 @@
+# core/intent_rules.py
+import re
+import threading
+from typing import Dict, Optional, Set
+from menu.catalog import MenuVersion, current_menu
+from core.state import ChatState
+from core.metrics import metrics
+
+# --- Lexicon (English + Roman Urdu) ---
+GREETING_RE = re.compile(
+    r"^(hi+|hello|hey+|hiya|yo|salam|salaam|assalam\w*|asalam\w*|aoa|slam|"
+    r"good (morning|afternoon|evening))\b"
+)
+MENU_RE = re.compile(
+    r"\b(menu|menyu|what do you (have|serve|sell)|what(')?s available|"
+    r"kya (hai|milta|milega)|kya kya hai|dikhao menu)\b"
+)
+DISPLAY_RE = re.compile(
+    r"\b(show( me)?( my)? (order|cart)|^my (current )?(order|cart)$|what did i order|"
+    r"what('s| is) in my (order|cart)|mera order (dikhao|batao|kya hai)|cart dikhao)\b"
+)
+TRACK_RE = re.compile(
+    r"\b(track|tracking|order status|status of my order|where('s| is) (my |the )?(last )?(order|food)|"
+    r"kahan (hai|pohanch)|kitni der|kab (aye|aaye|ayega|aayega))\b"
+)
+SUGGEST_RE = re.compile(
+    r"\b(suggest\w*|recommend\w*|what('s| is) good|what should i (get|order|have)|"
+    r"kya acha hai|kya lun|kya order karun|best (dish|item))\b"
+)
+CHECKOUT_RE = re.compile(
+    r"\b(checkout|check out|that('s| is) (all|it)|nothing else|bas|done|finish|"
+    r"place (my |the )?order|confirm (my |the )?order|order (kar|karo|kardo|confirm))\b"
+)
+AFFIRM_WORDS = (
+    r"(yes|yeah|yep|yup|ok|okay|sure|confirm|confirmed|go ahead|haan|han|ha|ji|"
+    r"jee|theek hai|thik hai|theek|done|correct|right|please|it|order)"
+)
+AFFIRM_RE = re.compile(rf"^{AFFIRM_WORDS}( {AFFIRM_WORDS})*$")
+DECLINE_RE = re.compile(
+    r"^(no|nope|nah|nahi|nahin|na|not (that|this)( one)?|(a )?(new|different|another|naya|doosra) address)"
+    r"( (please|thanks|ji))*$"
+)
+ORDER_VERB_RE = re.compile(
+    r"\b(add|want|order|give|get|remove|delete|cancel|change|make it|update|"
+    r"chahiye|dedo|de do|daal|daldo|hata|hatao|nikal|\d+)\b"
+)
+ADDRESS_PROMPT_RE = re.compile(r"\baddress\b")
+
+
+def _menu_item_re(menu: MenuVersion) -> "re.Pattern":
+    """Menu item phrases, e.g. "chicken biryani", matched on word boundaries."""
+    return re.compile(
+        r"\b(" + "|".join(
+            re.escape(name.replace("_", " "))
+            for name in sorted(menu.items, key=len, reverse=True)
+        ) + r")s?\b"
+    )
+
+# --- Fast-path usage counters ---
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"fast_path": 0, "cache": 0, "llm": 0}
+
+
+def record_classification(path: str) -> None:
+    """Counts one classification served by `path` ("fast_path", "cache" or "llm")."""
+    with _stats_lock:
+        _stats[path] = _stats.get(path, 0) + 1
+    metrics.inc("orderbot_intent_classifications_total", path=path)
+
+
+def fast_path_stats() -> Dict[str, float]:
+    """Returns per-path counts plus the fast-path and LLM rates."""
+    with _stats_lock:
+        fast, cached, slow = _stats["fast_path"], _stats["cache"], _stats["llm"]
+    total = fast + cached + slow
+    return {
+        "fast_path": fast,
+        "cache": cached,
+        "llm": slow,
+        "total": total,
+        "fast_path_rate": fast / total if total else 0.0,
+        "llm_rate": slow / total if total else 0.0,
+    }
+
+
+def reset_stats() -> None:
+    """Resets the fast-path usage counters."""
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def normalize(text: str) -> str:
+    """Lowercases and strips punctuation so the lexicon can match plain words."""
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s']", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _last_assistant_message(state: ChatState) -> str:
+    for message in reversed(state["messages"][:-1]):
+        if message["role"] == "assistant":
+            return message["content"].lower()
+    return ""
+
+
+def _checkout_intent(state: ChatState) -> str:
+    """Next step of the checkout flow, based on the state flags."""
+    if not state.get("delivery_address"):
+        return "take_address"
+    if not state.get("is_confirmed") or state.get("status") != "awaiting_confirmation":
+        return "confirm_order"
+    return "place_order"
+
+
+def fast_classify(state: ChatState) -> Optional[str]:
+    """
+    Deterministic intent pre-classifier.
+    Returns an intent when exactly one rule fires for the latest user message,
+    otherwise None so the caller can fall back to the LLM.
+    """
+    if not state["messages"] or state["messages"][-1]["role"] != "user":
+        return None
+
+    text = normalize(state["messages"][-1]["content"])
+    if not text:
+        return None
+
+    words = text.split()
+    has_items = bool(state.get("order_items"))
+    candidates: Set[str] = set()
+
+    # Answer to "deliver to your saved address?" (only right after the offer)
+    suggested = state.get("suggested_address")
+    if (suggested and suggested.lower() in _last_assistant_message(state)
+            and (AFFIRM_RE.match(text) or DECLINE_RE.match(text))):
+        return "take_address"
+
+    # Bare confirmations ("yes", "haan ji") move the checkout flow forward
+    # Only while an order is awaiting confirmation: "ok" after "order placed" must not place it again
+    if AFFIRM_RE.match(text) and state.get("status") == "awaiting_confirmation":
+        if state.get("is_confirmed"):
+            return "place_order"
+        if state.get("delivery_address"):
+            return "confirm_order"
+
+    if GREETING_RE.match(text) and len(words) <= 4:
+        candidates.add("greetings")
+    if MENU_RE.search(text):
+        candidates.add("send_menu")
+    if DISPLAY_RE.search(text):
+        candidates.add("display_orders")
+    if TRACK_RE.search(text):
+        candidates.add("track_order")
+    if SUGGEST_RE.search(text):
+        candidates.add("suggest_order")
+    if CHECKOUT_RE.search(text) and has_items:
+        candidates.add(_checkout_intent(state))
+
+    menu_item_re = current_menu().derived("intent_rules.menu_item_re", _menu_item_re)
+    if menu_item_re.search(text) and ORDER_VERB_RE.search(text):
+        # Ordering before the menu was shown goes to the menu first
+        candidates.add("handle_order" if state.get("menu_sent") else "send_menu")
+
+    # The bot just asked for an address and we don't have one yet
+    if (not candidates and not state.get("delivery_address") and has_items
+            and ADDRESS_PROMPT_RE.search(_last_assistant_message(state))):
+        candidates.add("take_address")
+
+    if len(candidates) == 1:
+        return candidates.pop()
+    return None
@@ -0,0 +1,68 @@
+# core/llm.py
+"""
+The chat model used by the LLM nodes.
+
+The Gemini client is created on first use rather than at import, so importing
+`app` (or starting Streamlit) doesn't pay for `langchain_google_genai` until a
+turn actually needs the model. One client is shared by every graph and
+session, so its HTTP connection pool stays warm.
+
+A graph can use a different model: `app.build_graph(llm=...)` wraps its nodes
+with `bind_llm`, and `current_llm()` returns the bound model while they run.
+"""
+import asyncio
+import functools
+import os
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+
+_default_llm = None
+_default_llm_lock = threading.Lock()
+_bound_llm: ContextVar[Optional[Any]] = ContextVar("orderbot_llm", default=None)
+
+
+def get_default_llm():
+    """The shared Gemini client, created (with .env loaded) on first call."""
+    global _default_llm
+    if _default_llm is None:
+        with _default_llm_lock:
+            if _default_llm is None:
+                from dotenv import load_dotenv
+                from langchain_google_genai import ChatGoogleGenerativeAI
+
+                load_dotenv()
+                _default_llm = ChatGoogleGenerativeAI(
+                    model=GEMINI_MODEL,
+                    api_key=os.environ.get("GOOGLE_API_KEY")
+                )
+    return _default_llm
+
+
+def current_llm():
+    """The model for the running node: the graph's own, else the shared default."""
+    return _bound_llm.get() or get_default_llm()
+
+
+def bind_llm(node: Callable, llm) -> Callable:
+    """Wraps a node (sync or async) so `current_llm()` returns `llm` while it runs."""
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state):
+            token = _bound_llm.set(llm)
+            try:
+                return await node(state)
+            finally:
+                _bound_llm.reset(token)
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state):
+        token = _bound_llm.set(llm)
+        try:
+            return node(state)
+        finally:
+            _bound_llm.reset(token)
+    return wrapper
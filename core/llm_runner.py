@@ -0,0 +1,210 @@
+# core/llm_runner.py
+"""
+Drivers for LLM-backed nodes.
+
+Each LLM node is written once as a generator that yields an `LLMCall` whenever
+it needs a model call and receives the chain's output back (or the exception,
+raised at the `yield`). The same generator can then be driven synchronously with
+`run_llm_steps` or on an event loop with `arun_llm_steps`.
+
+Calls marked `stream=True` are run with `stream`/`astream`; each text chunk is
+published to the graph's custom stream (see `core.streaming`) as it arrives, and
+the joined text is sent back to the node. Every call's latency and outcome
+is recorded in `core.metrics`.
+
+Calls run under the latency budget, hedging and circuit breaker described in
+`core.resilience`; a call that can't be served raises `LLMUnavailableError`
+into the node, which answers with its fallback.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Generator, NamedTuple, Optional, Set
+from langchain_core.exceptions import OutputParserException
+from core.state import ChatState
+from core.metrics import metrics, record_llm_call
+from core.resilience import LLMTimeoutError, breaker, budget_for, latencies
+from core.streaming import get_token_writer, publish_token
+
+# Sync calls run here so they can be abandoned at their deadline
+LLM_MAX_WORKERS = int(os.environ.get("LLM_MAX_WORKERS", 32))
+_pool = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm-call")
+
+
+class LLMCall(NamedTuple):
+    name: str                # node making the call, e.g. "chit_chat"
+    chain: Any
+    inputs: Dict[str, Any]
+    stream: bool = False     # publish tokens as they arrive
+
+
+LLMSteps = Generator[LLMCall, Any, ChatState]
+
+
+def _before_call(call: LLMCall) -> None:
+    try:
+        breaker.before_call()
+    except Exception:
+        metrics.inc("orderbot_llm_calls_total", node=call.name, outcome="rejected")
+        raise
+
+
+def _after_call(call: LLMCall, seconds: float, error: Optional[Exception] = None) -> None:
+    if error is None:
+        record_llm_call(call.name, seconds, "ok")
+        latencies.record(call.name, seconds)
+        breaker.record_success()
+        return
+    record_llm_call(call.name, seconds, "timeout" if isinstance(error, LLMTimeoutError) else "error")
+    # A reply the parser rejects still means the provider is up
+    if isinstance(error, OutputParserException):
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+def _plan(call: LLMCall):
+    """(deadline, hedge_at or None, spare requests) for a call starting now."""
+    budget = budget_for(call.name)
+    now = time.monotonic()
+    if call.stream:
+        return now + budget, None, 0
+    delay = latencies.hedge_delay(call.name, budget) if breaker.allows_hedging else None
+    return now + budget, (None if delay is None else now + delay), 1
+
+
+def _extra_request(call: LLMCall, pending: bool, hedge_at, spare: int) -> bool:
+    """Whether to send the spare request now: a hedge if one is in flight, else a retry."""
+    if not spare or (pending and (hedge_at is None or time.monotonic() < hedge_at)):
+        return False
+    metrics.inc("orderbot_llm_hedges_total", node=call.name, kind="hedge" if pending else "retry")
+    return True
+
+
+def _submit(call: LLMCall) -> Future:
+    # Each request gets its own copy of the context (run config, stream writer)
+    return _pool.submit(contextvars.copy_context().run, _invoke_chain, call)
+
+
+def _invoke(call: LLMCall) -> Any:
+    _before_call(call)
+    start = time.perf_counter()
+    try:
+        result = _invoke_guarded(call)
+    except Exception as e:
+        _after_call(call, time.perf_counter() - start, e)
+        raise
+    _after_call(call, time.perf_counter() - start)
+    return result
+
+
+def _invoke_guarded(call: LLMCall) -> Any:
+    deadline, hedge_at, spare = _plan(call)
+    pending: Set[Future] = {_submit(call)}
+    error = None
+    while True:
+        until = hedge_at if hedge_at is not None else deadline
+        done, pending = wait(pending, timeout=max(until - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if time.monotonic() >= deadline:
+            raise LLMTimeoutError(f"{call.name} got no LLM reply within {budget_for(call.name)}s")
+        if _extra_request(call, bool(pending), hedge_at, spare):
+            spare, hedge_at = 0, None
+            pending.add(_submit(call))
+        elif not pending:
+            raise error
+
+
+async def _ainvoke(call: LLMCall) -> Any:
+    _before_call(call)
+    start = time.perf_counter()
+    try:
+        result = await _ainvoke_guarded(call)
+    except Exception as e:
+        _after_call(call, time.perf_counter() - start, e)
+        raise
+    _after_call(call, time.perf_counter() - start)
+    return result
+
+
+async def _ainvoke_guarded(call: LLMCall) -> Any:
+    deadline, hedge_at, spare = _plan(call)
+    pending: Set[asyncio.Task] = {asyncio.ensure_future(_ainvoke_chain(call))}
+    error = None
+    try:
+        while True:
+            until = hedge_at if hedge_at is not None else deadline
+            done, pending = await asyncio.wait(pending, timeout=max(until - time.monotonic(), 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if time.monotonic() >= deadline:
+                raise LLMTimeoutError(f"{call.name} got no LLM reply within {budget_for(call.name)}s")
+            if _extra_request(call, bool(pending), hedge_at, spare):
+                spare, hedge_at = 0, None
+                pending.add(asyncio.ensure_future(_ainvoke_chain(call)))
+            elif not pending:
+                raise error
+    finally:
+        # The losing or timed-out requests
+        for task in pending:
+            task.cancel()
+
+
+def _invoke_chain(call: LLMCall) -> Any:
+    writer = get_token_writer() if call.stream else None
+    if writer is None:
+        return call.chain.invoke(call.inputs)
+    chunks = []
+    for chunk in call.chain.stream(call.inputs):
+        chunks.append(chunk)
+        publish_token(writer, call.name, chunk)
+    return "".join(chunks)
+
+
+async def _ainvoke_chain(call: LLMCall) -> Any:
+    writer = get_token_writer() if call.stream else None
+    if writer is None:
+        return await call.chain.ainvoke(call.inputs)
+    chunks = []
+    async for chunk in call.chain.astream(call.inputs):
+        chunks.append(chunk)
+        publish_token(writer, call.name, chunk)
+    return "".join(chunks)
+
+
+def run_llm_steps(steps: LLMSteps) -> ChatState:
+    """Runs a node generator, serving each LLM request with a blocking call."""
+    try:
+        call = next(steps)
+        while True:
+            try:
+                result = _invoke(call)
+            except Exception as e:
+                call = steps.throw(e)
+            else:
+                call = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def arun_llm_steps(steps: LLMSteps) -> ChatState:
+    """Runs a node generator, serving each LLM request without blocking the event loop."""
+    try:
+        call = next(steps)
+        while True:
+            try:
+                result = await _ainvoke(call)
+            except Exception as e:
+                call = steps.throw(e)
+            else:
+                call = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,41 @@
+# core/memory.py
+"""
+Bounded conversation memory.
+
+`state["messages"]` keeps only the most recent HISTORY_SIZE messages (the
+classifier needs the last 6). Older messages are folded into `state["summary"]`,
+a short rolling digest with a fixed maximum size, so per-session memory stays
+constant however long a chat runs.
+"""
+import os
+from typing import List
+from core.state import ChatState, Message
+
+HISTORY_SIZE = max(int(os.environ.get("CHAT_HISTORY_SIZE", 12)), 6)
+SUMMARY_MAX_LINES = 8
+SUMMARY_LINE_CHARS = 80
+
+
+def _digest(message: Message) -> str:
+    """One short line per message; long bot replies (e.g. the menu) keep only their first line."""
+    first_line = message["content"].strip().splitlines()[0] if message["content"].strip() else ""
+    if len(first_line) > SUMMARY_LINE_CHARS:
+        first_line = first_line[:SUMMARY_LINE_CHARS - 1] + "…"
+    return f"{message['role']}: {first_line}"
+
+
+def update_summary(summary: str, dropped: List[Message]) -> str:
+    """Appends digests of dropped messages and keeps only the newest lines."""
+    lines = summary.splitlines() if summary else []
+    lines.extend(_digest(message) for message in dropped)
+    return "\n".join(lines[-SUMMARY_MAX_LINES:])
+
+
+def compact_history(state: ChatState) -> ChatState:
+    """Trims the message buffer to HISTORY_SIZE, folding the overflow into the summary."""
+    messages = state["messages"]
+    overflow = len(messages) - HISTORY_SIZE
+    if overflow > 0:
+        state["summary"] = update_summary(state.get("summary", ""), messages[:overflow])
+        del messages[:overflow]
+    return state
@@ -0,0 +1,138 @@
+# core/menu_retrieval.py
+"""
+Menu context for LLM prompts, pruned to what the conversation is about.
+
+Embedding the whole menu makes every handle_order / combined-intent prompt grow
+with the catalog. `MenuRetriever` is a small BM25 index over each item's name,
+common aliases (order_parser.SYNONYMS), category and customizations, built
+once per menu version. `prompt_menu` renders only:
+- the MENU_PROMPT_TOP_K items that best match the customer's last message
+  (and, at lower weight, the bot message it answers, for "yes, add that");
+- every item already in the cart, so removes and updates can be resolved;
+- one line listing the categories, so the LLM knows what else exists.
+
+So the prompt stays roughly the same size whether the menu has 30 items or 300.
+Words are matched after the order parser's spelling correction ("biriyani",
+"burgers"). MENU_PROMPT_TOP_K=0 sends the full menu as before.
+"""
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+from menu.catalog import MenuVersion, current_menu
+from core.order_parser import ADD_WORDS, FILLER_WORDS, QUANTITY_WORDS, REMOVE_WORDS, SYNONYMS, UPDATE_WORDS, get_index
+from core.recommendations import CATEGORY_ALIASES
+from core.state import ChatState
+
+MENU_PROMPT_TOP_K = int(os.environ.get("MENU_PROMPT_TOP_K", 8))
+# How much each field counts towards an item's score
+FIELD_WEIGHTS = {"name": 3.0, "alias": 3.0, "category": 2.0, "customization": 1.0}
+PREVIOUS_REPLY_WEIGHT = 0.5
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Ordering verbs and filler ("add", "the", "two") say nothing about which item is meant
+STOP_WORDS = frozenset(ADD_WORDS | REMOVE_WORDS | UPDATE_WORDS | FILLER_WORDS | set(QUANTITY_WORDS))
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"[a-z]+|\d+", text.lower().replace("_", " "))
+
+
+def _stem(term: str) -> str:
+    # Enough for menu words: "burgers" -> "burger", "fries" stays a menu word
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+class MenuRetriever:
+    """BM25 over weighted item fields for one menu version."""
+
+    def __init__(self, menu: MenuVersion):
+        self.order = {item: position for position, item in enumerate(menu.items)}
+        aliases: Dict[str, List[str]] = defaultdict(list)
+        for alias, item in SYNONYMS.items():
+            aliases[item].append(alias)
+        category_aliases: Dict[str, List[str]] = defaultdict(list)
+        for alias, category in CATEGORY_ALIASES.items():
+            category_aliases[category].append(alias)
+
+        weighted: Dict[str, Counter] = {}
+        for item, data in menu.items.items():
+            category = data.get("category", "other")
+            fields = [("name", item), ("category", category)]
+            fields += [("category", alias) for alias in category_aliases.get(category, [])]
+            fields += [("alias", alias) for alias in aliases.get(item, [])]
+            fields += [("customization", c) for c in data.get("customizations", [])]
+            counts: Counter = Counter()
+            for field, text in fields:
+                for term in _terms(text):
+                    counts[_stem(term)] += FIELD_WEIGHTS[field]
+            weighted[item] = counts
+
+        lengths = {item: sum(counts.values()) for item, counts in weighted.items()}
+        average = sum(lengths.values()) / len(lengths) if lengths else 1.0
+        documents = len(weighted)
+        # term -> [(item, precomputed BM25 weight)], so a query only touches its terms' postings
+        self.postings: Dict[str, List[Tuple[str, float]]] = {}
+        frequency = Counter(term for counts in weighted.values() for term in counts)
+        for item, counts in weighted.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[item] / average)
+            for term, tf in counts.items():
+                idf = math.log(1 + (documents - frequency[term] + 0.5) / (frequency[term] + 0.5))
+                self.postings.setdefault(term, []).append((item, idf * tf * (BM25_K1 + 1) / (tf + norm)))
+
+    def _query_terms(self, text: str) -> Iterable[str]:
+        corrector = get_index()
+        for term in _terms(text):
+            if term in STOP_WORDS:
+                continue
+            stemmed = _stem(term)
+            if stemmed not in self.postings:
+                corrected = corrector.correct(term)
+                stemmed = _stem(corrected) if corrected else stemmed
+            if stemmed in self.postings:
+                yield stemmed
+
+    def search(self, queries: Iterable[Tuple[str, float]], k: int) -> List[str]:
+        """Top `k` items for weighted query texts, best first."""
+        scores: Counter = Counter()
+        for text, weight in queries:
+            for term in set(self._query_terms(text)):
+                for item, score in self.postings[term]:
+                    scores[item] += weight * score
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], self.order[pair[0]]))
+        return [item for item, _ in ranked[:k]]
+
+
+def get_retriever() -> MenuRetriever:
+    """Retriever for the live menu version (rebuilt when the menu reloads)."""
+    return current_menu().derived("menu_retrieval.index", MenuRetriever)
+
+
+def relevant_items(state: ChatState, k: int = MENU_PROMPT_TOP_K) -> List[str]:
+    """Menu items a prompt needs for this turn: the best matches plus the cart, in menu order."""
+    messages = state["messages"]
+    queries: List[Tuple[str, float]] = []
+    if messages and messages[-1]["role"] == "user":
+        queries.append((messages[-1]["content"], 1.0))
+        if len(messages) > 1 and messages[-2]["role"] == "assistant":
+            queries.append((messages[-2]["content"], PREVIOUS_REPLY_WEIGHT))
+    retriever = get_retriever()
+    items = set(retriever.search(queries, k))
+    items.update(o["item"] for o in state["order_items"] if o["item"] in retriever.order)
+    return sorted(items, key=retriever.order.__getitem__)
+
+
+def prompt_menu(state: ChatState, k: int = MENU_PROMPT_TOP_K) -> str:
+    """The menu section of an ordering prompt for this turn."""
+    menu = current_menu()
+    if k <= 0 or len(menu.items) <= k:
+        return menu.prompt_text
+    lines = [menu.prompt_line(item) for item in relevant_items(state, k)]
+    lines.append(
+        f"(Only the items relevant to this message are listed; the full menu has {len(menu.items)} items "
+        f"in these categories: {', '.join(menu.categories)}.)"
+    )
+    return "\n".join(lines)
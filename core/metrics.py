@@ -0,0 +1,254 @@
+# core/metrics.py
+"""
+In-process metrics: counters and latency histograms with Prometheus-text and
+JSON export (served by server.py at GET /metrics).
+
+Recorded automatically:
+- every graph node (`instrument_node`, applied in `app.build_graph`):
+  latency histogram, call and error counts;
+- every LLM chain call (`core.llm_runner`): latency histogram, call counts by outcome;
+- every chat model call (`LLMUsageHandler`, a global LangChain callback):
+  prompt/response tokens, from the model's usage metadata or estimated at
+  ~4 characters per token when the model doesn't report them;
+- parse failures and fallbacks reported by the nodes (`record_parse_failure`,
+  `record_fallback`) and intent classification paths;
+- order persistence: order-number allocation time (`core.order_ids`) and the
+  background writer's batch times, queueing delay and failures (`core.order_queue`).
+
+Recording is a dict lookup and a few additions under a lock, so it is cheap
+next to an LLM round-trip.
+"""
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CHARS_PER_TOKEN = 4
+
+# name -> (type, help)
+METRICS = {
+    "orderbot_node_seconds": ("histogram", "Wall time of each graph node."),
+    "orderbot_node_errors_total": ("counter", "Graph node runs that raised."),
+    "orderbot_llm_seconds": ("histogram", "Wall time of each LLM chain call, by calling node."),
+    "orderbot_llm_calls_total": ("counter", "LLM chain calls by calling node and outcome (ok, error, timeout, rejected)."),
+    "orderbot_llm_hedges_total": ("counter", "Extra LLM requests sent, by node and kind (hedge, retry)."),
+    "orderbot_llm_breaker_transitions_total": ("counter", "LLM circuit breaker state changes, by new state."),
+    "orderbot_llm_prompt_tokens_total": ("counter", "Prompt tokens sent to the chat model."),
+    "orderbot_llm_response_tokens_total": ("counter", "Response tokens returned by the chat model."),
+    "orderbot_parse_failures_total": ("counter", "LLM outputs a node could not parse."),
+    "orderbot_fallbacks_total": ("counter", "Times a node fell back to a slower or default path."),
+    "orderbot_intent_classifications_total": ("counter", "Intent classifications by path (fast_path, cache, llm)."),
+    "orderbot_order_id_seconds": ("histogram", "Time to allocate an order number, including waits for the SQLite write lock."),
+    "orderbot_order_id_blocks_total": ("counter", "Blocks of order numbers reserved (one SQLite transaction each)."),
+    "orderbot_order_write_seconds": ("histogram", "Time to write one batch of queued orders."),
+    "orderbot_order_queue_seconds": ("histogram", "Time from place_order queueing an order to it being written."),
+    "orderbot_orders_written_total": ("counter", "Orders written by the background order writer."),
+    "orderbot_order_write_batches_total": ("counter", "Batches written by the background order writer."),
+    "orderbot_order_write_failures_total": ("counter", "Orders the background writer could not save."),
+    "orderbot_tenant_cache_total": ("counter", "Tenant registry lookups by result (hit, miss, evict)."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Thread-safe counters and fixed-bucket histograms, keyed by name and labels."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        key = self._labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            data = series.get(key)
+            if data is None:
+                data = series[key] = [0.0] * (len(self.buckets) + 2)
+            data[index] += 1
+            data[-1] += value
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly view: counters as values, histograms as count/sum/mean plus buckets."""
+        with self.lock:
+            counters = {name: dict(series) for name, series in self.counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self.histograms.items()}
+
+        result: Dict[str, Any] = {}
+        for name, series in counters.items():
+            result[name] = [{"labels": dict(labels), "value": value} for labels, value in series.items()]
+        for name, series in histograms.items():
+            rows = []
+            for labels, data in series.items():
+                count = sum(data[:-1])
+                rows.append({
+                    "labels": dict(labels),
+                    "count": int(count),
+                    "sum": round(data[-1], 6),
+                    "mean": round(data[-1] / count, 6) if count else 0.0,
+                    "buckets": {str(le): int(n) for le, n in zip(self.buckets + ("+Inf",), _cumulative(data[:-1]))},
+                })
+            result[name] = rows
+        return result
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            counters = {name: dict(series) for name, series in self.counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self.histograms.items()}
+
+        lines: List[str] = []
+        for name in sorted(set(counters) | set(histograms)):
+            kind, help_text = METRICS.get(name, ("histogram" if name in histograms else "counter", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(counters.get(name, {}).items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for labels, data in sorted(histograms.get(name, {}).items()):
+                cumulative = _cumulative(data[:-1])
+                for le, count in zip(self.buckets + ("+Inf",), cumulative):
+                    bucket_labels = labels + (("le", str(le)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {int(count)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(data[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {int(cumulative[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _cumulative(counts: List[float]) -> List[float]:
+    total, out = 0.0, []
+    for count in counts:
+        total += count
+        out.append(total)
+    return out
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(round(value, 6))
+
+
+metrics = Metrics()
+
+
+# --- Helpers used by the graph, the LLM runner and the nodes ---
+
+def instrument_node(name: str, node: Callable) -> Callable:
+    """Wraps a graph node (sync or async) to record its latency and errors."""
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state):
+            start = time.perf_counter()
+            try:
+                return await node(state)
+            except Exception:
+                metrics.inc("orderbot_node_errors_total", node=name)
+                raise
+            finally:
+                metrics.observe("orderbot_node_seconds", time.perf_counter() - start, node=name)
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return node(state)
+        except Exception:
+            metrics.inc("orderbot_node_errors_total", node=name)
+            raise
+        finally:
+            metrics.observe("orderbot_node_seconds", time.perf_counter() - start, node=name)
+    return wrapper
+
+
+def record_llm_call(node: str, seconds: float, outcome: str) -> None:
+    """Records one LLM chain call; `outcome` is "ok", "error" or "timeout"."""
+    metrics.observe("orderbot_llm_seconds", seconds, node=node)
+    metrics.inc("orderbot_llm_calls_total", node=node, outcome=outcome)
+
+
+def record_parse_failure(node: str) -> None:
+    metrics.inc("orderbot_parse_failures_total", node=node)
+
+
+def record_fallback(node: str, to: str) -> None:
+    """Counts a fallback, e.g. record_fallback("handle_order", "llm") when the local parser gives up."""
+    metrics.inc("orderbot_fallbacks_total", node=node, to=to)
+
+
+class LLMUsageHandler(BaseCallbackHandler):
+    """Counts prompt/response tokens for every chat model call, labelled by graph node."""
+
+    run_inline = True
+    ignore_chain = True
+    ignore_agent = True
+    ignore_retriever = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Dict[Any, Tuple[str, int]] = {}  # run_id -> (node, prompt chars)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "none")
+        chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        with self.lock:
+            self.pending[run_id] = (node, chars)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self.lock:
+            node, prompt_chars = self.pending.pop(run_id, ("none", 0))
+        usage: Optional[Dict[str, Any]] = None
+        response_chars = 0
+        for generations in response.generations:
+            for generation in generations:
+                response_chars += len(generation.text or "")
+                message = getattr(generation, "message", None)
+                usage = usage or getattr(message, "usage_metadata", None)
+        if usage:
+            prompt_tokens, response_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        else:
+            prompt_tokens, response_tokens = round(prompt_chars / CHARS_PER_TOKEN), round(response_chars / CHARS_PER_TOKEN)
+        metrics.inc("orderbot_llm_prompt_tokens_total", prompt_tokens, node=node)
+        metrics.inc("orderbot_llm_response_tokens_total", response_tokens, node=node)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            self.pending.pop(run_id, None)
+
+
+# Attached to every LangChain run, like LangSmith's tracer
+_usage_handler_var: ContextVar[Optional[LLMUsageHandler]] = ContextVar("orderbot_llm_usage", default=LLMUsageHandler())
+register_configure_hook(_usage_handler_var, True)
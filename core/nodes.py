@@ -1,92 +1,52 @@
 # core/nodes.py
 import json
-from collections import defaultdict
-from typing import TypedDict, List, Dict, Any, Literal
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import List, Dict, Any, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from langchain.prompts import ChatPromptTemplate
-from menu.menu_data import MENU
-from core.state import ChatState, OrderItem, Message
+from langchain_core.exceptions import OutputParserException
+from langchain_core.prompts import ChatPromptTemplate
+from menu.catalog import current_menu
+from core.state import ChatState
+from core.intent_rules import fast_classify, record_classification
+from core.intent_cache import intent_cache, make_key
+from core.order_parser import parse_order
+from core.cart import Cart, describe_line
+from core.menu_retrieval import prompt_menu
+from core.memory import compact_history
+from core.llm import current_llm
+from core.address import INVALID, VALID, match_saved, prevalidate
+from core.intent_rules import AFFIRM_RE, DECLINE_RE, normalize
+from core.llm_runner import LLMCall, LLMSteps, run_llm_steps, arun_llm_steps
+from core.metrics import record_fallback, record_parse_failure
+from core.order_store import build_order_record, get_order_store
+from core.order_ids import next_order_number
+from core.order_queue import get_order_writer
+from core.recommendations import FAST_SUGGESTIONS, get_recommendation_index, note_order, requested_category
 from langchain_core.output_parsers import StrOutputParser
-from datetime import datetime
-import random
-import csv
-import os
-from dotenv import load_dotenv
+import asyncio
+import re
 
-load_dotenv()
-
-
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    api_key=os.environ.get("GOOGLE_API_KEY")
+# Replies used when the LLM is slow or down (see core.resilience)
+ORDER_FALLBACK = (
+    "Sorry, I couldn't process that just now. You can add items by name, "
+    "e.g. \"2 zinger burger\", or type \"menu\" to see the menu."
+)
+ADDRESS_FALLBACK = (
+    "Sorry, I couldn't check that address just now. "
+    "Please send it with your house number, street and area."
+)
+SUGGESTION_CANDIDATES = 5
+SUGGEST_FALLBACK = "I can't put together personal suggestions right now, but here's our full menu:"
+CHIT_CHAT_FALLBACK = (
+    "I'm here to help with your food order! You can ask for the menu, "
+    "place an order, or track an existing one."
 )
 
-ORDERS_FILE = "orders.csv"
-
-def calculate_total(order_items: List[OrderItem]) -> float:
-    """Calculates the total cost of the order based on the menu prices."""
-    total = 0.0
-    for item_data in order_items:
-        price = MENU.get(item_data['item'], {}).get('price', 0)
-        total += item_data['quantity'] * price
-    return total
-
-def save_order_to_csv(state: ChatState):
-    """Save the confirmed order to CSV as a single row with all items grouped."""
-    file_exists = os.path.isfile(ORDERS_FILE)
-
-    with open(ORDERS_FILE, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-
-        # Write header if file is new
-        if not file_exists:
-            writer.writerow([
-                "order_number", "user_id", "timestamp", "items", "total_cost", 
-                "delivery_address", "status"
-            ])
-
-        # Build items string
-        items_str = []
-        for item in state["order_items"]:
-            customizations = f" ({', '.join(item['customizations'])})" if item.get("customizations") else ""
-            items_str.append(f"{item['quantity']}x {item['item']}{customizations}")
-            
-        order_number = random.randint(1000, 9999)
-
-        writer.writerow([
-            order_number,
-            state["user_id"],
-            datetime.now().isoformat(timespec="seconds"),
-            "; ".join(items_str),
-            state["total_cost"],
-            state["delivery_address"],
-            state["status"]
-        ])
-
-
-def classify_intent(state: ChatState) -> ChatState:
-    """Classifies the user's intent from the last 3 messages of the conversation."""
-
-    if not state["messages"]:
-        return state
-
-    # Take last 3 messages (bot + user), join as context
-    recent_messages = state["messages"][-6:]  # 3 user+bot exchanges = 6 msgs
-    conversation_snippet = "\n".join(
-        [f"{m['role']}: {m['content']}" for m in recent_messages]
-    )
-
-    status = state["status"].lower()
-    menu_sent = "yes" if state.get("menu_sent") else "no"
-    is_confirmed = "yes" if state.get("is_confirmed") else "no"
-    has_address = "yes" if state.get("delivery_address") else "no"
-
-    parser = JsonOutputParser(pydantic_object=None)
-    format_instructions = parser.get_format_instructions()
+# Intent classifier prompt/parser are built once and reused on every turn
+INTENT_PARSER = JsonOutputParser(pydantic_object=None)
+_intent_format_instructions = INTENT_PARSER.get_format_instructions()
 
-    system_prompt = f"""
+_intent_rules = """
 You are an intent classification assistant for a restaurant ordering chatbot.
 Classify the conversation into exactly ONE of the following intents, providing a single lowercase string as the value for the 'intent' key:
 
@@ -114,11 +74,13 @@ Rules:
 - If the user is finishing an order and Address Provided = "no", choose "take_address".
 - If the user is finishing an order, Address Provided = "yes" and Is Confirmed = "no", choose "confirm_order".
 - If the user is confirming (e.g., "yes", "confirm") AND Is Confirmed = "yes", choose "place_order".
+"""
 
-{format_instructions}
+_intent_system_prompt = f"""{_intent_rules}
+{_intent_format_instructions}
 """
 
-    prompt = PromptTemplate.from_template(system_prompt + """
+INTENT_PROMPT = PromptTemplate.from_template(_intent_system_prompt + """
 Conversation (last 3 exchanges):
 {conversation}
 
@@ -128,33 +90,171 @@ Is Confirmed?: {is_confirmed}
 Address Provided?: {has_address}
 """)
 
-    chain = prompt | llm | parser
+# Combined mode: one call returns the intent plus the order changes or address,
+# so handle_order/take_address don't need a second round-trip
+COMBINED_PROMPT = PromptTemplate.from_template(_intent_rules + """
+In the same answer, act on the user's last message:
+- If the intent is "handle_order", also return "items" and "bot_message":
+  - "items" is a list of {{"action": "add" | "remove" | "update", "item": "string", "quantity": int, "customizations": ["string", ...]}}.
+  - Only include items that exist in the menu; mention anything else in "bot_message".
+  - For "remove" and "update", only include items in the customer's current order.
+  - If quantity is not mentioned, default to 1.
+  - "bot_message" summarizes the changes, in the same language as the user (English, Roman Urdu, etc).
+- If the intent is "take_address", also return "final_address" and "address_valid":
+  - A complete Pakistani address has a street name, house or apartment number, or a nearby landmark.
+  - If the address is vague or incomplete (e.g., "my home"), set "address_valid" to false and "final_address" to "".
+
+Return only a JSON object, e.g. {{"intent": "handle_order", "items": [...], "bot_message": "..."}}.
+
+Menu:
+{menu}
+
+Customer's current order:
+{current_order}
+
+Conversation (last 3 exchanges):
+{conversation}
+
+Current Status: {status}
+Menu Sent?: {menu_sent}
+Is Confirmed?: {is_confirmed}
+Address Provided?: {has_address}
+""")
+
+# Payload keys the combined classifier may hand to each target node
+PENDING_ACTION_KEYS = {
+    "handle_order": ("items", "bot_message"),
+    "take_address": ("final_address", "address_valid"),
+}
+
+VALID_INTENTS = {
+    "greetings", "send_menu", "handle_order",
+    "take_address", "confirm_order", "place_order",
+    "suggest_order", "track_order", "chit_chat", "display_orders"
+}
+
+def save_order(state: ChatState) -> int:
+    """
+    Queues the confirmed order for the background order writer and returns its number.
+    Only the order number is allocated synchronously; the write itself happens off the reply path.
+    """
+    order_number = next_order_number()
+    get_order_writer().submit(build_order_record(state, order_number))
+    return order_number
+
+
+def _classify_intent_steps(state: ChatState, combined: bool = False) -> LLMSteps:
+    if not state["messages"]:
+        return state
+
+    # A payload from a previous turn must never be applied to this one
+    state["pending_action"] = None
+
+    # Every turn enters here, so this keeps the message buffer bounded
+    compact_history(state)
+
+    # Rule-based fast path: skip the LLM when the lexicon + flags are unambiguous
+    fast_intent = fast_classify(state)
+    if fast_intent:
+        record_classification("fast_path")
+        state["intent"] = fast_intent
+        print(f"[Debug] Classified Intent (fast path): {fast_intent}")
+        return state
+
+    # Take last 3 messages (bot + user), join as context
+    recent_messages = state["messages"][-6:]  # 3 user+bot exchanges = 6 msgs
+    conversation_snippet = "\n".join(
+        [f"{m['role']}: {m['content']}" for m in recent_messages]
+    )
+
+    status = state["status"].lower()
+    menu_sent = "yes" if state.get("menu_sent") else "no"
+    is_confirmed = "yes" if state.get("is_confirmed") else "no"
+    has_address = "yes" if state.get("delivery_address") else "no"
+
+    # Identical contexts (e.g. "hi" in a fresh session) reuse a previous answer
+    cache_key = make_key(conversation_snippet, status, menu_sent, is_confirmed, has_address)
+    cached_intent = intent_cache.get(cache_key)
+    if cached_intent:
+        record_classification("cache")
+        state["intent"] = cached_intent
+        print(f"[Debug] Classified Intent (cached): {cached_intent}")
+        return state
+
+    record_classification("llm")
+    inputs = {
+        "conversation": conversation_snippet,
+        "status": status,
+        "menu_sent": menu_sent,
+        "is_confirmed": is_confirmed,
+        "has_address": has_address
+    }
+    if combined:
+        chain = COMBINED_PROMPT | current_llm() | INTENT_PARSER
+        inputs["menu"] = prompt_menu(state)
+        inputs["current_order"] = "\n".join(describe_line(o) for o in state["order_items"]) or "None"
+    else:
+        chain = INTENT_PROMPT | current_llm() | INTENT_PARSER
 
+    parsed_output: Dict[str, Any] = {}
     try:
-        parsed_output = chain.invoke({
-            "conversation": conversation_snippet,
-            "status": status,
-            "menu_sent": menu_sent,
-            "is_confirmed": is_confirmed,
-            "has_address": has_address
-        })
+        parsed_output = yield LLMCall("classify_intent", chain, inputs)
         raw_intent = parsed_output.get("intent", "").lower()
     except Exception as e:
         print(f"[Warning] LLM failed to parse intent: {e}. Defaulting to 'handle_order'.")
+        if isinstance(e, OutputParserException):
+            record_parse_failure("classify_intent")
+        record_fallback("classify_intent", "default_intent")
         raw_intent = "handle_order"
+    else:
+        if raw_intent in VALID_INTENTS:
+            intent_cache.put(cache_key, raw_intent)
+        else:
+            record_fallback("classify_intent", "default_intent")
 
-    valid_intents = {
-        "greetings", "send_menu", "handle_order",
-        "take_address", "confirm_order", "place_order",
-        "suggest_order", "track_order", "chit_chat", "display_orders"
-    }
+    intent = raw_intent if raw_intent in VALID_INTENTS else "handle_order"
 
-    intent = raw_intent if raw_intent in valid_intents else "handle_order"
+    # Keep the payload only if it is complete for the node we're routing to
+    payload_keys = PENDING_ACTION_KEYS.get(intent)
+    if combined and payload_keys and intent == raw_intent and all(k in parsed_output for k in payload_keys):
+        state["pending_action"] = {"intent": intent, **{k: parsed_output[k] for k in payload_keys}}
 
     state["intent"] = intent
     print(f"[Debug] Classified Intent: {intent}")
     return state
 
+
+def classify_intent(state: ChatState) -> ChatState:
+    """Classifies the user's intent from the last 3 messages of the conversation."""
+    return run_llm_steps(_classify_intent_steps(state))
+
+
+async def aclassify_intent(state: ChatState) -> ChatState:
+    """Async version of `classify_intent`."""
+    return await arun_llm_steps(_classify_intent_steps(state))
+
+
+def classify_and_act(state: ChatState) -> ChatState:
+    """
+    Combined-mode classifier: when the LLM is needed, a single call returns the
+    intent and, for handle_order/take_address, the payload those nodes apply.
+    """
+    return run_llm_steps(_classify_intent_steps(state, combined=True))
+
+
+async def aclassify_and_act(state: ChatState) -> ChatState:
+    """Async version of `classify_and_act`."""
+    return await arun_llm_steps(_classify_intent_steps(state, combined=True))
+
+
+def pop_pending_action(state: ChatState, intent: str) -> Optional[Dict[str, Any]]:
+    """Takes the combined classifier's payload for `intent`, if there is one."""
+    pending = state.get("pending_action")
+    if not pending or pending.get("intent") != intent:
+        return None
+    state["pending_action"] = None
+    return pending
+
 def display_orders(state: ChatState) -> ChatState:
     """Node: Shows the current user order items."""
     if not state["order_items"]:
@@ -173,22 +273,36 @@ def display_orders(state: ChatState) -> ChatState:
     return state
 
 
-def suggest_order(state: ChatState) -> ChatState:
-    """Node: Suggests items from the menu based on current order and user query."""
-    
+def format_suggestions(picks: List[str], has_cart: bool) -> str:
+    """Deterministic suggestion reply (fast mode, and when the LLM is unavailable)."""
+    menu = current_menu()
+    names = [f"**{item.replace('_', ' ').title()}** (${menu.price(item):.2f})" for item in picks]
+    listed = names[0] if len(names) == 1 else ", ".join(names[:-1]) + f" and {names[-1]}"
+    lead = "These go great with your order" if has_cart else "Our customers' favourites"
+    return f"{lead}: {listed}. Would you like me to add any of them?"
+
+
+def _suggest_order_steps(state: ChatState) -> LLMSteps:
     order_items = "\n".join([
         f"- {item['quantity']}x {item['item']} ({', '.join(item['customizations']) if item['customizations'] else 'no customizations'})"
         for item in state["order_items"]
     ]) or "No items yet"
 
-    # If you have your menu stored somewhere in state or DB
-    menu = "\n".join(
-        f"- {item}: ${data['price']:.2f} | {data.get('description', '')}"
-        for item, data in MENU.items()
-    )
-
     user_message = state["messages"][-1]["content"]
 
+    # Candidates come from the local co-occurrence index; the LLM only phrases the answer
+    cart = [item["item"] for item in state["order_items"]]
+    picks = [item for item, _ in get_recommendation_index().recommend(
+        cart, limit=SUGGESTION_CANDIDATES, category=requested_category(user_message)
+    )]
+    if FAST_SUGGESTIONS:
+        reply = format_suggestions(picks[:3], bool(cart)) if picks else f"{SUGGEST_FALLBACK}\n\n{current_menu().customer_text}"
+        state["messages"].append({"role": "assistant", "content": reply})
+        return state
+
+    menu = current_menu()
+    candidates = "\n".join(menu.prompt_line(item) for item in picks) or prompt_menu(state)
+
     prompt = PromptTemplate.from_template("""
 You are a helpful restaurant assistant.
 The customer has asked for suggestions.
@@ -196,21 +310,32 @@ The customer has asked for suggestions.
 Current Order:
 {order_items}
 
-Menu:
-{menu}
+Best matches for this order (from what other customers order together), best first:
+{candidates}
 
 User Query:
 {user_message}
 
-Suggest 2-3 items from the menu that complement their order or answer their request.
+Suggest 2-3 of the items above that complement their order or answer their request.
 """)
 
-    chain = prompt | llm | StrOutputParser()
-    suggestion = chain.invoke({
-        "order_items": order_items,
-        "menu": menu,
-        "user_message": user_message
-    })
+    chain = prompt | current_llm() | StrOutputParser()
+    # Streamed: tokens reach the client as they arrive, the full text is returned here
+    try:
+        suggestion = yield LLMCall("suggest_order", chain, {
+            "order_items": order_items,
+            "candidates": candidates,
+            "user_message": user_message
+        }, stream=True)
+    except Exception as e:
+        if picks:
+            print(f"[Warning] Suggestion LLM call failed: {e}. Sending local suggestions.")
+            record_fallback("suggest_order", "local")
+            suggestion = format_suggestions(picks[:3], bool(cart))
+        else:
+            print(f"[Warning] Suggestion LLM call failed: {e}. Sending the menu instead.")
+            record_fallback("suggest_order", "menu")
+            suggestion = f"{SUGGEST_FALLBACK}\n\n{current_menu().customer_text}"
 
     state["messages"].append({
         "role": "assistant",
@@ -219,20 +344,40 @@ Suggest 2-3 items from the menu that complement their order or answer their requ
     return state
 
 
-def chit_chat(state: ChatState) -> ChatState:
-    """Node: Answers casual user questions about the restaurant."""
+def suggest_order(state: ChatState) -> ChatState:
+    """Node: Suggests items from the menu based on current order and user query."""
+    return run_llm_steps(_suggest_order_steps(state))
+
+
+async def asuggest_order(state: ChatState) -> ChatState:
+    """Async version of `suggest_order`."""
+    return await arun_llm_steps(_suggest_order_steps(state))
+
+
+def _chit_chat_steps(state: ChatState) -> LLMSteps:
     user_message = state["messages"][-1]["content"]
 
     prompt = PromptTemplate.from_template("""
 You are a friendly restaurant assistant.
 Answer casual questions about the restaurant, staff, timings, and general chit-chat.
 
+Earlier in the conversation:
+{summary}
+
 User: {user_message}
 Assistant:
 """)
 
-    chain = prompt | llm | StrOutputParser()
-    reply = chain.invoke({"user_message": user_message})
+    chain = prompt | current_llm() | StrOutputParser()
+    try:
+        reply = yield LLMCall("chit_chat", chain, {
+            "user_message": user_message,
+            "summary": state.get("summary") or "(nothing yet)"
+        }, stream=True)
+    except Exception as e:
+        print(f"[Warning] Chit-chat LLM call failed: {e}. Using the canned reply.")
+        record_fallback("chit_chat", "canned_reply")
+        reply = CHIT_CHAT_FALLBACK
 
     state["messages"].append({
         "role": "assistant",
@@ -241,11 +386,54 @@ Assistant:
     return state
 
 
+def chit_chat(state: ChatState) -> ChatState:
+    """Node: Answers casual user questions about the restaurant."""
+    return run_llm_steps(_chit_chat_steps(state))
+
+
+async def achit_chat(state: ChatState) -> ChatState:
+    """Async version of `chit_chat`."""
+    return await arun_llm_steps(_chit_chat_steps(state))
+
+
+ORDER_NUMBER_RE = re.compile(r"\b(\d{4,})\b")
+LAST_ORDER_RE = re.compile(r"\b(last|latest|previous|recent|pichla|pichhla)\b", re.IGNORECASE)
+
+
 def track_order(state: ChatState) -> ChatState:
-    """Node: Returns the current order status."""
-    status = state.get("status", "not started")
+    """
+    Node: Returns the status of an order.
+    "where is order 10421" and "my last order" are looked up in the order store's
+    indexes, so tracking works after a restart or on another server.
+    """
+    user_message = state["messages"][-1]["content"] if state["messages"] else ""
+    store = get_order_store()
+    # Orders placed moments ago may still be queued for writing
+    writer = get_order_writer()
+    order = None
+
+    number_match = ORDER_NUMBER_RE.search(user_message)
+    if number_match:
+        number = int(number_match.group(1))
+        order = writer.pending_order(number) or store.get_order(number)
+        # Only show customers their own orders
+        if order and str(order["user_id"]) != str(state["user_id"]):
+            order = None
+        if order is None:
+            reply = f"I couldn't find order #{number_match.group(1)} on your account."
+    elif LAST_ORDER_RE.search(user_message) or state.get("status") in (None, "idle", "greeted"):
+        order = writer.latest_pending(state["user_id"]) or store.latest_order(state["user_id"])
+        if order is None:
+            reply = f"Your order status is: **{state.get('status', 'not started')}**."
+    else:
+        reply = f"Your order status is: **{state.get('status', 'not started')}**."
+
+    if order is not None:
+        reply = (
+            f"Order #{order['order_number']} ({order['items']}) placed at {order['timestamp']}.\n"
+            f"Status: **{order['status']}**."
+        )
 
-    reply = f"Your order status is: **{status}**."
     state["messages"].append({
         "role": "assistant",
         "content": reply
@@ -253,53 +441,78 @@ def track_order(state: ChatState) -> ChatState:
     return state
 
 def send_menu(state: ChatState) -> ChatState:
-    """Sends a formatted menu to the user."""
-    categories = defaultdict(list)
-    for item_name, item_data in MENU.items():
-        category = item_data.get("category", "other").title()
-        price = item_data["price"]
-        customizations = item_data.get("customizations", [])
-        if customizations:
-            cust_str = ", ".join(customizations)
-            cust_text = f" (Customizations: {cust_str})"
-        else:
-            cust_text = ""
-        categories[category].append(f"- {item_name.replace('_', ' ').title()} — ${price:.2f}{cust_text}")
-
-    menu_lines = ["Here’s our menu:\n"]
-    for category in sorted(categories.keys()):
-        menu_lines.append(f"🍽 **{category}**")
-        menu_lines.extend(categories[category])
-        menu_lines.append("")
-
-    menu_text = "\n".join(menu_lines)
+    """Sends the formatted menu to the user."""
+    # Rendered once per menu version by the catalog
+    menu_text = current_menu().customer_text
     state['messages'].append({"role": "assistant", "content": menu_text})
     state["menu_sent"] = True
     print("[Debug] Menu sent.")
     return state
 
 
-def handle_order(state: ChatState) -> ChatState:
-    """
-    Uses the LLM to parse the user's message into structured order data.
-    The LLM is given the *current* restaurant menu, the user's current order,
-    and must output JSON with a list of items + a bot message.
-    """
+def apply_order_changes(state: ChatState, items: List[Dict[str, Any]], bot_message: str) -> ChatState:
+    """Applies parsed add/remove/update changes to the cart and posts the bot reply."""
+    menu = current_menu()
+
+    cart = Cart.from_state(state)
+
+    # --- Apply changes only for valid items ---
+    for change in items:
+        action = change.get("action", "").lower()
+        item = change.get("item", "").strip()
+        quantity = change.get("quantity", 1)
+        customizations = change.get("customizations", [])
+
+        # Validate against menu
+        if not item or item not in menu.items:
+            continue  # leave explanation to bot_message
+
+        # Unknown actions, or remove/update of items not in the cart, are left to bot_message
+        if action == "add":
+            cart.add(item, quantity, customizations)
+        elif action == "update":
+            cart.update(item, quantity, customizations)
+        elif action == "remove":
+            cart.remove(item, quantity, customizations)
+
+    # --- Write the cart back; its total is kept up to date per change ---
+    cart.to_state(state)
+
+    # --- Add assistant reply ---
+    state["messages"].append({
+        "role": "assistant",
+        "content": bot_message
+    })
+
+    return state
+
+
+def _handle_order_steps(state: ChatState) -> LLMSteps:
     if not state["messages"]:
         return state
 
     user_message = state["messages"][-1]
     state['is_confirmed'] = False  # Reset confirmation state for new order handling
 
-    # Menu string for LLM
-    menu_str = "\n".join(
-        f"- {item}: ${data['price']:.2f} | {data.get('description', '')}"
-        for item, data in MENU.items()
-    )
+    # Combined mode already parsed this message while classifying it
+    pending = pop_pending_action(state, "handle_order")
+    if pending:
+        print(f"[Debug] Combined Order Parse: {pending['items']}")
+        return apply_order_changes(state, pending["items"] or [], pending["bot_message"] or "Okay, got it!")
+
+    # Simple cart edits are resolved locally; only unclear messages go to the LLM
+    parsed = parse_order(user_message["content"], state["order_items"])
+    if parsed:
+        print(f"[Debug] Local Order Parse: {parsed['items']}")
+        return apply_order_changes(state, parsed["items"], parsed["bot_message"])
+    record_fallback("handle_order", "llm")
+
+    # Menu string for LLM: only the items this message is about, plus the cart
+    menu_str = prompt_menu(state)
 
     # Current order string for LLM
     current_order_str = "\n".join(
-        f"- {o['item']} (x{o['quantity']})" for o in state["order_items"]
+        describe_line(o) for o in state["order_items"]
     ) if state["order_items"] else "None"
 
     # System prompt (all JSON braces escaped {{ }})
@@ -341,8 +554,14 @@ Rules:
         ("human", "User Message: {message}")
     ])
 
-    chain = prompt | llm | (lambda x: x.content.strip())
-    raw_response = chain.invoke({"message": user_message})
+    chain = prompt | current_llm() | (lambda x: x.content.strip())
+    try:
+        raw_response = yield LLMCall("handle_order", chain, {"message": user_message})
+    except Exception as e:
+        print(f"[Warning] Order LLM call failed: {e}. Using the canned reply.")
+        record_fallback("handle_order", "canned_reply")
+        state["messages"].append({"role": "assistant", "content": ORDER_FALLBACK})
+        return state
 
     print(f"[Debug] Raw LLM Order Parse: {raw_response}")
 
@@ -354,6 +573,7 @@ Rules:
     try:
         parsed = json.loads(clean_response)
     except json.JSONDecodeError:
+        record_parse_failure("handle_order")
         state["messages"].append({
             "role": "assistant",
             "content": "Sorry, I couldn't understand your order. Could you please repeat it clearly?"
@@ -362,66 +582,109 @@ Rules:
 
     items = parsed.get("items", [])
     bot_message = parsed.get("bot_message", "Okay, got it!")
+    return apply_order_changes(state, items, bot_message)
 
-    # --- Apply changes only for valid items ---
-    for change in items:
-        action = change.get("action", "").lower()
-        item = change.get("item", "").strip()
-        quantity = change.get("quantity", 1)
-        customizations = change.get("customizations", [])
-
-        # Validate against menu
-        if not item or item not in MENU:
-            continue  # leave explanation to bot_message
-
-        existing_item = next((o for o in state["order_items"] if o["item"].lower() == item.lower()), None)
 
-        if action == "add":
-            if existing_item:
-                existing_item["quantity"] += quantity
-                existing_item["customizations"].extend(customizations)
-            else:
-                state["order_items"].append({
-                    "item": item,
-                    "quantity": quantity,
-                    "customizations": customizations
-                })
+def handle_order(state: ChatState) -> ChatState:
+    """
+    Parses the user's message into structured order data.
+    Simple cart edits are handled by the local menu-aware parser; anything else
+    goes to the LLM, which is given the *current* restaurant menu, the user's current order,
+    and must output JSON with a list of items + a bot message.
+    """
+    return run_llm_steps(_handle_order_steps(state))
 
-        elif action == "update":
-            if existing_item:
-                existing_item["quantity"] = quantity
-                existing_item["customizations"] = customizations
-            # else ignore, bot_message should cover this
 
-        elif action == "remove":
-            if existing_item:
-                existing_item["quantity"] -= quantity
-                if existing_item["quantity"] <= 0:
-                    state["order_items"].remove(existing_item)
-            # else ignore, bot_message should cover this
+async def ahandle_order(state: ChatState) -> ChatState:
+    """Async version of `handle_order`."""
+    return await arun_llm_steps(_handle_order_steps(state))
 
-    # --- Recalculate total ---
-    state["total_cost"] = calculate_total(state["order_items"])
-
-    # --- Add assistant reply ---
-    state["messages"].append({
-        "role": "assistant",
-        "content": bot_message
-    })
 
+def apply_address(state: ChatState, final_address: str, address_is_valid: bool) -> ChatState:
+    """Records an extracted address (or asks again) and posts the bot reply."""
+    if address_is_valid:
+        state['delivery_address'] = final_address
+        try:
+            # Offered back to the customer at their next checkout
+            get_order_store().remember_address(state["user_id"], final_address)
+        except Exception as e:
+            print(f"[Warning] Could not save address for {state['user_id']}: {e}")
+        state['messages'].append({
+            "role": "assistant",
+            "content": (
+                f"Got it! Your address is recorded as: {final_address}. "
+                "Do you want to confirm the order or change anything else?"
+            )
+        })
+        state['address_valid'] = True
+        state['status'] = "awaiting_confirmation"
+    else:
+        state['messages'].append({
+            "role": "assistant",
+            "content": "I couldn't get a full address. Can you please provide your house number and street name?"
+        })
+        state['address_valid'] = False
     return state
 
 
-def take_address(state: ChatState) -> ChatState:
-    """
-    Uses the LLM to extract and validate the user's delivery address for a Pakistani context.
-    The LLM now outputs a boolean for validation and the final address string.
-    """
+def _take_address_steps(state: ChatState) -> LLMSteps:
     if not state["messages"]:
         return state
 
+    # Combined mode already extracted the address while classifying the message
+    pending = pop_pending_action(state, "take_address")
+    if pending:
+        final_address = str(pending["final_address"] or "").strip()
+        return apply_address(state, final_address, bool(pending["address_valid"]) and bool(final_address))
+
     user_message = state["messages"][-1]["content"].strip()
 
+    # Reply to "deliver to your saved address?", if that was the bot's last question
+    suggested = state.get("suggested_address")
+    state["suggested_address"] = None
+    previous = state["messages"][-2] if len(state["messages"]) > 1 else None
+    if not (previous and previous["role"] == "assistant" and suggested and suggested in previous["content"]):
+        suggested = None
+    if suggested:
+        answer = normalize(user_message)
+        if AFFIRM_RE.match(answer):
+            print("[Debug] Saved address accepted.")
+            return apply_address(state, suggested, True)
+        if DECLINE_RE.match(answer):
+            state['messages'].append({
+                "role": "assistant",
+                "content": "No problem! Please send the new delivery address (house number, street and area)."
+            })
+            state['address_valid'] = False
+            return state
+
+    # Clear-cut cases are settled locally; only ambiguous replies go to the LLM
+    verdict, local_address = prevalidate(user_message)
+    if verdict == VALID:
+        print(f"[Debug] Address accepted locally: {local_address}")
+        return apply_address(state, local_address, True)
+
+    saved = get_order_store().saved_addresses(state["user_id"])
+    known_address = match_saved(user_message, saved)
+    if known_address:
+        print(f"[Debug] Address matches a saved one: {known_address}")
+        return apply_address(state, known_address, True)
+
+    if verdict == INVALID:
+        if saved and not suggested:
+            state["suggested_address"] = saved[0]
+            state['messages'].append({
+                "role": "assistant",
+                "content": (
+                    f"Should we deliver to your saved address: {saved[0]}? "
+                    "Reply \"yes\" to use it, or send a new address."
+                )
+            })
+            state['address_valid'] = False
+            return state
+        return apply_address(state, "", False)
+    record_fallback("take_address", "llm")
+
     # The prompt is updated to be more flexible for Pakistani addresses
     # and to explicitly request a boolean `address_valid` in the output.
     system_prompt = f"""
@@ -439,8 +702,15 @@ Rules:
         ("human", "User Message: {message}")
     ])
     
-    chain = prompt | llm | (lambda x: x.content.strip())
-    raw_response = chain.invoke({"message": user_message})
+    chain = prompt | current_llm() | (lambda x: x.content.strip())
+    try:
+        raw_response = yield LLMCall("take_address", chain, {"message": user_message})
+    except Exception as e:
+        print(f"[Warning] Address LLM call failed: {e}. Asking for the address again.")
+        record_fallback("take_address", "canned_reply")
+        state["messages"].append({"role": "assistant", "content": ADDRESS_FALLBACK})
+        state["address_valid"] = False
+        return state
     print(f"[DEBUG] LLM Raw Response for Address: {raw_response}")
 
     try:
@@ -451,27 +721,10 @@ Rules:
         # Extract the new `final_address` and `address_valid` fields
         final_address = parsed.get("final_address", "").strip()
         address_is_valid = parsed.get("address_valid", False)
-        
-        # Check the address_is_valid boolean to update the state
-        if address_is_valid:
-            state['delivery_address'] = final_address
-            state['messages'].append({
-                "role": "assistant",
-                "content": (
-                    f"Got it! Your address is recorded as: {final_address}. "
-                    "Do you want to confirm the order or change anything else?"
-                )
-            })
-            state['address_valid'] = True
-            state['status'] = "awaiting_confirmation"
-        else:
-            state['messages'].append({
-                "role": "assistant",
-                "content": "I couldn't get a full address. Can you please provide your house number and street name?"
-            })
-            state['address_valid'] = False
+        apply_address(state, final_address, address_is_valid)
 
     except json.JSONDecodeError:
+        record_parse_failure("take_address")
         state['messages'].append({
             "role": "assistant",
             "content": "Sorry, I had trouble processing that. Can you please provide your address again?"
@@ -480,6 +733,19 @@ Rules:
 
     return state
 
+
+def take_address(state: ChatState) -> ChatState:
+    """
+    Uses the LLM to extract and validate the user's delivery address for a Pakistani context.
+    The LLM now outputs a boolean for validation and the final address string.
+    """
+    return run_llm_steps(_take_address_steps(state))
+
+
+async def atake_address(state: ChatState) -> ChatState:
+    """Async version of `take_address`."""
+    return await arun_llm_steps(_take_address_steps(state))
+
 def confirm_order(state: ChatState) -> ChatState:
     """Summarizes the order for confirmation."""
     order_summary = "\n".join([f"- {o['item']} (x{o['quantity']})" for o in state['order_items']])
@@ -499,10 +765,20 @@ def confirm_order(state: ChatState) -> ChatState:
 
 def place_order(state: ChatState) -> ChatState:
     """Simulates placing the order and provides confirmation."""
-    response_message = "Thank you! Your order has been placed successfully."
-    state['messages'].append({"role": "assistant", "content": response_message})
+    if not state["order_items"]:
+        state['is_confirmed'] = False
+        state['messages'].append({"role": "assistant", "content": "There's nothing in your order to place yet."})
+        return state
     state['status'] = "completed"
-    save_order_to_csv(state)
+    order_number = save_order(state)
+    note_order(order_number, [item["item"] for item in state["order_items"]])
+    state['last_order_number'] = order_number
+    # The order is saved: start the next one from an empty, unconfirmed cart
+    state['is_confirmed'] = False
+    state['order_items'] = []
+    state['total_cost'] = 0.0
+    response_message = f"Thank you! Your order #{order_number} has been placed successfully."
+    state['messages'].append({"role": "assistant", "content": response_message})
     print("Processed Place Order.")
     return state
 
@@ -515,4 +791,37 @@ def greetings(state: ChatState) -> ChatState:
 
 def router_func(state: ChatState) -> str:
     """A simple router that returns the last classified intent."""
-    return state["intent"]
\ No newline at end of file
+    return state["intent"]
+
+
+# --- Async entry points for the non-LLM nodes ---
+# They do no network I/O; place_order may reserve a block of order numbers in SQLite, so it runs in a worker thread.
+
+async def adisplay_orders(state: ChatState) -> ChatState:
+    """Async version of `display_orders`."""
+    return display_orders(state)
+
+
+async def atrack_order(state: ChatState) -> ChatState:
+    """Async version of `track_order`."""
+    return track_order(state)
+
+
+async def asend_menu(state: ChatState) -> ChatState:
+    """Async version of `send_menu`."""
+    return send_menu(state)
+
+
+async def aconfirm_order(state: ChatState) -> ChatState:
+    """Async version of `confirm_order`."""
+    return confirm_order(state)
+
+
+async def aplace_order(state: ChatState) -> ChatState:
+    """Async version of `place_order` (runs in a worker thread)."""
+    return await asyncio.to_thread(place_order, state)
+
+
+async def agreetings(state: ChatState) -> ChatState:
+    """Async version of `greetings`."""
+    return greetings(state)
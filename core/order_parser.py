@@ -0,0 +1,243 @@
+# core/order_parser.py
+import difflib
+import re
+from typing import Dict, List, Optional, Tuple
+from menu.catalog import MenuVersion, current_menu
+from core.state import OrderItem
+
+# Common names customers use for menu items (English + Roman Urdu)
+SYNONYMS: Dict[str, str] = {
+    "biryani": "chicken_biryani",
+    "biriyani": "chicken_biryani",
+    "hot sour soup": "hot_and_sour_soup",
+    "hot n sour soup": "hot_and_sour_soup",
+    "wings": "chicken_wings",
+    "mutton": "mutton_karahi",
+    "chowmein": "chicken_chowmein",
+    "chow mein": "chicken_chowmein",
+    "chicken chow mein": "chicken_chowmein",
+    "manchurian": "manchurian_chicken",
+    "chicken manchurian": "manchurian_chicken",
+    "kung pao": "kung_pao_chicken",
+    "kathi roll": "chicken_kathi_roll",
+    "kebab roll": "beef_kebab_roll",
+    "kabab roll": "beef_kebab_roll",
+    "shwarma": "shawarma",
+    "chips": "fries",
+    "french fries": "fries",
+    "tikka pizza": "tikka_boti_pizza",
+    "fajita": "fajita_pizza",
+    "margherita": "margherita_pizza",
+    "margarita pizza": "margherita_pizza",
+    "zinger": "zinger_burger",
+    "cheeseburger": "beef_cheeseburger",
+    "cheese burger": "beef_cheeseburger",
+    "coke": "soda",
+    "pepsi": "soda",
+    "sprite": "soda",
+    "cold drink": "soda",
+    "soft drink": "soda",
+    "lime soda": "fresh_lime_soda",
+    "chai": "tea",
+}
+
+QUANTITY_WORDS: Dict[str, int] = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "dozen": 12, "couple": 2,
+    "ek": 1, "aik": 1, "do": 2, "teen": 3, "char": 4, "chaar": 4, "panch": 5, "paanch": 5,
+}
+
+ADD_WORDS = {"add", "want", "order", "give", "get", "chahiye", "chahye", "dedo", "daldo", "daal", "bhejo", "send"}
+REMOVE_WORDS = {"remove", "delete", "cancel", "hata", "hatao", "hatado", "nikal", "nikalo", "nikaldo"}
+UPDATE_WORDS = {"update", "change", "make", "instead"}
+
+# Words that carry no order information on their own
+FILLER_WORDS = {
+    "i", "i'd", "id", "like", "would", "please", "plz", "pls", "can", "could", "you", "me",
+    "us", "my", "the", "of", "and", "also", "with", "to", "it", "them", "some", "more",
+    "x", "too", "as", "well", "just", "kindly", "mujhe", "hamein", "humein", "aur", "bhi",
+    "kar", "karo", "kardo", "do", "de", "dein", "or", "order", "in", "from", "cart", "please",
+}
+
+MAX_PHRASE_LEN = 5
+# Larger quantities ("100000000 biryani") are left to the LLM / a clarifying question
+MAX_LOCAL_QUANTITY = 50
+
+
+def _phrase(text: str) -> Tuple[str, ...]:
+    return tuple(text.lower().replace("_", " ").replace("&", "and").split())
+
+
+class OrderIndex:
+    """Item phrases, per-item customization phrases and vocabulary for one menu version."""
+
+    def __init__(self, menu: MenuVersion):
+        self.phrases: Dict[Tuple[str, ...], str] = {}
+        for item in menu.items:
+            self.phrases[_phrase(item)] = item
+        for alias, item in SYNONYMS.items():
+            if item in menu.items:
+                self.phrases[_phrase(alias)] = item
+
+        self.customizations: Dict[str, Dict[Tuple[str, ...], str]] = {
+            item: {_phrase(c): c for c in data.get("customizations", [])}
+            for item, data in menu.items.items()
+        }
+
+        vocabulary = set()
+        for phrase in self.phrases:
+            vocabulary.update(phrase)
+        for options in self.customizations.values():
+            for phrase in options:
+                vocabulary.update(phrase)
+        vocabulary.update(QUANTITY_WORDS, ADD_WORDS, REMOVE_WORDS, UPDATE_WORDS, FILLER_WORDS)
+        self.vocabulary = frozenset(vocabulary)
+        self._vocab_list = sorted(vocabulary)
+        self._corrections: Dict[str, Optional[str]] = {}
+
+    def correct(self, token: str) -> Optional[str]:
+        """Maps plurals and small misspellings onto the known vocabulary."""
+        if token in self.vocabulary or token.isdigit():
+            return token
+        if token in self._corrections:
+            return self._corrections[token]
+        corrected = None
+        for suffix in ("es", "s"):
+            if token.endswith(suffix) and token[:-len(suffix)] in self.vocabulary:
+                corrected = token[:-len(suffix)]
+                break
+        if corrected is None and len(token) >= 4:
+            match = difflib.get_close_matches(token, self._vocab_list, n=1, cutoff=0.8)
+            corrected = match[0] if match else None
+        if len(self._corrections) < 4096:
+            self._corrections[token] = corrected
+        return corrected
+
+
+def get_index() -> OrderIndex:
+    """Order index for the live menu version (rebuilt when the menu reloads)."""
+    return current_menu().derived("order_parser.index", OrderIndex)
+
+
+def _tokenize(message: str, index: OrderIndex) -> Optional[List[str]]:
+    """Splits the message into corrected tokens; None if any word is unknown."""
+    text = message.lower().replace("&", " and ").replace("’", "'")
+    text = re.sub(r"(\d+)\s*x\b", r"\1", text)          # "2x" -> "2"
+    text = re.sub(r"\bx\s*(\d+)", r"\1", text)          # "x2" -> "2"
+    raw_tokens = re.findall(r"[a-z']+|\d+", text)
+    tokens = []
+    for raw in raw_tokens:
+        token = index.correct(raw)
+        if token is None:
+            return None
+        tokens.append(token)
+    return tokens
+
+
+def _match_phrase(tokens: List[str], start: int, phrases: Dict[Tuple[str, ...], str]) -> Tuple[Optional[str], int]:
+    """Longest phrase in `phrases` starting at `start`; returns (value, length)."""
+    for length in range(min(MAX_PHRASE_LEN, len(tokens) - start), 0, -1):
+        value = phrases.get(tuple(tokens[start:start + length]))
+        if value:
+            return value, length
+    return None, 0
+
+
+def _quantity(token: str) -> Optional[int]:
+    if token.isdigit():
+        return int(token)
+    return QUANTITY_WORDS.get(token)
+
+
+def parse_order(message: str, order_items: List[OrderItem]) -> Optional[Dict]:
+    """
+    Parses simple cart edits ("2 chicken biryani extra spicy", "remove the fries")
+    into the same {"items": [...], "bot_message": str} structure the LLM returns.
+    Returns None when the message has words or combinations it can't resolve confidently.
+    """
+    index = get_index()
+    tokens = _tokenize(message, index)
+    if not tokens:
+        return None
+
+    in_cart = {o["item"] for o in order_items}
+    changes: List[Dict] = []
+    action = "add"
+    pending_quantity: Optional[int] = None
+    current: Optional[Dict] = None
+    i = 0
+
+    while i < len(tokens):
+        token = tokens[i]
+
+        # Customizations attach to the most recent item
+        if current:
+            custom, length = _match_phrase(tokens, i, index.customizations[current["item"]])
+            if custom:
+                if custom not in current["customizations"]:
+                    current["customizations"].append(custom)
+                i += length
+                continue
+
+        item, length = _match_phrase(tokens, i, index.phrases)
+        if item:
+            current = {
+                "action": action,
+                "item": item,
+                "quantity": pending_quantity,
+                "customizations": [],
+            }
+            changes.append(current)
+            pending_quantity = None
+            i += length
+            continue
+
+        # "do" is both "two" and "please do"; filler words only count right before an item
+        quantity = _quantity(token)
+        next_is_item = _match_phrase(tokens, i + 1, index.phrases)[0] is not None
+        if quantity is not None and (token not in FILLER_WORDS or next_is_item):
+            if current and current["quantity"] is None and not next_is_item:
+                current["quantity"] = quantity      # "biryani x2", "change biryani to 3"
+            else:
+                pending_quantity = quantity
+            i += 1
+            continue
+
+        if token in REMOVE_WORDS:
+            action, current = "remove", None
+        elif token in UPDATE_WORDS:
+            action, current = "update", None
+        elif token in ADD_WORDS:
+            action, current = "add", None
+        elif token not in FILLER_WORDS:
+            return None  # known word used in a way we don't understand (e.g. a foreign customization)
+        i += 1
+
+    if not changes or pending_quantity is not None:
+        return None
+
+    for change in changes:
+        if change["action"] in ("remove", "update") and change["item"] not in in_cart:
+            return None  # let the LLM explain what's wrong
+        if change["quantity"] is None:
+            if change["action"] == "update":
+                return None
+            if change["action"] == "remove":
+                change["quantity"] = sum(o["quantity"] for o in order_items if o["item"] == change["item"])
+            else:
+                change["quantity"] = 1
+        if not 0 < change["quantity"] <= MAX_LOCAL_QUANTITY:
+            return None
+
+    return {"items": changes, "bot_message": _summarize(changes)}
+
+
+def _summarize(changes: List[Dict]) -> str:
+    verbs = {"add": "Added", "remove": "Removed", "update": "Updated"}
+    parts = []
+    for change in changes:
+        name = change["item"].replace("_", " ").title()
+        custom = f" ({', '.join(change['customizations'])})" if change["customizations"] else ""
+        parts.append(f"{verbs[change['action']]} {change['quantity']}x {name}{custom}")
+    return "; ".join(parts) + ". Anything else?"
@@ -0,0 +1,251 @@
+# core/order_queue.py
+"""
+Write-behind order persistence.
+
+`place_order` hands the finished order to `OrderWriter.submit` and replies
+straight away; one background thread per process writes queued orders to the
+order store in batches. Because a single thread does every write, rows from
+concurrent checkouts can't interleave.
+
+Durability policy (env vars):
+- ORDER_FLUSH_BATCH=N: write as soon as N orders are queued (default 1, i.e.
+  per order; 0 means no count limit);
+- ORDER_FLUSH_INTERVAL_MS=T: never hold an order longer than T ms (default 200).
+So "per order" is N=1, "per N orders" is N with a large T, and "every T ms" is
+N=0. The queue is drained on `close()`, which runs at interpreter exit.
+
+Orders that are queued but not yet written are still visible through
+`pending_order` and `latest_pending`, which track_order checks first.
+
+An order that still can't be saved after WRITE_RETRIES is appended, with the
+error, to the dead-letter file ORDER_DEAD_LETTER_FILE (one JSON line per
+order; a tenant's goes in its directory). Once the cause is fixed, an operator
+replays it with:
+
+    python -m core.order_queue replay [failed_orders.jsonl]
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from core.metrics import metrics
+from core.order_store import DuplicateOrderError, OrderStore, get_order_store
+from core.tenancy import current_tenant
+
+ORDER_FLUSH_BATCH = int(os.environ.get("ORDER_FLUSH_BATCH", 1))
+ORDER_FLUSH_INTERVAL_MS = float(os.environ.get("ORDER_FLUSH_INTERVAL_MS", 200))
+WRITE_RETRIES = 3
+ORDER_DEAD_LETTER_FILE = os.environ.get("ORDER_DEAD_LETTER_FILE", "failed_orders.jsonl")
+
+
+class OrderWriter:
+    """Single background writer that flushes queued orders to an order store."""
+
+    def __init__(self, store: Optional[OrderStore] = None, batch: int = ORDER_FLUSH_BATCH,
+                 interval_ms: float = ORDER_FLUSH_INTERVAL_MS, dead_letter: str = ORDER_DEAD_LETTER_FILE):
+        self.store = store or get_order_store()
+        self.dead_letter = dead_letter
+        self.batch = max(batch, 0)
+        self.interval = max(interval_ms, 0) / 1000
+        self._cond = threading.Condition()
+        self._queue: List[Dict[str, Any]] = []
+        self._queued_at: Dict[int, float] = {}          # order_number -> monotonic submit time
+        self._pending: Dict[int, Dict[str, Any]] = {}   # order_number -> order, until written
+        self._closed = False
+        self._flush_requested = False
+        self.written = 0
+        self.failed: List[Dict[str, Any]] = []
+        self._thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, order: Dict[str, Any]) -> None:
+        """Queues an order for writing; returns without touching the disk."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("order writer is closed")
+            self._queue.append(order)
+            self._pending[int(order["order_number"])] = order
+            self._queued_at[int(order["order_number"])] = time.monotonic()
+            self._cond.notify()
+
+    def pending_order(self, order_number: int) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            return self._pending.get(int(order_number))
+
+    def latest_pending(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's newest order that hasn't been written yet."""
+        with self._cond:
+            mine = [o for o in self._pending.values() if str(o["user_id"]) == str(user_id)]
+        return max(mine, key=lambda o: (o["timestamp"], o["order_number"])) if mine else None
+
+    def _ready(self, oldest: Optional[float]) -> bool:
+        if not self._queue:
+            return False
+        if self._closed or self._flush_requested or (self.batch and len(self._queue) >= self.batch):
+            return True
+        return oldest is not None and time.monotonic() - oldest >= self.interval
+
+    def _run(self) -> None:
+        oldest: Optional[float] = None
+        while True:
+            with self._cond:
+                while not self._ready(oldest):
+                    if self._closed and not self._queue:
+                        return
+                    if self._queue and oldest is None:
+                        oldest = time.monotonic()
+                    timeout = None if oldest is None else max(self.interval - (time.monotonic() - oldest), 0)
+                    self._cond.wait(timeout)
+                batch, self._queue = self._queue, []
+                oldest = None
+                self._flush_requested = False
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        failed_before = len(self.failed)
+        for attempt in range(WRITE_RETRIES):
+            try:
+                self.store.save_orders(batch)
+                break
+            except DuplicateOrderError:
+                # One bad order must not sink the rest of the batch
+                self._write_one_by_one(batch)
+                break
+            except Exception as e:
+                print(f"[Warning] Writing {len(batch)} orders failed (attempt {attempt + 1}): {e}")
+                time.sleep(0.1 * 2 ** attempt)
+        else:
+            self._write_one_by_one(batch)
+        metrics.observe("orderbot_order_write_seconds", time.perf_counter() - start)
+        metrics.inc("orderbot_order_write_batches_total")
+        written = len(batch) - (len(self.failed) - failed_before)
+        metrics.inc("orderbot_orders_written_total", written)
+        now = time.monotonic()
+        with self._cond:
+            for order in batch:
+                self._pending.pop(int(order["order_number"]), None)
+                queued_at = self._queued_at.pop(int(order["order_number"]), now)
+                metrics.observe("orderbot_order_queue_seconds", now - queued_at)
+            self.written += written
+            self._cond.notify_all()
+
+    def _write_one_by_one(self, batch: List[Dict[str, Any]]) -> None:
+        for order in batch:
+            try:
+                self.store.save_orders([order])
+            except Exception as e:
+                print(f"[Warning] Order #{order['order_number']} could not be saved: {e}")
+                metrics.inc("orderbot_order_write_failures_total")
+                self.failed.append(order)
+                self._dead_letter(order, e)
+
+    def _dead_letter(self, order: Dict[str, Any], error: Exception) -> None:
+        """Appends an unsaved order to the dead-letter file (only the writer thread calls this)."""
+        entry = {"failed_at": datetime.now().isoformat(timespec="seconds"), "error": str(error), "order": order}
+        try:
+            # Opened per failure, so a replay can move the file aside at any time
+            with open(self.dead_letter, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"[Warning] Order #{order['order_number']} could not be written to {self.dead_letter}: {e}")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until everything submitted so far is written; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = set(self._pending)
+            self._flush_requested = True
+            self._cond.notify_all()
+            while target & self._pending.keys():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Stops accepting orders and drains the queue."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+_writer: Optional[OrderWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_order_writer() -> OrderWriter:
+    """The order writer (the active tenant's, else the process-wide one), drained automatically at exit."""
+    global _writer
+    tenant = current_tenant()
+    if tenant is not None:
+        # Closed (and drained) when the tenant is evicted or at exit
+        return tenant.resource("order_writer", lambda t: OrderWriter(dead_letter=t.path("failed_orders.jsonl")))
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = OrderWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def replay_failed_orders(path: str = ORDER_DEAD_LETTER_FILE, store: Optional[OrderStore] = None) -> Dict[str, int]:
+    """
+    Saves the orders in a dead-letter file to the order store. Orders already in
+    the store are dropped; orders that still fail (or whose number now belongs to
+    a different order) are appended back to the file for another look.
+    """
+    store = store or get_order_store()
+    counts = {"replayed": 0, "already_present": 0, "still_failing": 0}
+    if not os.path.exists(path):
+        return counts
+    # Moved aside first, so failures the live writer appends meanwhile aren't lost
+    replaying = f"{path}.replaying"
+    os.replace(path, replaying)
+    retry: List[str] = []
+    with open(replaying, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            order = entry["order"]
+            try:
+                store.save_orders([order])
+                counts["replayed"] += 1
+                continue
+            except DuplicateOrderError as e:
+                saved = store.get_order(order["order_number"])
+                if saved and (str(saved["user_id"]), str(saved["timestamp"])) == (str(order["user_id"]), order["timestamp"]):
+                    counts["already_present"] += 1
+                    continue
+                entry["error"] = str(e)
+            except Exception as e:
+                entry["error"] = str(e)
+            print(f"[Warning] Order #{order['order_number']} still could not be saved: {entry['error']}")
+            counts["still_failing"] += 1
+            retry.append(json.dumps(entry) + "\n")
+    if retry:
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(retry)
+    os.remove(replaying)
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "replay":
+        print("Usage: python -m core.order_queue replay [failed_orders.jsonl]")
+        sys.exit(1)
+    dead_letter = sys.argv[2] if len(sys.argv) == 3 else ORDER_DEAD_LETTER_FILE
+    counts = replay_failed_orders(dead_letter)
+    print(
+        f"Replayed {counts['replayed']} orders from {dead_letter} "
+        f"({counts['already_present']} already saved, {counts['still_failing']} still failing and kept)."
+    )
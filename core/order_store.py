@@ -0,0 +1,558 @@
+# core/order_store.py
+"""
+Pluggable order storage.
+
+The default backend is SQLite in WAL mode: orders are indexed by order number,
+user and timestamp, and line items live in their own table. The legacy
+append-only CSV backend is kept for existing deployments (ORDER_STORE=csv).
+
+One-shot import of an existing CSV file:
+    python -m core.order_store import orders.csv
+"""
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from menu.catalog import current_menu
+from core.address import address_key
+from core.order_ids import OrderIdGenerator
+from core.state import ChatState
+from core.tenancy import Tenant, current_tenant
+
+ORDERS_FILE = os.environ.get("ORDERS_FILE", "orders.csv")
+ORDERS_DB = os.environ.get("ORDERS_DB", "orders.db")
+ORDER_STORE = os.environ.get("ORDER_STORE", "sqlite").lower()
+
+# Columns of an order row, in the legacy CSV order
+ORDER_COLUMNS = [
+    "order_number", "user_id", "timestamp", "items", "total_cost",
+    "delivery_address", "status"
+]
+
+# One order line as returned by `OrderStore.iter_line_items` (customizations as JSON text)
+LINE_ITEM_COLUMNS = [
+    "order_number", "user_id", "timestamp", "item", "quantity", "unit_price", "customizations"
+]
+
+LEGACY_ITEM_RE = re.compile(r"^\s*(\d+)x (\S+)(?: \((.*)\))?\s*$")
+
+
+class DuplicateOrderError(Exception):
+    """Raised when an order number is already taken."""
+
+
+def format_items(line_items: List[Dict[str, Any]]) -> str:
+    """Legacy one-string rendering, e.g. "2x chicken_biryani (extra spicy); 1x soda"."""
+    items_str = []
+    for item in line_items:
+        customizations = f" ({', '.join(item['customizations'])})" if item.get("customizations") else ""
+        items_str.append(f"{item['quantity']}x {item['item']}{customizations}")
+    return "; ".join(items_str)
+
+
+def parse_items(items_str: str) -> List[Dict[str, Any]]:
+    """Parses the legacy items string back into line items (unit prices from the live menu)."""
+    menu = current_menu()
+    line_items = []
+    for part in (items_str or "").split("; "):
+        match = LEGACY_ITEM_RE.match(part)
+        if not match:
+            continue
+        quantity, item, customizations = match.groups()
+        line_items.append({
+            "item": item,
+            "quantity": int(quantity),
+            "customizations": [c.strip() for c in customizations.split(",")] if customizations else [],
+            "unit_price": menu.price(item),
+        })
+    return line_items
+
+
+def build_order_record(state: ChatState, order_number: int) -> Dict[str, Any]:
+    """Snapshots the confirmed order in `state`, including per-line prices at order time."""
+    menu = current_menu()
+    line_items = [
+        {
+            "item": item["item"],
+            "quantity": item["quantity"],
+            "customizations": list(item.get("customizations") or []),
+            "unit_price": item.get("unit_price", menu.price(item["item"])),
+        }
+        for item in state["order_items"]
+    ]
+    return {
+        "order_number": order_number,
+        "user_id": state["user_id"],
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "items": format_items(line_items),
+        "total_cost": state["total_cost"],
+        "delivery_address": state["delivery_address"],
+        "status": state["status"],
+        "line_items": line_items,
+    }
+
+
+class OrderStore(ABC):
+    """Interface every order backend implements. Rows are dicts keyed by ORDER_COLUMNS."""
+
+    # Whether iter_line_items cursors can resume (otherwise every call reads all lines)
+    line_items_resumable = False
+
+    @abstractmethod
+    def save_order(self, order: Dict[str, Any]) -> None:
+        ...
+
+    def save_orders(self, orders: List[Dict[str, Any]]) -> int:
+        """Writes several orders (used by the background order writer); returns how many."""
+        for order in orders:
+            self.save_order(order)
+        return len(orders)
+
+    @abstractmethod
+    def get_order(self, order_number: int) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_orders(self, user_id: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Newest first, optionally for a single user."""
+
+    @abstractmethod
+    def count_orders(self, user_id: Optional[str] = None) -> int:
+        ...
+
+    @abstractmethod
+    def line_items(self, order_number: int) -> List[Dict[str, Any]]:
+        ...
+
+    def iter_line_items(self, after: Optional[int] = None,
+                        chunk_size: int = 100_000) -> Iterator[Tuple[List[tuple], Optional[int]]]:
+        """
+        Every order line as LINE_ITEM_COLUMNS tuples, in chunks, for bulk readers such as
+        core.analytics. Each chunk comes with a cursor: passing the last one back as `after`
+        yields only lines added since. A None cursor means the backend can't resume, so the
+        caller has to re-read everything.
+        """
+        chunk: List[tuple] = []
+        for order in self.list_orders(limit=self.count_orders()):
+            for line in self.line_items(order["order_number"]):
+                chunk.append((
+                    int(order["order_number"]), str(order["user_id"]), order["timestamp"], line["item"],
+                    line["quantity"], line["unit_price"], json.dumps(line["customizations"]),
+                ))
+            if len(chunk) >= chunk_size:
+                yield chunk, None
+                chunk = []
+        if chunk:
+            yield chunk, None
+
+    def latest_order(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's most recent order, if any."""
+        rows = self.list_orders(user_id, limit=1)
+        return rows[0] if rows else None
+
+    def remember_address(self, user_id: str, address: str) -> None:
+        """Records a validated delivery address. Without an address book, order history is used."""
+
+    def saved_addresses(self, user_id: str, limit: int = 3) -> List[str]:
+        """The user's recently used delivery addresses, newest first (from past orders)."""
+        addresses: Dict[str, str] = {}
+        for order in self.list_orders(user_id, limit=20):
+            address = (order.get("delivery_address") or "").strip()
+            if address:
+                addresses.setdefault(address_key(address), address)
+        return list(addresses.values())[:limit]
+
+
+class SQLiteOrderStore(OrderStore):
+    """SQLite backend (WAL mode), safe for concurrent readers and writers."""
+
+    line_items_resumable = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS orders (
+        order_number     INTEGER PRIMARY KEY,
+        user_id          TEXT NOT NULL,
+        timestamp        TEXT NOT NULL,
+        items            TEXT NOT NULL,
+        total_cost       REAL NOT NULL,
+        delivery_address TEXT,
+        status           TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_orders_user_time ON orders (user_id, timestamp DESC);
+    CREATE INDEX IF NOT EXISTS idx_orders_time ON orders (timestamp DESC);
+
+    CREATE TABLE IF NOT EXISTS order_items (
+        order_number   INTEGER NOT NULL REFERENCES orders (order_number),
+        line_no        INTEGER NOT NULL,
+        item           TEXT NOT NULL,
+        quantity       INTEGER NOT NULL,
+        unit_price     REAL NOT NULL,
+        customizations TEXT NOT NULL,
+        PRIMARY KEY (order_number, line_no)
+    );
+    CREATE INDEX IF NOT EXISTS idx_order_items_item ON order_items (item);
+
+    CREATE TABLE IF NOT EXISTS saved_addresses (
+        user_id     TEXT NOT NULL,
+        address_key TEXT NOT NULL,
+        address     TEXT NOT NULL,
+        last_used   TEXT NOT NULL,
+        uses        INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (user_id, address_key)
+    );
+    CREATE INDEX IF NOT EXISTS idx_saved_addresses_user ON saved_addresses (user_id, last_used DESC);
+    """
+
+    def __init__(self, path: str = ORDERS_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run while a writer commits."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def save_order(self, order: Dict[str, Any]) -> None:
+        self.save_orders([order])
+
+    def save_orders(self, orders: List[Dict[str, Any]], skip_existing: bool = False) -> int:
+        """Writes several orders in one transaction; returns how many were inserted."""
+        conn = self._connect()
+        verb = "INSERT OR IGNORE" if skip_existing else "INSERT"
+        inserted = 0
+        try:
+            with conn:
+                for order in orders:
+                    cursor = conn.execute(
+                        f"{verb} INTO orders ({', '.join(ORDER_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [order[column] for column in ORDER_COLUMNS],
+                    )
+                    if cursor.rowcount == 0:
+                        continue
+                    inserted += 1
+                    conn.executemany(
+                        "INSERT INTO order_items (order_number, line_no, item, quantity, unit_price, customizations) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [
+                            (order["order_number"], line_no, line["item"], line["quantity"],
+                             line["unit_price"], json.dumps(line["customizations"]))
+                            for line_no, line in enumerate(order["line_items"])
+                        ],
+                    )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateOrderError(str(e)) from e
+        return inserted
+
+    def get_order(self, order_number: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT * FROM orders WHERE order_number = ?", (order_number,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def list_orders(self, user_id: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        if user_id is None:
+            rows = self._connect().execute(
+                "SELECT * FROM orders ORDER BY timestamp DESC, order_number DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            )
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM orders WHERE user_id = ? "
+                "ORDER BY timestamp DESC, order_number DESC LIMIT ? OFFSET ?",
+                (str(user_id), limit, offset),
+            )
+        return [dict(row) for row in rows]
+
+    def count_orders(self, user_id: Optional[str] = None) -> int:
+        if user_id is None:
+            return self._connect().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM orders WHERE user_id = ?", (str(user_id),)
+        ).fetchone()[0]
+
+    def remember_address(self, user_id: str, address: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO saved_addresses (user_id, address_key, address, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, address_key) DO UPDATE SET "
+                "address = excluded.address, last_used = excluded.last_used, uses = uses + 1",
+                (str(user_id), address_key(address), address, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def saved_addresses(self, user_id: str, limit: int = 3) -> List[str]:
+        rows = self._connect().execute(
+            "SELECT address FROM saved_addresses WHERE user_id = ? ORDER BY last_used DESC LIMIT ?",
+            (str(user_id), limit),
+        ).fetchall()
+        # Customers from before the address book still have their order history
+        return [row["address"] for row in rows] or super().saved_addresses(user_id, limit)
+
+    def iter_line_items(self, after: Optional[int] = None,
+                        chunk_size: int = 100_000) -> Iterator[Tuple[List[tuple], Optional[int]]]:
+        # order_items' rowid only grows, so it doubles as the resume cursor
+        cursor = after or 0
+        # Plain tuples: sqlite3.Row costs more than the query itself at this volume
+        db_cursor = self._connect().cursor()
+        db_cursor.row_factory = None
+        while True:
+            rows = db_cursor.execute(
+                "SELECT oi.rowid, oi.order_number, o.user_id, o.timestamp, oi.item, oi.quantity, "
+                "oi.unit_price, oi.customizations FROM order_items oi JOIN orders o USING (order_number) "
+                "WHERE oi.rowid > ? ORDER BY oi.rowid LIMIT ?",
+                (cursor, chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+            cursor = rows[-1][0]
+            yield [row[1:] for row in rows], cursor
+
+    def line_items(self, order_number: int) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT item, quantity, unit_price, customizations FROM order_items "
+            "WHERE order_number = ? ORDER BY line_no",
+            (order_number,),
+        )
+        return [
+            {"item": r["item"], "quantity": r["quantity"], "unit_price": r["unit_price"],
+             "customizations": json.loads(r["customizations"])}
+            for r in rows
+        ]
+
+
+def _sort_key(row: Dict[str, Any]):
+    """Orders sort by timestamp, then by order number."""
+    number = row["order_number"]
+    return (row["timestamp"], int(number) if str(number).isdigit() else 0)
+
+
+class CsvOrderStore(OrderStore):
+    """
+    Legacy backend: one appended CSV row per order, items flattened into a string.
+
+    Reads are served from in-memory indexes that are kept in sync incrementally:
+    when the file's mtime/size change, only the bytes appended since the last read
+    are parsed. Rows are kept sorted by time, so a page is just a slice.
+    """
+
+    def __init__(self, path: str = ORDERS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._stamp = None
+        self._offset = 0          # bytes of the file already parsed
+        self._tail_pending = False  # a partly written last line is waiting past _offset
+        self._header: Optional[List[str]] = None
+        self._rows: List[Dict[str, Any]] = []                 # sorted oldest -> newest
+        self._by_number: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[str, List[Dict[str, Any]]] = {}   # each sorted oldest -> newest
+
+    def save_order(self, order: Dict[str, Any]) -> None:
+        self.save_orders([order])
+
+    def save_orders(self, orders: List[Dict[str, Any]]) -> int:
+        """Appends all rows with a single open/write; nothing is written if any order exists."""
+        with self._lock:
+            self._refresh()
+            seen = set()
+            for order in orders:
+                number = str(order["order_number"])
+                if number in self._by_number or number in seen:
+                    raise DuplicateOrderError(f"order {number} already exists")
+                seen.add(number)
+            file_exists = os.path.isfile(self.path)
+            with open(self.path, mode="a", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                # Write header if file is new
+                if not file_exists:
+                    writer.writerow(ORDER_COLUMNS)
+                writer.writerows([order[column] for column in ORDER_COLUMNS] for order in orders)
+        return len(orders)
+
+    def _refresh(self) -> None:
+        """Brings the indexes up to date with the file, parsing only newly appended rows."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp and not self._tail_pending:
+            return
+        # Truncated or replaced file: start over
+        if self._stamp is None or stat.st_ino != self._stamp[0] or stat.st_size < self._offset:
+            self._reset()
+
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            chunk = file.read(stat.st_size - self._offset)
+        # Leave a partially written last line for the next refresh
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        if complete:
+            new_rows = []
+            reader = csv.reader(io.StringIO(complete.decode("utf-8"), newline=""))
+            for values in reader:
+                if self._header is None:
+                    self._header = values
+                elif values:
+                    new_rows.append(dict(zip(self._header, values)))
+            self._add_rows(new_rows)
+            self._offset += len(complete)
+        # Keep the stamp either way: a None stamp would make the next refresh re-read the whole file
+        self._stamp = stamp
+        self._tail_pending = len(complete) != len(chunk)
+
+    def _add_rows(self, new_rows: List[Dict[str, Any]]) -> None:
+        appended = {id(self._rows): [self._rows, len(new_rows)]}
+        for row in new_rows:
+            self._by_number[row["order_number"]] = row
+            user_rows = self._by_user.setdefault(row["user_id"], [])
+            user_rows.append(row)
+            appended.setdefault(id(user_rows), [user_rows, 0])[1] += 1
+        self._rows.extend(new_rows)
+        # Appends are almost always in time order, so this is usually just a check;
+        # otherwise timsort merges the new run into the already-sorted prefix
+        for rows, count in appended.values():
+            tail = rows[-count - 1:]
+            if any(_sort_key(a) > _sort_key(b) for a, b in zip(tail, tail[1:])):
+                rows.sort(key=_sort_key)
+
+    def _read_all(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            if user_id is None:
+                return self._rows
+            return self._by_user.get(str(user_id), [])
+
+    def get_order(self, order_number: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return self._by_number.get(str(order_number))
+
+    def list_orders(self, user_id: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        rows = self._read_all(user_id)
+        # Newest first: slice from the end of the time-sorted index
+        end = max(len(rows) - offset, 0)
+        start = max(end - limit, 0)
+        return rows[start:end][::-1]
+
+    def count_orders(self, user_id: Optional[str] = None) -> int:
+        return len(self._read_all(user_id))
+
+    def latest_order(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._read_all(user_id)
+        return rows[-1] if rows else None
+
+    def line_items(self, order_number: int) -> List[Dict[str, Any]]:
+        order = self.get_order(order_number)
+        return parse_items(order["items"]) if order else []
+
+
+def import_csv(csv_path: str, store: SQLiteOrderStore, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Copies a legacy orders CSV into a SQLite store and returns counts of
+    imported, renumbered and already_present orders.
+
+    Legacy order numbers were random (1000-9999), so different orders can share
+    one. An order whose number is taken by a different order gets a new number
+    from the order-number sequence and is logged. Re-running the import skips
+    orders already copied (same user, time and items), renumbered or not.
+    """
+    generator = OrderIdGenerator(store.path)
+    conn = store._connect()
+    counts = {"imported": 0, "renumbered": 0, "already_present": 0}
+    claimed = set()   # order numbers used by rows of this file
+    seen = set()      # identities of rows of this file
+    batch: List[Dict[str, Any]] = []
+
+    def identity(order: Dict[str, Any]) -> Tuple[str, str, str]:
+        return str(order["user_id"]), str(order["timestamp"]), str(order["items"])
+
+    with open(csv_path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            order = {
+                "order_number": int(row["order_number"]),
+                "user_id": row["user_id"],
+                "timestamp": row["timestamp"],
+                "items": row["items"],
+                "total_cost": float(row["total_cost"] or 0),
+                "delivery_address": row.get("delivery_address"),
+                "status": row.get("status"),
+                "line_items": parse_items(row["items"]),
+            }
+            key = identity(order)
+            already = conn.execute(
+                "SELECT 1 FROM orders WHERE user_id = ? AND timestamp = ? AND items = ? LIMIT 1", key
+            ).fetchone()
+            if already or key in seen:
+                counts["already_present"] += 1
+                continue
+            number = order["order_number"]
+            if number in claimed or conn.execute("SELECT 1 FROM orders WHERE order_number = ?", (number,)).fetchone():
+                order["order_number"] = generator.next_id()
+                print(f"[Warning] Order #{number} ({order['user_id']}, {order['timestamp']}) collides with "
+                      f"another order; imported as #{order['order_number']}.")
+                counts["renumbered"] += 1
+            claimed.add(order["order_number"])
+            seen.add(key)
+            batch.append(order)
+            if len(batch) >= batch_size:
+                counts["imported"] += store.save_orders(batch)
+                batch = []
+    if batch:
+        counts["imported"] += store.save_orders(batch)
+    generator.close()
+    return counts
+
+
+_store: Optional[OrderStore] = None
+_store_lock = threading.Lock()
+
+
+def _tenant_store(tenant: Tenant) -> OrderStore:
+    if ORDER_STORE == "csv":
+        return CsvOrderStore(tenant.path("orders.csv"))
+    return SQLiteOrderStore(tenant.path("orders.db"))
+
+
+def get_order_store() -> OrderStore:
+    """Returns the order store selected by ORDER_STORE (sqlite|csv): the active tenant's, else the process-wide one."""
+    global _store
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant.resource("order_store", _tenant_store)
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CsvOrderStore() if ORDER_STORE == "csv" else SQLiteOrderStore()
+    return _store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        print("Usage: python -m core.order_store import <orders.csv>")
+        sys.exit(1)
+    counts = import_csv(sys.argv[2], SQLiteOrderStore())
+    print(
+        f"Imported {counts['imported']} orders from {sys.argv[2]} into {ORDERS_DB} "
+        f"({counts['renumbered']} renumbered after number collisions, "
+        f"{counts['already_present']} already present and skipped)."
+    )
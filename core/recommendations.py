@@ -0,0 +1,203 @@
+# core/recommendations.py
+"""
+"What goes with my cart?" answered locally from order history.
+
+`RecommendationIndex` counts, over all past orders:
+- how many orders contain each item, and each pair of items (co-occurrence);
+- the same per menu category (so a cart of mains leans towards drinks and
+  desserts if that's what people add, even for items with little history).
+
+A candidate's score for a cart mixes how often it is bought with the cart's
+items (confidence, averaged over the cart), how often its category joins the
+cart's categories, and its overall popularity. Scoring walks the menu once, so
+an answer takes well under a millisecond.
+
+The index is built from the order store on first use. `note_order` (called by
+place_order) adds new orders straight away; orders placed by other processes
+are picked up from the store every REFRESH_SECONDS (SQLite backend).
+
+suggest_order uses the top picks to keep its prompt small, or skips the LLM
+entirely with FAST_SUGGESTIONS=1.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from menu.catalog import current_menu
+from core.order_store import OrderStore, get_order_store
+from core.tenancy import current_tenant
+
+FAST_SUGGESTIONS = os.environ.get("FAST_SUGGESTIONS", "0") == "1"
+REFRESH_SECONDS = 30.0
+CO_OCCURRENCE_WEIGHT = 0.6
+CATEGORY_WEIGHT = 0.3
+POPULARITY_WEIGHT = 0.1
+
+# Words customers use for a category, when the menu names it differently
+CATEGORY_ALIASES = {"drink": "beverages", "drinks": "beverages", "appetizer": "starters", "appetizers": "starters"}
+
+_EMPTY: Counter = Counter()
+
+
+class RecommendationIndex:
+    """Item and category co-occurrence counts, updated incrementally."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.orders = 0
+        self.item_counts: Counter = Counter()
+        self.pairs: Dict[str, Counter] = {}
+        self.category_counts: Counter = Counter()
+        self.category_pairs: Dict[str, Counter] = {}
+        self._cursor: Optional[int] = None
+        self._noted: Set[int] = set()   # orders added by note_order, not yet seen in the store
+        self._refreshed_at = 0.0
+
+    @staticmethod
+    def _category(menu_items: Dict[str, dict], item: str) -> str:
+        data = menu_items.get(item)
+        return data.get("category", "other") if data else "other"
+
+    def _add(self, items: Iterable[str], menu_items: Dict[str, dict]) -> None:
+        items = set(items)
+        if not items:
+            return
+        categories = {self._category(menu_items, item) for item in items}
+        self.orders += 1
+        for counts, pairs, keys in ((self.item_counts, self.pairs, items),
+                                    (self.category_counts, self.category_pairs, categories)):
+            for key in keys:
+                counts[key] += 1
+                pair_counts = pairs.setdefault(key, Counter())
+                for other in keys:
+                    if other != key:
+                        pair_counts[other] += 1
+
+    def add_order(self, order_number: Optional[int], items: Iterable[str]) -> None:
+        """Counts a just-placed order; it is skipped when later read back from the store."""
+        with self.lock:
+            self._add(items, current_menu().items)
+            if order_number is not None and self._cursor is not None:
+                self._noted.add(int(order_number))
+
+    def load(self, store: OrderStore) -> None:
+        """Reads orders from the store: everything on the first call, then only new ones."""
+        current: Optional[int] = None
+        items: List[str] = []
+        menu_items = current_menu().items
+        with self.lock:
+            if store.line_items_resumable and self._cursor is None:
+                self._cursor = 0
+            for rows, cursor in store.iter_line_items(after=self._cursor):
+                # Lines of one order are contiguous, so orders are counted as they complete
+                for row in rows:
+                    if row[0] != current:
+                        self._add_stored(current, items, menu_items)
+                        current, items = row[0], []
+                    items.append(row[3])
+                self._cursor = cursor if store.line_items_resumable else None
+            self._add_stored(current, items, menu_items)
+            self._refreshed_at = time.monotonic()
+
+    def _add_stored(self, order_number: Optional[int], items: List[str], menu_items: Dict[str, dict]) -> None:
+        if order_number is None:
+            return
+        if order_number in self._noted:
+            self._noted.discard(order_number)
+            return
+        self._add(items, menu_items)
+
+    def maybe_refresh(self, store: OrderStore) -> None:
+        # Stores that can't resume were read in full when the index was built
+        if self._cursor is not None and time.monotonic() - self._refreshed_at >= REFRESH_SECONDS:
+            self.load(store)
+
+    def recommend(self, cart: Iterable[str], limit: int = 3, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top menu items to add to `cart` as (item, score), best first, spread over categories."""
+        menu = current_menu()
+        in_cart = set(cart)
+        cart_categories = {self._category(menu.items, item) for item in in_cart}
+        scored = []
+        with self.lock:
+            for position, (item, data) in enumerate(menu.items.items()):
+                item_category = data.get("category", "other")
+                if item in in_cart or (category and item_category != category):
+                    continue
+                co = 0.0
+                if in_cart:
+                    co = sum(
+                        self.pairs.get(a, _EMPTY)[item] / self.item_counts[a] for a in in_cart if self.item_counts[a]
+                    ) / len(in_cart)
+                complement = 0.0
+                if cart_categories and item_category not in cart_categories:
+                    complement = sum(
+                        self.category_pairs.get(c, _EMPTY)[item_category] / self.category_counts[c]
+                        for c in cart_categories if self.category_counts[c]
+                    ) / len(cart_categories)
+                popularity = self.item_counts[item] / self.orders if self.orders else 0.0
+                score = CO_OCCURRENCE_WEIGHT * co + CATEGORY_WEIGHT * complement + POPULARITY_WEIGHT * popularity
+                # Ties (e.g. no history yet) go to categories the cart lacks, then menu order
+                scored.append((-score, item_category in cart_categories, position, item, item_category))
+        scored.sort()
+
+        picks: List[Tuple[str, float]] = []
+        used_categories: Set[str] = set()
+        for spread in (True, False):
+            for neg_score, _, _, item, item_category in scored:
+                if len(picks) >= limit:
+                    return picks
+                if (spread and item_category in used_categories) or any(item == p for p, _ in picks):
+                    continue
+                picks.append((item, -neg_score))
+                used_categories.add(item_category)
+        return picks
+
+
+def requested_category(message: str) -> Optional[str]:
+    """A menu category the customer asked for, e.g. "any desserts?" -> "desserts"."""
+    words = set(re.findall(r"[a-z]+", message.lower()))
+    categories = current_menu().categories
+    for category in categories:
+        singular = category[:-1] if category.endswith("s") else category
+        if words & {category, singular, category + "s"}:
+            return category
+    for word in words:
+        if CATEGORY_ALIASES.get(word) in categories:
+            return CATEGORY_ALIASES[word]
+    return None
+
+
+_index: Optional[RecommendationIndex] = None
+_index_lock = threading.Lock()
+
+
+def _build_index(_=None) -> RecommendationIndex:
+    index = RecommendationIndex()
+    index.load(get_order_store())
+    return index
+
+
+def get_recommendation_index() -> RecommendationIndex:
+    """The index (the active tenant's, else the process-wide one), built from the order store on first use and refreshed periodically."""
+    global _index
+    tenant = current_tenant()
+    if tenant is not None:
+        index = tenant.resource("recommendations", _build_index)
+        index.maybe_refresh(get_order_store())
+        return index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _build_index()
+    _index.maybe_refresh(get_order_store())
+    return _index
+
+
+def note_order(order_number: Optional[int], items: Iterable[str]) -> None:
+    """Adds a placed order to the index, if it's loaded (otherwise the first load reads it)."""
+    tenant = current_tenant()
+    index = tenant.peek("recommendations") if tenant is not None else _index
+    if index is not None:
+        index.add_order(order_number, items)
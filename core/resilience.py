@@ -0,0 +1,153 @@
+# core/resilience.py
+"""
+Guards for LLM calls, applied by `core.llm_runner` to every call a node makes.
+
+- Latency budget: each node has a deadline for its call (NODE_BUDGETS, override
+  with LLM_BUDGET_<NODE>=seconds, e.g. LLM_BUDGET_HANDLE_ORDER=5). A call that
+  misses it raises `LLMTimeoutError`.
+- Hedging: if a non-streamed call hasn't answered after the node's recent
+  p95 latency (LLM_HEDGE_PERCENTILE), a second identical request is sent and the
+  first answer wins; a request that fails fast is instead retried once. Until
+  enough samples exist the delay is half the budget. LLM_HEDGING=0 turns this
+  off. Streamed calls are never repeated, since their tokens are already out.
+- Circuit breaker: after BREAKER_FAILURES consecutive failed calls the provider
+  is treated as down for BREAKER_COOLDOWN_SECONDS; calls fail fast with
+  `CircuitOpenError`, then a single probe call decides whether to close again.
+
+Nodes catch these errors at their `yield LLMCall(...)` and answer with a
+deterministic fallback, so a degraded provider costs a turn at most its budget.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from core.metrics import metrics
+
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", 10))
+# Streamed nodes get longer: their budget covers the whole reply, not the first token
+NODE_BUDGETS = {
+    "classify_intent": 4.0,
+    "handle_order": 8.0,
+    "take_address": 6.0,
+    "suggest_order": 15.0,
+    "chit_chat": 12.0,
+}
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "1") != "0"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 95))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.25      # below this a duplicate request only adds load
+LATENCY_WINDOW = 200
+BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("LLM_BREAKER_COOLDOWN_SECONDS", 30))
+
+
+class LLMUnavailableError(Exception):
+    """The LLM could not answer within the rules above."""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    pass
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+def budget_for(node: str) -> float:
+    """Seconds a node's LLM call may take."""
+    override = os.environ.get(f"LLM_BUDGET_{node.upper()}")
+    if override:
+        return float(override)
+    return NODE_BUDGETS.get(node, LLM_TIMEOUT_SECONDS)
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies per node, kept sorted for percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.recent: Dict[str, Deque[float]] = {}
+        self.ordered: Dict[str, List[float]] = {}
+
+    def record(self, node: str, seconds: float) -> None:
+        with self.lock:
+            recent = self.recent.setdefault(node, deque())
+            ordered = self.ordered.setdefault(node, [])
+            recent.append(seconds)
+            bisect.insort(ordered, seconds)
+            if len(recent) > self.window:
+                old = recent.popleft()
+                del ordered[bisect.bisect_left(ordered, old)]
+
+    def percentile(self, node: str, pct: float) -> Optional[float]:
+        with self.lock:
+            ordered = self.ordered.get(node)
+            if not ordered or len(ordered) < HEDGE_MIN_SAMPLES:
+                return None
+            return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def hedge_delay(self, node: str, budget: float) -> Optional[float]:
+        """When to send a hedged request, or None if it would land past the budget."""
+        if not LLM_HEDGING:
+            return None
+        delay = self.percentile(node, LLM_HEDGE_PERCENTILE)
+        if delay is None:
+            delay = budget / 2
+        delay = max(delay, HEDGE_MIN_DELAY)
+        return delay if delay < budget else None
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (fail fast) -> half-open (one probe) -> closed."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            print(f"[Warning] LLM circuit breaker {self.state} -> {state}")
+            metrics.inc("orderbot_llm_breaker_transitions_total", to=state)
+            self.state = state
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError unless this call may go to the provider."""
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self._set("half_open")
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return
+            raise CircuitOpenError("LLM provider is unavailable (circuit open)")
+
+    @property
+    def allows_hedging(self) -> bool:
+        return self.state == "closed"
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.consecutive = 0
+            self.probing = False
+            self._set("closed")
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.consecutive += 1
+            self.probing = False
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+                self._set("open")
+
+
+latencies = LatencyTracker()
+breaker = CircuitBreaker()
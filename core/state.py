@@ -1,5 +1,5 @@
 # core/state.py
-from typing import TypedDict, List, Literal
+from typing import TypedDict, List, Literal, Optional, Dict, Any
 
 # Message Types
 class Message(TypedDict):
@@ -10,14 +10,17 @@ class Message(TypedDict):
     content: str
 
 # Order Item Structure
-class OrderItem(TypedDict):
-    """
-    Represents a single item in the user's order.
-    """
+class _OrderItemBase(TypedDict):
     item: str
     quantity: int
     customizations: List[str]
 
+class OrderItem(_OrderItemBase, total=False):
+    """
+    Represents a single line in the user's order (see core.cart).
+    """
+    unit_price: float  # menu price when the line was added
+
 # Conversation State
 class ChatState(TypedDict):
     """
@@ -25,7 +28,8 @@ class ChatState(TypedDict):
     It holds all the necessary information to manage the conversation.
     """
     user_id: str
-    messages: List[Message]
+    messages: List[Message]  # most recent messages only, see core.memory
+    summary: str             # rolling digest of older messages
     order_items: List[OrderItem]
     total_cost: float
     delivery_address: str
@@ -34,3 +38,6 @@ class ChatState(TypedDict):
     menu_sent: bool
     address_valid: bool
     is_confirmed: bool
+    last_order_number: Optional[int]
+    pending_action: Optional[Dict[str, Any]]  # combined-mode payload for the routed node
+    suggested_address: Optional[str]          # saved address offered, awaiting a yes/no
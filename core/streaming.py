@@ -0,0 +1,52 @@
+# core/streaming.py
+"""
+Token streaming through the graph.
+
+Streaming nodes publish `{"type": "token", "node": ..., "text": ...}` events on
+LangGraph's custom stream. Consumers read them with
+`graph.stream(state, stream_mode=["custom", "values"])` (or `astream`): "custom"
+items are tokens, and the last "values" item is the final state, which already
+contains the complete reply.
+"""
+from typing import Any, Callable, Iterator, Optional, Tuple
+from langgraph.config import get_stream_writer
+
+TOKEN_EVENT = "token"
+
+
+def get_token_writer() -> Optional[Callable[[Any], None]]:
+    """The current graph run's stream writer, or None when called outside a graph."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return None
+
+
+def publish_token(writer: Callable[[Any], None], node: str, text: str) -> None:
+    if text:
+        writer({"type": TOKEN_EVENT, "node": node, "text": text})
+
+
+def iter_stream(graph, state, config=None) -> Iterator[Tuple[str, Any]]:
+    """
+    Runs a turn on a sync graph, yielding ("token", text) as tokens arrive
+    and finally ("state", final_state). `config` carries the checkpoint thread.
+    """
+    final_state = state
+    for mode, chunk in graph.stream(state, config, stream_mode=["custom", "values"]):
+        if mode == "custom" and chunk.get("type") == TOKEN_EVENT:
+            yield "token", chunk["text"]
+        elif mode == "values":
+            final_state = chunk
+    yield "state", final_state
+
+
+async def aiter_stream(graph, state, config=None):
+    """Async version of `iter_stream` for graphs built with `use_async=True`."""
+    final_state = state
+    async for mode, chunk in graph.astream(state, config, stream_mode=["custom", "values"]):
+        if mode == "custom" and chunk.get("type") == TOKEN_EVENT:
+            yield "token", chunk["text"]
+        elif mode == "values":
+            final_state = chunk
+    yield "state", final_state
@@ -0,0 +1,262 @@
+# core/tenancy.py
+"""
+Several restaurants (tenants) served by one process.
+
+Each tenant is a directory under TENANTS_DIR named by its id:
+
+    tenants/<tenant_id>/menu.json       its menu (same format as menu/menu.json)
+    tenants/<tenant_id>/orders.db       its orders and order numbers (created on first use)
+    tenants/<tenant_id>/checkpoints.db  its conversations (created on first use)
+    tenants/<tenant_id>/failed_orders.jsonl  orders that could not be saved (see core.order_queue)
+
+A `Tenant` owns its menu catalog and lazily creates everything else: order
+store, order writer, order-number generator, recommendation index,
+checkpointer and compiled graphs (`app.tenant_graph`). These live in
+`Tenant.resource`, keyed by name, so each module decides how to build its own
+per-tenant object. The module-level accessors (`current_menu`,
+`get_order_store`, `get_order_writer`, ...) return the tenant's object while
+a tenant is active and the process-wide one otherwise. Graphs built for a
+tenant activate it around every node, so the node code itself is unchanged.
+
+`TenantRegistry` keeps the most recently used TENANT_CACHE_SIZE tenants
+loaded; it is loaded again (menu, store, graph) on its next request. A tenant
+is pinned while a request or node uses it (`TenantRegistry.acquire`,
+`bind_tenant`), and an evicted tenant is only closed (its order writer
+drained, connections closed) once the last pin is released. A closed tenant
+refuses to build new resources, so nothing is created that would never be
+drained. Requests without a tenant use the
+process-wide menu and stores (MENU_FILE, ORDERS_DB, CHECKPOINT_DB) as before.
+"""
+import asyncio
+import atexit
+import contextlib
+import functools
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from menu.catalog import MenuCatalog, bound_catalog
+from core.metrics import metrics
+
+TENANTS_DIR = os.environ.get("TENANTS_DIR", "tenants")
+TENANT_CACHE_SIZE = int(os.environ.get("TENANT_CACHE_SIZE", 32))
+TENANT_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class UnknownTenantError(LookupError):
+    """No tenant directory (with a menu.json) for the requested id."""
+
+
+class TenantClosedError(RuntimeError):
+    """The tenant was evicted and closed; get it from the registry again."""
+
+
+_current: ContextVar[Optional["Tenant"]] = ContextVar("orderbot_tenant", default=None)
+
+
+class Tenant:
+    """One restaurant: its menu catalog plus per-tenant resources created on first use."""
+
+    def __init__(self, tenant_id: str, directory: str):
+        self.id = tenant_id
+        self.directory = directory
+        self.catalog = MenuCatalog(os.path.join(directory, "menu.json"))
+        self._resources: Dict[str, Any] = {}
+        # Re-entrant: building one resource may need another (the writer needs the store)
+        self._lock = threading.RLock()
+        self._pins = 0
+        self._evicted = False
+        self.closed = False
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator["Tenant"]:
+        """Makes this tenant's menu and resources the current ones inside the block."""
+        tenant_token = _current.set(self)
+        catalog_token = bound_catalog.set(self.catalog)
+        try:
+            yield self
+        finally:
+            bound_catalog.reset(catalog_token)
+            _current.reset(tenant_token)
+
+    def _pin(self) -> None:
+        with self._lock:
+            if self.closed:
+                raise TenantClosedError(f"tenant {self.id} is closed")
+            self._pins += 1
+
+    def _unpin(self) -> None:
+        with self._lock:
+            self._pins -= 1
+            close_now = self._evicted and self._pins == 0
+        if close_now:
+            self.close()
+
+    @contextlib.contextmanager
+    def pinned(self) -> Iterator["Tenant"]:
+        """Keeps the tenant open inside the block, even if it is evicted meanwhile."""
+        self._pin()
+        try:
+            yield self
+        finally:
+            self._unpin()
+
+    def retire(self) -> None:
+        """Called on eviction: closes now, or when the last pin is released."""
+        with self._lock:
+            self._evicted = True
+            close_now = self._pins == 0
+        if close_now:
+            self.close()
+
+    def resource(self, key: str, factory: Callable[["Tenant"], Any]) -> Any:
+        """Returns the tenant's `key` resource, building it (with the tenant active) on first use."""
+        value = self._resources.get(key)
+        if value is None:
+            with self._lock:
+                if self.closed:
+                    raise TenantClosedError(f"tenant {self.id} is closed")
+                value = self._resources.get(key)
+                if value is None:
+                    with self.activate():
+                        value = factory(self)
+                    self._resources[key] = value
+        return value
+
+    def peek(self, key: str) -> Any:
+        """The `key` resource if it has been built, else None."""
+        return self._resources.get(key)
+
+    def close(self) -> None:
+        """Closes resources in reverse creation order (the order writer drains before its store goes)."""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            resources, self._resources = list(self._resources.items()), {}
+        for key, value in reversed(resources):
+            close = getattr(value, "close", None)
+            if callable(close) and not key.startswith("graph."):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"[Warning] Closing {key} of tenant {self.id} failed: {e}")
+
+
+def current_tenant() -> Optional[Tenant]:
+    """The tenant whose request is running, or None for the process-wide default."""
+    return _current.get()
+
+
+def bind_tenant(node: Callable, tenant: Tenant) -> Callable:
+    """Wraps a node (sync or async) so it runs with `tenant` active (and pinned)."""
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state):
+            with tenant.pinned(), tenant.activate():
+                return await node(state)
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state):
+        with tenant.pinned(), tenant.activate():
+            return node(state)
+    return wrapper
+
+
+class TenantRegistry:
+    """Loaded tenants by id, least recently used evicted beyond `capacity`."""
+
+    def __init__(self, root: str = TENANTS_DIR, capacity: int = TENANT_CACHE_SIZE):
+        self.root = root
+        self.capacity = max(capacity, 1)
+        self._lock = threading.Lock()
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def get(self, tenant_id: str) -> Tenant:
+        """The loaded tenant, loading it (and evicting the least recently used) if needed."""
+        tenant, evicted = self._get(str(tenant_id), pin=False)
+        self._retire(evicted)
+        return tenant
+
+    @contextlib.contextmanager
+    def acquire(self, tenant_id: str) -> Iterator[Tenant]:
+        """Like `get`, but the tenant stays open until the block exits (use around a whole turn)."""
+        tenant, evicted = self._get(str(tenant_id), pin=True)
+        self._retire(evicted)
+        try:
+            yield tenant
+        finally:
+            tenant._unpin()
+
+    def _get(self, tenant_id: str, pin: bool) -> Tuple[Tenant, List[Tenant]]:
+        evicted: List[Tenant] = []
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+                metrics.inc("orderbot_tenant_cache_total", result="hit")
+            else:
+                tenant = self._load(tenant_id)
+                self._tenants[tenant_id] = tenant
+                metrics.inc("orderbot_tenant_cache_total", result="miss")
+                while len(self._tenants) > self.capacity:
+                    evicted.append(self._tenants.popitem(last=False)[1])
+            # Pinned under the registry lock, so it can't be evicted and closed in between
+            if pin:
+                tenant._pin()
+        return tenant, evicted
+
+    @staticmethod
+    def _retire(evicted: List[Tenant]) -> None:
+        for old in evicted:
+            print(f"[Debug] Evicting tenant {old.id}")
+            metrics.inc("orderbot_tenant_cache_total", result="evict")
+            old.retire()
+
+    def peek(self, tenant_id: str) -> Optional[Tenant]:
+        """The tenant if it is loaded, else None; never loads one or changes the LRU order."""
+        with self._lock:
+            return self._tenants.get(str(tenant_id))
+
+    def directory(self, tenant_id: str) -> str:
+        """The tenant's directory; raises UnknownTenantError if there is no such tenant."""
+        # The id becomes a path, so only plain names are accepted
+        if not TENANT_ID_RE.match(tenant_id):
+            raise UnknownTenantError(f"invalid tenant id {tenant_id!r}")
+        directory = os.path.join(self.root, tenant_id)
+        if not os.path.isfile(os.path.join(directory, "menu.json")):
+            raise UnknownTenantError(f"unknown tenant {tenant_id!r}")
+        return directory
+
+    def _load(self, tenant_id: str) -> Tenant:
+        return Tenant(tenant_id, self.directory(tenant_id))
+
+    def close(self) -> None:
+        with self._lock:
+            tenants, self._tenants = list(self._tenants.values()), OrderedDict()
+        for tenant in tenants:
+            tenant.close()
+
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenants() -> TenantRegistry:
+    """The process-wide tenant registry; loaded tenants are closed at exit."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TenantRegistry()
+                atexit.register(_registry.close)
+    return _registry
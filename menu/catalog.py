@@ -0,0 +1,163 @@
+# menu/catalog.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+MENU_FILE = os.environ.get(
+    "MENU_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "menu.json")
+)
+
+
+def load_menu_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """Reads and validates a menu JSON file ({item_name: {category, price, customizations}})."""
+    with open(path, encoding="utf-8") as file:
+        return parse_menu(file.read())
+
+
+def parse_menu(raw: str) -> Dict[str, Dict[str, Any]]:
+    """Parses menu JSON text, rejecting entries without a numeric price."""
+    menu = json.loads(raw)
+    if not isinstance(menu, dict) or not menu:
+        raise ValueError("Menu file must contain a non-empty JSON object.")
+    for name, data in menu.items():
+        if not isinstance(data, dict) or not isinstance(data.get("price"), (int, float)):
+            raise ValueError(f"Menu item '{name}' needs a numeric 'price'.")
+    return menu
+
+
+class MenuVersion:
+    """
+    An immutable snapshot of the menu together with its precomputed renderings.
+    Other modules can hang their own derived indexes off a version via `derived()`,
+    so they are rebuilt automatically when the menu changes.
+    """
+
+    def __init__(self, items: Dict[str, Dict[str, Any]], version: str):
+        self.items = items
+        self.version = version
+        self.categories = self._build_categories(items)
+        self.customer_text = self._render_customer_text()
+        self.prompt_text = self._render_prompt_text()
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.Lock()
+
+    @staticmethod
+    def _build_categories(items: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+        categories = defaultdict(list)
+        for item_name, item_data in items.items():
+            categories[item_data.get("category", "other")].append(item_name)
+        return dict(sorted(categories.items()))
+
+    def _render_customer_text(self) -> str:
+        """The formatted menu shown to customers by `send_menu`."""
+        menu_lines = ["Here’s our menu:\n"]
+        for category, item_names in self.categories.items():
+            menu_lines.append(f"🍽 **{category.title()}**")
+            for item_name in item_names:
+                item_data = self.items[item_name]
+                customizations = item_data.get("customizations", [])
+                cust_text = f" (Customizations: {', '.join(customizations)})" if customizations else ""
+                menu_lines.append(
+                    f"- {item_name.replace('_', ' ').title()} — ${item_data['price']:.2f}{cust_text}"
+                )
+            menu_lines.append("")
+        return "\n".join(menu_lines)
+
+    def _render_prompt_text(self) -> str:
+        """A compact one-line-per-item menu for LLM prompts."""
+        return "\n".join(self.prompt_line(item_name) for item_name in self.items)
+
+    def prompt_line(self, item_name: str) -> str:
+        """Compact prompt rendering of a single item."""
+        item_data = self.items[item_name]
+        customizations = item_data.get("customizations", [])
+        options = f" | options: {', '.join(customizations)}" if customizations else ""
+        return f"- {item_name}: ${item_data['price']:.2f} | {item_data.get('category', 'other')}{options}"
+
+    def price(self, item_name: str) -> float:
+        return self.items.get(item_name, {}).get("price", 0)
+
+    def derived(self, key: str, builder: Callable[["MenuVersion"], Any]) -> Any:
+        """Returns a cached value computed from this version, building it on first use."""
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = builder(self)
+                    self._derived[key] = value
+        return value
+
+
+class MenuCatalog:
+    """
+    Loads the menu from a data file and hot-reloads it when the file changes.
+    Reloads swap in a complete new `MenuVersion`, so readers never see a half-built menu.
+    """
+
+    def __init__(self, path: str = MENU_FILE, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._next_check = 0.0
+        self._current: Optional[MenuVersion] = None
+        self.reload()
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self) -> MenuVersion:
+        """Reads the menu file and atomically swaps in the new version."""
+        with self._lock:
+            stamp = self._file_stamp()
+            with open(self.path, "rb") as file:
+                raw = file.read()
+            version = hashlib.sha256(raw).hexdigest()[:12]
+            if self._current is None or self._current.version != version:
+                self._current = MenuVersion(parse_menu(raw.decode("utf-8")), version)
+                print(f"[Debug] Loaded menu version {version} ({len(self._current.items)} items).")
+            self._stamp = stamp
+            self._next_check = time.monotonic() + self.check_interval
+            return self._current
+
+    def current(self) -> MenuVersion:
+        """Returns the live menu version, reloading first if the file changed on disk."""
+        if time.monotonic() >= self._next_check:
+            try:
+                if self._file_stamp() != self._stamp:
+                    self.reload()
+                else:
+                    self._next_check = time.monotonic() + self.check_interval
+            except (OSError, ValueError) as e:
+                # Keep serving the last good menu if the file is missing or mid-edit
+                print(f"[Warning] Menu reload failed: {e}. Keeping version {self._current.version}.")
+                self._next_check = time.monotonic() + self.check_interval
+        return self._current
+
+
+_catalog: Optional[MenuCatalog] = None
+_catalog_lock = threading.Lock()
+# Set while a tenant is active (core.tenancy); otherwise the process-wide catalog is used
+bound_catalog: ContextVar[Optional[MenuCatalog]] = ContextVar("orderbot_catalog", default=None)
+
+
+def get_catalog() -> MenuCatalog:
+    """Returns the process-wide menu catalog, loading it on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = MenuCatalog()
+    return _catalog
+
+
+def current_menu() -> MenuVersion:
+    """Shortcut for the live menu version (the active tenant's, if any)."""
+    return (bound_catalog.get() or get_catalog()).current()
@@ -1,149 +1,7 @@
 # menu/menu_data.py
-MENU = {
-    # Starters
-    "chicken_soup": {
-        "category": "starters",
-        "price": 5.00,
-        "customizations": ["extra spicy", "no salt", "add sweet corn"]
-    },
-    "hot_and_sour_soup": {
-        "category": "starters",
-        "price": 5.50,
-        "customizations": ["extra spicy", "less vinegar", "add chicken"]
-    },
-    "spring_rolls": {
-        "category": "starters",
-        "price": 4.00,
-        "customizations": ["extra sauce", "vegetarian", "add chicken"]
-    },
-    "chicken_wings": {
-        "category": "starters",
-        "price": 6.00,
-        "customizations": ["bbq", "buffalo", "extra crispy"]
-    },
+# The menu data lives in menu/menu.json so prices can change without a redeploy.
+# Running code should read the live version through menu.catalog.current_menu();
+# MENU is a snapshot taken at import time for scripts that only need the raw data.
+from menu.catalog import MENU_FILE, load_menu_file
 
-    # Pakistani Main Dishes
-    "chicken_biryani": {
-        "category": "pakistani",
-        "price": 7.00,
-        "customizations": ["extra spicy", "with raita", "no potato"]
-    },
-    "mutton_karahi": {
-        "category": "pakistani",
-        "price": 14.00,
-        "customizations": ["extra spicy", "less oil", "add extra ginger"]
-    },
-    "chicken_karahi": {
-        "category": "pakistani",
-        "price": 12.00,
-        "customizations": ["extra spicy", "less oil", "add extra green chili"]
-    },
-    "nihari": {
-        "category": "pakistani",
-        "price": 10.00,
-        "customizations": ["extra spicy", "boneless", "add lemon"]
-    },
-    "haleem": {
-        "category": "pakistani",
-        "price": 8.00,
-        "customizations": ["extra fried onions", "extra lemon", "no ginger"]
-    },
-
-    # Chinese Main Dishes
-    "chicken_chowmein": {
-        "category": "chinese",
-        "price": 9.00,
-        "customizations": ["extra spicy", "add prawns", "no capsicum"]
-    },
-    "fried_rice": {
-        "category": "chinese",
-        "price": 8.00,
-        "customizations": ["add chicken", "add prawns", "no peas"]
-    },
-    "manchurian_chicken": {
-        "category": "chinese",
-        "price": 10.00,
-        "customizations": ["extra sauce", "extra spicy", "add vegetables"]
-    },
-    "kung_pao_chicken": {
-        "category": "chinese",
-        "price": 11.00,
-        "customizations": ["extra peanuts", "less spicy", "no onions"]
-    },
-
-    # Rolls & Snacks
-    "chicken_kathi_roll": {
-        "category": "rolls",
-        "price": 5.00,
-        "customizations": ["extra mayo", "extra cheese", "no onions"]
-    },
-    "beef_kebab_roll": {
-        "category": "rolls",
-        "price": 5.50,
-        "customizations": ["extra chutney", "extra cheese", "no onions"]
-    },
-    "shawarma": {
-        "category": "rolls",
-        "price": 4.50,
-        "customizations": ["extra garlic sauce", "extra meat", "no pickles"]
-    },
-    "fries": {
-        "category": "snacks",
-        "price": 3.00,
-        "customizations": ["masala fries", "cheese fries", "no salt"]
-    },
-
-    # Pizzas
-    "tikka_boti_pizza": {
-        "category": "pizza",
-        "price": 12.00,
-        "customizations": ["extra cheese", "stuffed crust", "no olives"]
-    },
-    "fajita_pizza": {
-        "category": "pizza",
-        "price": 12.50,
-        "customizations": ["extra cheese", "add jalapenos", "no onions"]
-    },
-    "margherita_pizza": {
-        "category": "pizza",
-        "price": 11.00,
-        "customizations": ["extra cheese", "add mushrooms", "no tomato slices"]
-    },
-
-    # Burgers
-    "zinger_burger": {
-        "category": "burger",
-        "price": 6.00,
-        "customizations": ["extra mayo", "add cheese", "no lettuce"]
-    },
-    "beef_cheeseburger": {
-        "category": "burger",
-        "price": 7.00,
-        "customizations": ["double patty", "add bacon", "no onions"]
-    },
-
-    # Beverages
-    "soda": {
-        "category": "beverages",
-        "price": 2.00,
-    },
-    "mint_margarita": {
-        "category": "beverages",
-        "price": 3.50,
-    },
-    "fresh_lime_soda": {
-        "category": "beverages",
-        "price": 3.00,
-        "customizations": ["sweet", "salted", "half sweet half salted"]
-    },
-    "tea": {
-        "category": "beverages",
-        "price": 1.50,
-        "customizations": ["with milk", "without milk", "extra sugar", "no sugar"]
-    },
-    "coffee": {
-        "category": "beverages",
-        "price": 2.50,
-        "customizations": ["black", "with milk", "extra sugar", "no sugar"]
-    }
-}
+MENU = load_menu_file(MENU_FILE)
@@ -0,0 +1,360 @@
+# server.py
+"""
+Headless chat server: one compiled graph per restaurant, shared by all its sessions.
+
+Run with `python server.py` (HOST/PORT env vars, default 127.0.0.1:8765).
+
+Endpoints (JSON in, JSON out):
+- POST /chat   {"user_id": "...", "message": "...", "tenant": "..."} -> {"reply": "...", "state": {...}}
+- POST /chat/stream  (same body)                   -> chunked NDJSON: {"token": "..."} lines,
+                                                      then {"reply": "...", "state": {...}}
+- GET  /state?user_id=...&tenant=...               -> {"state": {...}, "messages": [...]}
+                                                      (read-only: no session is created)
+- POST /reset  {"user_id": "...", "tenant": "..."} -> {"ok": true}
+- GET  /health                                     -> {"ok": true, "sessions": N, "tenants": N}
+- GET  /metrics                                    -> Prometheus text (?format=json for JSON)
+
+Conversations are checkpointed per user (see core.checkpoint), so a session can
+be resumed by any server process sharing CHECKPOINT_DB, and sessions idle for
+SESSION_IDLE_SECONDS are dropped from memory.
+
+"tenant" is optional: requests with one are served by that restaurant's graph,
+menu and stores (see core.tenancy; 404 if it doesn't exist), requests without
+one by the default graph. Sessions are keyed by (tenant, user_id).
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from app import aload_state, build_graph, create_initial_state, run_turn, stream_turn, use_tenant_graph
+from core.checkpoint import CHECKPOINT_DB, SqliteDeltaSaver, thread_config
+from core.metrics import metrics
+from core.recommendations import get_recommendation_index
+from core.state import ChatState
+from core.tenancy import UnknownTenantError, get_tenants
+
+HOST = os.environ.get("HOST", "127.0.0.1")
+PORT = int(os.environ.get("PORT", 8765))
+MAX_BODY_BYTES = 64 * 1024
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", 900))
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class Session:
+    """Per-user conversation state. The lock keeps one user's turns in order."""
+
+    def __init__(self, state: ChatState):
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+
+SessionKey = Tuple[Optional[str], str]   # (tenant, user_id)
+
+
+class SessionRegistry:
+    """Sessions keyed by (tenant, user_id); each tenant's are served by its own compiled graph."""
+
+    def __init__(self, graph=None):
+        self.graph = graph if graph is not None else build_graph(use_async=True)
+        self.sessions: Dict[SessionKey, Session] = {}
+
+    @contextlib.contextmanager
+    def graph_for(self, tenant: Optional[str]):
+        """The default graph, or the tenant's (cached in core.tenancy's LRU, pinned inside the block)."""
+        if not tenant:
+            yield self.graph
+            return
+        with use_tenant_graph(tenant) as graph:
+            yield graph
+
+    async def get(self, user_id: str, tenant: Optional[str] = None) -> Session:
+        """The user's session, resumed from the last checkpoint if it isn't in memory."""
+        key = (tenant or None, user_id)
+        session = self.sessions.get(key)
+        if session is None:
+            with self.graph_for(tenant) as graph:
+                state = await aload_state(graph, user_id)
+            # Another request may have loaded it while we were waiting
+            session = self.sessions.setdefault(key, Session(state))
+        session.last_seen = time.monotonic()
+        return session
+
+    async def peek(self, user_id: str, tenant: Optional[str] = None) -> ChatState:
+        """The user's state without creating a session (or loading a tenant): from memory, else the checkpoint."""
+        session = self.sessions.get((tenant or None, user_id))
+        if session is not None:
+            return session.state
+        if tenant and get_tenants().peek(tenant) is None:
+            directory = get_tenants().directory(tenant)
+            return await asyncio.to_thread(stored_state, os.path.join(directory, "checkpoints.db"), user_id)
+        with self.graph_for(tenant) as graph:
+            return await aload_state(graph, user_id)
+
+    async def reset(self, user_id: str, tenant: Optional[str] = None) -> None:
+        """Starts the user over; waits for an in-flight turn so its checkpoint can't undo the reset."""
+        session = self.sessions.get((tenant or None, user_id))
+        async with session.lock if session is not None else contextlib.nullcontext():
+            with self.graph_for(tenant) as graph:
+                if graph.checkpointer is not None:
+                    await graph.checkpointer.adelete_thread(user_id)
+            if session is not None:
+                # Turns already queued on the lock continue from the fresh state
+                session.state = create_initial_state(user_id)
+
+    def evict_idle(self, max_idle: float = SESSION_IDLE_SECONDS) -> int:
+        """
+        Drops sessions idle for longer than `max_idle` seconds. Their state is
+        in the checkpoint, so nothing is lost; without a checkpointer nothing is evicted.
+        """
+        if self.graph.checkpointer is None:
+            return 0
+        cutoff = time.monotonic() - max_idle
+        idle = [key for key, session in self.sessions.items()
+                if session.last_seen < cutoff and not session.lock.locked()]
+        for key in idle:
+            del self.sessions[key]
+        return len(idle)
+
+    async def chat(self, user_id: str, text: str, tenant: Optional[str] = None) -> Tuple[str, ChatState]:
+        """Runs one turn. Turns for the same user run one at a time, in arrival order."""
+        session = await self.get(user_id, tenant)
+        async with session.lock:
+            with self.graph_for(tenant) as graph:
+                session.state = await run_turn(session.state, text, graph=graph)
+            last = session.state["messages"][-1] if session.state["messages"] else None
+            reply = last["content"] if last and last["role"] == "assistant" else ""
+            return reply, session.state
+
+    async def chat_stream(self, user_id: str, text: str, tenant: Optional[str] = None):
+        """Streaming version of `chat`: yields ("token", text) then ("done", (reply, state))."""
+        session = await self.get(user_id, tenant)
+        async with session.lock:
+            with self.graph_for(tenant) as graph:
+                async for kind, value in stream_turn(session.state, text, graph=graph):
+                    if kind == "token":
+                        yield "token", value
+                    else:
+                        session.state = value
+            last = session.state["messages"][-1] if session.state["messages"] else None
+            reply = last["content"] if last and last["role"] == "assistant" else ""
+            yield "done", (reply, session.state)
+
+
+def stored_state(path: str, user_id: str) -> ChatState:
+    """The user's last checkpointed state in the checkpoint file at `path`, or a fresh one."""
+    if not CHECKPOINT_DB or not os.path.isfile(path):
+        return create_initial_state(user_id)
+    checkpointer = SqliteDeltaSaver(path)
+    try:
+        saved = checkpointer.get_tuple(thread_config(user_id))
+    finally:
+        checkpointer.close()
+    if saved is None:
+        return create_initial_state(user_id)
+    return {**create_initial_state(user_id), **saved.checkpoint["channel_values"]}
+
+
+def public_state(state: ChatState) -> Dict[str, Any]:
+    """The parts of ChatState a client needs (no message history)."""
+    return {key: value for key, value in state.items() if key != "messages"}
+
+
+class ChatServer:
+    """A tiny HTTP/1.1 JSON server on asyncio streams (no extra dependencies)."""
+
+    def __init__(self, registry: Optional[SessionRegistry] = None):
+        self.registry = registry or SessionRegistry()
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        payload = json.loads(body) if body else {}
+        if not isinstance(payload, dict):
+            return 400, {"error": "JSON body must be an object"}
+        tenant = str(query.get("tenant") or payload.get("tenant") or "").strip() or None
+
+        if url.path == "/health":
+            return 200, {"ok": True, "sessions": len(self.registry.sessions), "tenants": len(get_tenants())}
+
+        if url.path == "/metrics":
+            return 200, metrics.snapshot()
+
+        if url.path == "/chat":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            user_id = str(payload.get("user_id", "")).strip()
+            message = str(payload.get("message", "")).strip()
+            if not user_id or not message:
+                return 400, {"error": "user_id and message are required"}
+            reply, state = await self.registry.chat(user_id, message, tenant)
+            return 200, {"reply": reply, "state": public_state(state)}
+
+        if url.path == "/state":
+            user_id = query.get("user_id") or payload.get("user_id")
+            if not user_id:
+                return 400, {"error": "user_id is required"}
+            state = await self.registry.peek(user_id, tenant)
+            # The recent transcript too, so a client can show it when the user logs back in
+            return 200, {"state": public_state(state), "messages": state["messages"]}
+
+        if url.path == "/reset":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            user_id = str(payload.get("user_id", "")).strip()
+            if not user_id:
+                return 400, {"error": "user_id is required"}
+            await self.registry.reset(user_id, tenant)
+            return 200, {"ok": True}
+
+        return 404, {"error": f"unknown path {url.path}"}
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                url = urlsplit(path)
+                if url.path == "/metrics" and "format=json" not in url.query:
+                    await self.respond_text(writer, metrics.render_prometheus(), keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+                if url.path == "/chat/stream" and method.upper() == "POST":
+                    await self.stream_chat(writer, body, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+
+                try:
+                    status, response = await self.handle(method.upper(), path, body)
+                except json.JSONDecodeError:
+                    status, response = 400, {"error": "invalid JSON body"}
+                except UnknownTenantError as e:
+                    status, response = 404, {"error": str(e)}
+                except Exception as e:
+                    print(f"[Warning] Request {method} {path} failed: {e}")
+                    status, response = 500, {"error": "internal error"}
+
+                await self.respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream_chat(self, writer: asyncio.StreamWriter, body: bytes, keep_alive: bool) -> None:
+        """Streams one turn as chunked NDJSON so clients can render tokens as they arrive."""
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            payload = None
+        user_id = str(payload.get("user_id", "")).strip() if isinstance(payload, dict) else ""
+        message = str(payload.get("message", "")).strip() if isinstance(payload, dict) else ""
+        tenant = str(payload.get("tenant") or "").strip() or None if isinstance(payload, dict) else None
+        if not user_id or not message:
+            await self.respond(writer, 400, {"error": "user_id and message are required"}, keep_alive)
+            return
+        if tenant:
+            try:
+                with self.registry.graph_for(tenant):
+                    pass
+            except UnknownTenantError as e:
+                await self.respond(writer, 404, {"error": str(e)}, keep_alive)
+                return
+
+        writer.write((
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/x-ndjson; charset=utf-8\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1"))
+
+        async def send(event: Dict[str, Any]) -> None:
+            line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            writer.write(f"{len(line):X}\r\n".encode("latin-1") + line + b"\r\n")
+            await writer.drain()
+
+        try:
+            async for kind, value in self.registry.chat_stream(user_id, message, tenant):
+                if kind == "token":
+                    await send({"token": value})
+                else:
+                    reply, state = value
+                    await send({"reply": reply, "state": public_state(state)})
+        except Exception as e:
+            print(f"[Warning] Streaming turn for {user_id} failed: {e}")
+            await send({"error": "internal error"})
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def evict_idle_sessions(self) -> None:
+        """Periodically drops idle sessions from memory (they resume from their checkpoint)."""
+        while True:
+            await asyncio.sleep(max(SESSION_IDLE_SECONDS / 4, 1))
+            evicted = self.registry.evict_idle()
+            if evicted:
+                print(f"[Debug] Evicted {evicted} idle sessions")
+
+    async def respond_text(self, writer: asyncio.StreamWriter, text: str, keep_alive: bool) -> None:
+        """Plain-text 200 response in the Prometheus exposition format."""
+        data = text.encode("utf-8")
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def serve_forever(self, host: str = HOST, port: int = PORT) -> None:
+        server = await asyncio.start_server(self.serve_connection, host, port)
+        print(f"[Info] Chat server listening on http://{host}:{port}")
+        evictor = asyncio.create_task(self.evict_idle_sessions())
+        # Built from the whole order history, so do it now rather than on the first suggestion
+        asyncio.get_running_loop().run_in_executor(None, get_recommendation_index)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(ChatServer().serve_forever())
@@ -1,9 +1,39 @@
 import streamlit as st
 import pandas as pd
 import os
-from app import build_graph, create_initial_state  # your LangGraph code
+from app import build_graph, load_state, start_turn  # your LangGraph code
+from chat_client import ChatClient
+from core.analytics import OrderAnalytics
+from core.order_store import ORDER_COLUMNS, get_order_store
+from core.streaming import iter_stream
 
-ORDERS_FILE = "orders.csv"
+PAGE_SIZE = 50
+DISPLAY_HISTORY = 50  # messages kept in the on-screen transcript
+# When set, the UI is a client of server.py instead of running the graph in-process
+CHAT_SERVER_URL = os.environ.get("CHAT_SERVER_URL")
+
+
+@st.cache_resource
+def get_graph():
+    """Compiled once per process and shared by every Streamlit session."""
+    return build_graph()
+
+
+@st.cache_resource
+def get_store():
+    """Shared across reruns and sessions so the store's in-memory indexes stay warm."""
+    return get_order_store()
+
+
+@st.cache_resource
+def get_analytics():
+    """One columnar copy of the order lines, refreshed incrementally on each view."""
+    return OrderAnalytics(get_store())
+
+
+@st.cache_resource
+def get_client():
+    return ChatClient(CHAT_SERVER_URL)
 
 # ---- Streamlit Setup ----
 st.set_page_config(page_title="🍽 Restaurant Chatbot", layout="wide")
@@ -19,9 +49,13 @@ if not st.session_state.user_id:
     user_id = st.text_input("Enter your User ID:", key="login_input")
     if st.button("🚀 Start Chat", key="login_btn") and user_id.strip():
         st.session_state.user_id = user_id.strip()
-        st.session_state.graph = build_graph()
-        st.session_state.state = create_initial_state(st.session_state.user_id)
-        st.session_state.messages = []
+        # Resume the user's last checkpointed conversation, if any
+        if CHAT_SERVER_URL:
+            _, messages = get_client().state(st.session_state.user_id)
+        else:
+            st.session_state.state = load_state(get_graph(), st.session_state.user_id)
+            messages = st.session_state.state["messages"]
+        st.session_state.messages = list(messages)[-DISPLAY_HISTORY:]
         st.rerun()
     st.stop()  # Prevent rest of app until login
 
@@ -37,43 +71,99 @@ if page == "💬 Chat":
             st.markdown(msg["content"])
 
     if user_input := st.chat_input("Type your message..."):
-        st.session_state.state["messages"].append({"role": "user", "content": user_input})
         st.session_state.messages.append({"role": "user", "content": user_input})
+        with st.chat_message("user"):
+            st.markdown(user_input)
 
-        st.session_state.state = st.session_state.graph.invoke(st.session_state.state)
+        # Render tokens into the assistant bubble as they stream in
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            streamed = ""
 
-        if st.session_state.state["messages"]:
-            last_bot_message = st.session_state.state["messages"][-1]
-            if last_bot_message["role"] == "assistant":
-                st.session_state.messages.append(last_bot_message)
+            if CHAT_SERVER_URL:
+                events = get_client().chat_stream(st.session_state.user_id, user_input)
+            else:
+                graph_input, config = start_turn(get_graph(), st.session_state.state, user_input)
+                events = iter_stream(get_graph(), graph_input, config)
 
-        st.rerun()
+            reply = ""
+            for kind, value in events:
+                if kind == "token":
+                    streamed += value
+                    placeholder.markdown(streamed + "▌")
+                elif CHAT_SERVER_URL:
+                    reply, _ = value
+                else:
+                    st.session_state.state = value
+                    last_bot_message = value["messages"][-1] if value["messages"] else None
+                    if last_bot_message and last_bot_message["role"] == "assistant":
+                        reply = last_bot_message["content"]
+            placeholder.markdown(reply or streamed)
+
+        if reply:
+            st.session_state.messages.append({"role": "assistant", "content": reply})
+        del st.session_state.messages[:-DISPLAY_HISTORY]
 
 # ---- Orders Page ----
 elif page == "📜 Orders":
     st.markdown("### 📜 Orders Dashboard")
-    tabs = st.tabs(["👤 My Orders", "🌍 All Orders"])
+    store = get_store()
+    tabs = st.tabs(["👤 My Orders", "🌍 All Orders", "📈 Analytics"])
+
+    def show_orders_page(user_id, key):
+        """Shows one page of orders (newest first) straight from the store's indexes."""
+        total = store.count_orders(user_id)
+        if not total:
+            st.info("You have no orders yet." if user_id else "No orders found yet.")
+            return
+        pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        page_no = st.number_input(f"Page (1–{pages})", min_value=1, max_value=pages, value=1, key=key)
+        rows = store.list_orders(user_id, limit=PAGE_SIZE, offset=(page_no - 1) * PAGE_SIZE)
+        st.dataframe(pd.DataFrame(rows, columns=ORDER_COLUMNS), use_container_width=True, hide_index=True)
+        st.caption(f"{total} orders")
 
     with tabs[0]:
-        if os.path.exists(ORDERS_FILE):
-            df = pd.read_csv(ORDERS_FILE).sort_values(by="timestamp", ascending=False)
-            user_orders = df[df["user_id"].astype(str) == str(st.session_state.user_id)]
-            if not user_orders.empty:
-                st.dataframe(user_orders, use_container_width=True, hide_index=True)
-            else:
-                st.info("You have no orders yet.")
-        else:
-            st.info("No orders found yet.")
+        show_orders_page(str(st.session_state.user_id), "my_orders_page")
 
     with tabs[1]:
-        if os.path.exists(ORDERS_FILE):
-            df = pd.read_csv(ORDERS_FILE).sort_values(by="timestamp", ascending=False)
-            st.dataframe(df, use_container_width=True, hide_index=True)
+        show_orders_page(None, "all_orders_page")
+        # Exporting reads every order, so only do it on request
+        if store.count_orders() and st.button("📦 Prepare CSV export"):
+            all_rows = store.list_orders(limit=store.count_orders())
             st.download_button(
                 label="📥 Download All Orders (CSV)",
-                data=df.to_csv(index=False),
+                data=pd.DataFrame(all_rows, columns=ORDER_COLUMNS).to_csv(index=False),
                 file_name="all_orders.csv",
                 mime="text/csv",
             )
-        else:
+
+    with tabs[2]:
+        analytics = get_analytics()
+        summary = analytics.summary()
+        if not summary["orders"]:
             st.info("No orders found yet.")
+        else:
+            cols = st.columns(4)
+            cols[0].metric("Revenue", f"${summary['revenue']:,.2f}")
+            cols[1].metric("Orders", f"{summary['orders']:,}")
+            cols[2].metric("Avg. order", f"${summary['average_order_value']:,.2f}")
+            cols[3].metric("Customers", f"{summary['customers']:,}")
+
+            left, right = st.columns(2)
+            with left:
+                st.markdown("#### Revenue by category")
+                st.bar_chart(analytics.revenue_by_category(), x="category", y="revenue")
+            with right:
+                st.markdown("#### Revenue by hour of day")
+                st.bar_chart(analytics.revenue_by_hour(), x="hour", y="revenue")
+
+            st.markdown("#### Revenue by item")
+            st.dataframe(analytics.revenue_by_item(), use_container_width=True, hide_index=True)
+
+            left, right = st.columns(2)
+            with left:
+                st.markdown("#### Top customizations")
+                st.dataframe(analytics.top_customizations(), use_container_width=True, hide_index=True)
+            with right:
+                st.markdown("#### Top customers (lifetime value)")
+                st.dataframe(analytics.customer_lifetime_value(), use_container_width=True, hide_index=True)
@@ -0,0 +1,10 @@
+# tests/conftest.py
+"""Keeps test orders, checkpoints and dead letters out of the real files."""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="orderbot-tests-")
+os.environ["ORDERS_DB"] = os.path.join(_workdir, "orders.db")
+os.environ["ORDER_STORE"] = "sqlite"
+os.environ["CHECKPOINT_DB"] = ""
+os.environ["ORDER_DEAD_LETTER_FILE"] = os.path.join(_workdir, "failed_orders.jsonl")
@@ -0,0 +1,43 @@
+# tests/test_address.py
+import pytest
+from core.address import INVALID, UNSURE, VALID, match_saved, prevalidate
+
+
+@pytest.mark.parametrize("message, address", [
+    ("House 12, Street 4, Gulberg", "House 12, Street 4, Gulberg"),
+    ("DHA Phase 5, House 12, Street 4", "DHA Phase 5, House 12, Street 4"),
+    ("Street 4, House 12, Block C, Johar Town", "Street 4, House 12, Block C, Johar Town"),
+    ("Near Liberty Market, House 7, Street 9", "Near Liberty Market, House 7, Street 9"),
+    ("Block C, Johar Town, flat 3-B", "Block C, Johar Town, flat 3-B"),
+])
+def test_keeps_every_part_of_the_address(message, address):
+    assert prevalidate(message) == (VALID, address)
+
+
+@pytest.mark.parametrize("message", [
+    "My address is DHA Phase 5, House 12, Street 4",
+    "my address is: DHA Phase 5, House 12, Street 4",
+    "Deliver to DHA Phase 5, House 12, Street 4.",
+])
+def test_strips_only_the_lead_in(message):
+    assert prevalidate(message) == (VALID, "DHA Phase 5, House 12, Street 4")
+
+
+@pytest.mark.parametrize("message", ["my home", "ghar pe", "same as before", "address"])
+def test_vague_replies_are_invalid(message):
+    assert prevalidate(message) == (INVALID, None)
+
+
+def test_no_house_number_or_area_is_left_to_the_llm():
+    assert prevalidate("the blue gate after the big tree on the left")[0] == UNSURE
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("House 1, Street 2, Gulberg", "House 1, Street 2, Gulberg"),
+    ("deliver to house 1 street 2 gulberg please", "House 1, Street 2, Gulberg"),
+    ("House 1, Street 22, Gulberg", None),
+    ("House 11, Street 2, Gulberg", None),
+    ("Flat House 1, Street 2, Gulbergs", None),
+])
+def test_saved_address_matches_whole_words_only(message, expected):
+    assert match_saved(message, ["House 1, Street 2, Gulberg"]) == expected
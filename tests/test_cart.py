@@ -0,0 +1,89 @@
+# tests/test_cart.py
+import copy
+import pytest
+from menu.catalog import current_menu
+from core.cart import MAX_CUSTOMIZATIONS, Cart, normalize_customizations
+
+
+def price(item):
+    return current_menu().price(item)
+
+
+def lines(cart):
+    rows = [(line["item"], line["quantity"], tuple(line["customizations"])) for line in cart.lines.values()]
+    return sorted(rows, key=lambda row: (row[0], row[2]))
+
+
+def test_same_item_and_customizations_merge_case_insensitively():
+    cart = Cart()
+    cart.add("chicken_biryani", 2, ["extra spicy", "with raita"])
+    cart.add("chicken_biryani", 1, ["With Raita", "Extra Spicy"])
+    assert lines(cart) == [("chicken_biryani", 3, ("extra spicy", "with raita"))]
+
+
+def test_plain_add_does_not_top_up_a_customized_line():
+    cart = Cart()
+    cart.add("chicken_biryani", 2, ["with raita"])
+    cart.add("chicken_biryani", 1)
+    cart.add("chicken_biryani", 1)
+    assert lines(cart) == [("chicken_biryani", 2, ()), ("chicken_biryani", 2, ("with raita",))]
+
+
+def test_total_follows_every_change():
+    cart = Cart()
+    cart.add("chicken_biryani", 10)
+    cart.add("chicken_biryani", 5, ["extra spicy"])
+    cart.add("fries", 2)
+    cart.update("fries", 3)
+    cart.remove("chicken_biryani", 12)
+    assert lines(cart) == [("chicken_biryani", 3, ("extra spicy",)), ("fries", 3, ())]
+    assert cart.total == pytest.approx(3 * price("chicken_biryani") + 3 * price("fries"))
+
+
+def test_remove_takes_the_exact_line_first_then_the_newest():
+    cart = Cart()
+    cart.add("chicken_biryani", 2)
+    cart.add("chicken_biryani", 2, ["extra spicy"])
+    cart.add("chicken_biryani", 2, ["no potato"])
+    cart.remove("chicken_biryani", 3, ["extra spicy"])
+    assert lines(cart) == [("chicken_biryani", 2, ()), ("chicken_biryani", 1, ("no potato",))]
+
+
+def test_update_with_new_customizations_rekeys_the_newest_line():
+    cart = Cart()
+    cart.add("chicken_biryani", 2)
+    cart.update("chicken_biryani", 3, ["extra spicy"])
+    assert lines(cart) == [("chicken_biryani", 3, ("extra spicy",))]
+    assert cart.total == pytest.approx(3 * price("chicken_biryani"))
+
+
+def test_lines_keep_the_price_they_were_added_at():
+    state = {"order_items": [{"item": "fries", "quantity": 2, "customizations": [], "unit_price": 1.25}],
+             "total_cost": 2.5}
+    cart = Cart.from_state(state)
+    cart.add("fries", 1)
+    assert cart.total == pytest.approx(3.75)
+
+
+def test_carts_without_snapshotted_prices_are_priced_from_the_menu():
+    cart = Cart([{"item": "fries", "quantity": 2, "customizations": []}], total_cost=999.0)
+    assert cart.total == pytest.approx(2 * price("fries"))
+
+
+def test_building_a_cart_leaves_the_state_untouched():
+    state = {"order_items": [{"item": "fries", "quantity": 1, "customizations": ["Extra Salt", "extra salt"]}],
+             "total_cost": 0.0}
+    before = copy.deepcopy(state)
+    cart = Cart.from_state(state)
+    cart.add("fries", 1, ["extra salt"])
+    assert state == before
+    cart.to_state(state)
+    assert state["order_items"] == [
+        {"item": "fries", "quantity": 2, "customizations": ["Extra Salt"], "unit_price": price("fries")}
+    ]
+    assert state["total_cost"] == pytest.approx(2 * price("fries"))
+
+
+def test_customizations_are_deduplicated_and_capped():
+    assert normalize_customizations(["  extra  spicy ", "Extra Spicy", "", "no onion"]) == ["extra spicy", "no onion"]
+    assert len(normalize_customizations([f"option {i}" for i in range(50)])) == MAX_CUSTOMIZATIONS
@@ -0,0 +1,87 @@
+# tests/test_checkpoint.py
+from typing import TypedDict
+from langgraph.graph import END, START, StateGraph
+from core.checkpoint import SqliteDeltaSaver, delta_node, thread_config
+
+
+class CounterState(TypedDict):
+    turns: int
+    note: str
+    fixed: str
+
+
+@delta_node
+def step(state):
+    state["turns"] += 1
+    state["note"] = f"turn {state['turns']}"
+    return state
+
+
+def build(saver):
+    builder = StateGraph(CounterState)
+    builder.add_node("step", step)
+    builder.add_edge(START, "step")
+    builder.add_edge("step", END)
+    return builder.compile(checkpointer=saver)
+
+
+def run_turns(graph, user_id, turns):
+    config = thread_config(user_id)
+    graph.invoke({"turns": 0, "note": "", "fixed": "set once"}, config)
+    for _ in range(turns - 1):
+        graph.invoke({"turns": graph.get_state(config).values["turns"]}, config)
+    return config
+
+
+def count(saver, table, user_id):
+    return saver.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (user_id,)).fetchone()[0]
+
+
+def test_state_survives_a_new_saver(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    saver = SqliteDeltaSaver(path, keep=0)
+    run_turns(build(saver), "u1", 3)
+    saver.close()
+
+    reopened = SqliteDeltaSaver(path, keep=0)
+    assert build(reopened).get_state(thread_config("u1")).values == {"turns": 3, "note": "turn 3", "fixed": "set once"}
+    reopened.close()
+
+
+def test_unchanged_channels_are_written_once(tmp_path):
+    saver = SqliteDeltaSaver(str(tmp_path / "checkpoints.db"), keep=0)
+    run_turns(build(saver), "u1", 5)
+    fixed = saver.conn.execute("SELECT COUNT(*) FROM checkpoint_blobs WHERE channel = 'fixed'").fetchone()[0]
+    turns = saver.conn.execute("SELECT COUNT(*) FROM checkpoint_blobs WHERE channel = 'turns'").fetchone()[0]
+    assert fixed == 1
+    assert turns > 5
+
+
+def test_only_the_latest_checkpoints_are_kept(tmp_path):
+    saver = SqliteDeltaSaver(str(tmp_path / "checkpoints.db"), keep=3)
+    graph = build(saver)
+    config = run_turns(graph, "u1", 20)
+    run_turns(graph, "u2", 2)
+
+    assert count(saver, "checkpoints", "u1") == 3
+    history = list(saver.list(config))
+    assert len(history) == 3
+    # Blobs still referenced by a kept checkpoint (here the one written on the first turn) stay
+    assert all(item.checkpoint["channel_values"]["fixed"] == "set once" for item in history)
+    assert graph.get_state(config).values["turns"] == 20
+    # Every blob left is one a kept checkpoint points at
+    referenced = {(channel, str(version)) for item in history
+                  for channel, version in item.checkpoint["channel_versions"].items()}
+    stored = set(saver.conn.execute("SELECT channel, version FROM checkpoint_blobs WHERE thread_id = 'u1'"))
+    assert stored <= referenced
+    # Other threads are pruned on their own puts only
+    assert count(saver, "checkpoints", "u2") == len(list(saver.list(thread_config("u2"))))
+
+
+def test_delete_thread(tmp_path):
+    saver = SqliteDeltaSaver(str(tmp_path / "checkpoints.db"))
+    graph = build(saver)
+    config = run_turns(graph, "u1", 2)
+    saver.delete_thread("u1")
+    assert saver.get_tuple(config) is None
+    assert all(count(saver, table, "u1") == 0 for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"))
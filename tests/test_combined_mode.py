@@ -0,0 +1,21 @@
+# tests/test_combined_mode.py
+from langchain_core.runnables import RunnableLambda
+from app import build_graph, create_initial_state
+from core.nodes import ORDER_FALLBACK
+
+
+def _failing_llm(_):
+    raise TimeoutError("model unavailable")
+
+
+def test_failing_llm_routes_to_handle_order_without_payload():
+    graph = build_graph(llm=RunnableLambda(_failing_llm), combined=True, checkpointer=False)
+    state = create_initial_state("combined-test")
+    state["messages"].append({"role": "user", "content": "hmm what would you pick for me tonight"})
+
+    result = graph.invoke(state)
+
+    assert result["intent"] == "handle_order"
+    assert result["pending_action"] is None
+    assert result["order_items"] == []
+    assert result["messages"][-1] == {"role": "assistant", "content": ORDER_FALLBACK}
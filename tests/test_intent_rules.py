@@ -0,0 +1,79 @@
+# tests/test_intent_rules.py
+import pytest
+from app import create_initial_state
+from core.intent_rules import fast_classify
+
+CART = [{"item": "zinger_burger", "quantity": 2, "customizations": [], "unit_price": 5.0}]
+
+
+def make_state(text, bot=None, **flags):
+    state = create_initial_state("intent-test")
+    if bot:
+        state["messages"].append({"role": "assistant", "content": bot})
+    state["messages"].append({"role": "user", "content": text})
+    state.update(flags)
+    return state
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("hi", "greetings"),
+    ("Assalam o alaikum", "greetings"),
+    ("show me the menu", "send_menu"),
+    ("menu dikhao menu", "send_menu"),
+    ("where is my order", "track_order"),
+    ("what should i get", "suggest_order"),
+    ("what's in my cart", "display_orders"),
+])
+def test_lexicon(text, intent):
+    assert fast_classify(make_state(text)) == intent
+
+
+def test_ordering_before_the_menu_sends_the_menu_first():
+    assert fast_classify(make_state("add 2 zinger burger")) == "send_menu"
+    assert fast_classify(make_state("add 2 zinger burger", menu_sent=True)) == "handle_order"
+
+
+@pytest.mark.parametrize("text", ["hey menu please", "track my order and show the menu", "i want something nice", ""])
+def test_ambiguous_or_unknown_messages_go_to_the_llm(text):
+    assert fast_classify(make_state(text, menu_sent=True)) is None
+
+
+def test_checkout_follows_the_state_flags():
+    assert fast_classify(make_state("that's all", order_items=CART)) == "take_address"
+    assert fast_classify(make_state("that's all", order_items=CART, delivery_address="House 1, Street 2")) == "confirm_order"
+    assert fast_classify(make_state(
+        "place my order", order_items=CART, delivery_address="House 1, Street 2",
+        is_confirmed=True, status="awaiting_confirmation",
+    )) == "place_order"
+
+
+def test_checkout_words_need_a_cart():
+    assert fast_classify(make_state("that's all")) is None
+
+
+@pytest.mark.parametrize("text", ["yes", "ok", "haan ji", "yes please confirm"])
+def test_affirmation_moves_checkout_forward_while_awaiting_confirmation(text):
+    flags = {"order_items": CART, "delivery_address": "House 1, Street 2", "status": "awaiting_confirmation"}
+    assert fast_classify(make_state(text, **flags)) == "confirm_order"
+    assert fast_classify(make_state(text, is_confirmed=True, **flags)) == "place_order"
+
+
+@pytest.mark.parametrize("text", ["ok", "okay", "done", "yes please"])
+def test_affirmation_after_the_order_is_placed_does_not_place_it_again(text):
+    state = make_state(
+        text, bot="Your order #10001 has been placed!",
+        delivery_address="House 1, Street 2", is_confirmed=True, status="order_placed",
+    )
+    assert fast_classify(state) not in ("place_order", "confirm_order")
+
+
+def test_answer_to_a_saved_address_offer():
+    address = "House 1, Street 2, Gulberg"
+    bot = f"Should we deliver to your saved address {address}?"
+    for text in ("yes", "no, a new address"):
+        assert fast_classify(make_state(text, bot=bot, order_items=CART, suggested_address=address)) == "take_address"
+
+
+def test_reply_to_an_address_prompt():
+    state = make_state("House 1, Street 2, Gulberg", bot="Please share your delivery address.", order_items=CART)
+    assert fast_classify(state) == "take_address"
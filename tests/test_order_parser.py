@@ -0,0 +1,56 @@
+# tests/test_order_parser.py
+import pytest
+from core.order_parser import MAX_LOCAL_QUANTITY, parse_order
+
+CART = [
+    {"item": "chicken_biryani", "quantity": 3, "customizations": []},
+    {"item": "chicken_biryani", "quantity": 1, "customizations": ["extra spicy"]},
+]
+
+
+def changes(message, cart=()):
+    parsed = parse_order(message, list(cart))
+    assert parsed is not None, message
+    return [(c["action"], c["item"], c["quantity"], c["customizations"]) for c in parsed["items"]]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("2 chicken biryani extra spicy", [("add", "chicken_biryani", 2, ["extra spicy"])]),
+    ("biryani x2", [("add", "chicken_biryani", 2, [])]),
+    ("do zinger burger dedo", [("add", "zinger_burger", 2, [])]),
+    ("ek biriyani aur 2 fries", [("add", "chicken_biryani", 1, []), ("add", "fries", 2, [])]),
+])
+def test_adds(message, expected):
+    assert changes(message) == expected
+
+
+def test_remove_without_a_count_removes_every_line_of_the_item():
+    assert changes("remove biryani", CART) == [("remove", "chicken_biryani", 4, [])]
+
+
+def test_update_sets_the_quantity():
+    assert changes("change biryani to 3", CART) == [("update", "chicken_biryani", 3, [])]
+
+
+def test_bot_message_summarizes_the_changes():
+    assert parse_order("2 chicken biryani extra spicy", [])["bot_message"] == (
+        "Added 2x Chicken Biryani (extra spicy). Anything else?"
+    )
+
+
+@pytest.mark.parametrize("message, cart", [
+    ("what is good here", []),
+    ("2 biryani with pineapple", []),   # customization the item doesn't have
+    ("2", []),                          # quantity without an item
+    ("remove the fries", CART),         # not in the cart
+    ("update fries", CART),
+    ("change biryani", CART),           # update without a quantity
+])
+def test_leaves_unclear_messages_to_the_llm(message, cart):
+    assert parse_order(message, cart) is None
+
+
+def test_quantities_above_the_local_cap_go_to_the_llm():
+    assert changes(f"{MAX_LOCAL_QUANTITY} fries") == [("add", "fries", MAX_LOCAL_QUANTITY, [])]
+    assert parse_order(f"{MAX_LOCAL_QUANTITY + 1} fries", []) is None
+    assert parse_order("get me 100000000 biryani", []) is None
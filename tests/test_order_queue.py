@@ -0,0 +1,131 @@
+# tests/test_order_queue.py
+import json
+import threading
+import pytest
+import core.order_queue as order_queue
+from core.order_ids import OrderIdGenerator
+from core.order_queue import OrderWriter, replay_failed_orders
+from core.order_store import SQLiteOrderStore
+
+
+def make_order(number, user_id="u1", timestamp="2026-10-18T12:00:00"):
+    line = {"item": "fries", "quantity": 1, "customizations": [], "unit_price": 3.0}
+    return {
+        "order_number": number, "user_id": user_id, "timestamp": timestamp, "items": "fries x1",
+        "total_cost": 3.0, "delivery_address": "House 1, Street 2", "status": "confirmed", "line_items": [line],
+    }
+
+
+class FlakyStore(SQLiteOrderStore):
+    """Fails the first `failures` saves."""
+
+    def __init__(self, path, failures=0):
+        super().__init__(path)
+        self.failures = failures
+        self.calls = 0
+
+    def save_orders(self, orders, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("disk I/O error")
+        return super().save_orders(orders, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(order_queue.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def dead_letter(tmp_path):
+    return str(tmp_path / "failed_orders.jsonl")
+
+
+def test_flush_writes_batches_and_pending_orders_stay_visible(tmp_path, dead_letter):
+    store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+    writer = OrderWriter(store, batch=0, interval_ms=60_000, dead_letter=dead_letter)
+    for number in (1, 2, 3):
+        writer.submit(make_order(number))
+    assert writer.pending_order(2)["order_number"] == 2
+    assert writer.latest_pending("u1")["order_number"] == 3
+
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert writer.written == 3
+    assert writer.pending_order(2) is None
+    assert store.count_orders() == 3
+
+
+def test_failed_batches_are_retried(tmp_path, dead_letter):
+    store = FlakyStore(str(tmp_path / "orders.db"), failures=2)
+    writer = OrderWriter(store, dead_letter=dead_letter)
+    writer.submit(make_order(1))
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert store.count_orders() == 1
+    assert writer.failed == []
+
+
+def test_a_duplicate_doesnt_sink_the_rest_of_the_batch(tmp_path, dead_letter):
+    store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+    store.save_orders([make_order(2, user_id="someone else")])
+    writer = OrderWriter(store, batch=3, dead_letter=dead_letter)
+    for number in (1, 2, 3):
+        writer.submit(make_order(number))
+    writer.close()
+    assert writer.written == 2
+    assert [order["order_number"] for order in writer.failed] == [2]
+    assert store.get_order(1) is not None and store.get_order(3) is not None
+
+
+def test_orders_that_keep_failing_are_dead_lettered_and_replayed(tmp_path, dead_letter):
+    store = FlakyStore(str(tmp_path / "orders.db"), failures=100)
+    writer = OrderWriter(store, batch=2, dead_letter=dead_letter)
+    writer.submit(make_order(1))
+    writer.submit(make_order(2))
+    writer.close()
+
+    with open(dead_letter) as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["order"]["order_number"] for entry in entries] == [1, 2]
+    assert entries[0]["error"] == "disk I/O error"
+
+    store.failures = 0
+    store.save_orders([make_order(2)])   # saved by hand in the meantime
+    assert replay_failed_orders(dead_letter, store) == {"replayed": 1, "already_present": 1, "still_failing": 0}
+    assert store.count_orders() == 2
+    assert replay_failed_orders(dead_letter, store) == {"replayed": 0, "already_present": 0, "still_failing": 0}
+
+
+def test_replay_keeps_orders_whose_number_was_taken(tmp_path, dead_letter):
+    store = SQLiteOrderStore(str(tmp_path / "orders.db"))
+    store.save_orders([make_order(1, user_id="someone else")])
+    with open(dead_letter, "w") as f:
+        f.write(json.dumps({"failed_at": "", "error": "", "order": make_order(1)}) + "\n")
+    assert replay_failed_orders(dead_letter, store)["still_failing"] == 1
+    with open(dead_letter) as f:
+        assert json.loads(f.readline())["order"]["user_id"] == "u1"
+
+
+def test_order_numbers_are_unique_across_generators(tmp_path):
+    path = str(tmp_path / "orders.db")
+    generators = [OrderIdGenerator(path, block=5), OrderIdGenerator(path, block=5)]
+    numbers = []
+    lock = threading.Lock()
+
+    def take(generator):
+        for _ in range(23):
+            value = generator.next_id()
+            with lock:
+                numbers.append(value)
+
+    threads = [threading.Thread(target=take, args=(g,)) for g in generators * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(numbers)) == len(numbers) == 92
+    assert min(numbers) == 10000
+    # A new generator starts after every reserved block, never inside one
+    generators[0].close()
+    assert OrderIdGenerator(path, block=5).next_id() > max(numbers)